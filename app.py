@@ -1,46 +1,313 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
-import requests
+import atexit
+import hmac
 import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-import json
-import openai
-import json
-import openai
+
+from assignment import plan_assignment
+from cache import DistanceCache, LRUCache, SingleFlight
+from columnar import ColumnarStore
+from config import Config, config
+from estimator import DistanceEstimator, format_distance, format_duration
+from extraction import extract_with_openai, extract_with_rules, load_openai, normalize_message
+from gazetteer import Gazetteer
+from http_client import HTTPClient
+from ingest import IngestLog
+from events import MatchStream
+import maps_client
+import metrics
+import profiling
+from maps_client import get_distance_matrix
+from matching import MatchingEngine
+import response_encoding
+from route_planner import plan_stops
+from scheduler import LLMScheduler, SchedulerBusy, estimate_tokens, message_urgency
+from sharding import ShardedMatchingEngine
+import snapshot
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# Every endpoint and request hook; create_app() registers it on an app
+bp = Blueprint('api', __name__)
+
+# Live donations and NGO requests behind /match, optionally sharded by city
+# across worker processes
+if Config.MATCH_SHARDS > 1:
+    matching_engine = ShardedMatchingEngine(
+        shards=Config.MATCH_SHARDS,
+        cell_size_deg=Config.MATCH_GRID_CELL_DEG,
+        max_recent_matches=Config.MATCH_RECENT_LIMIT
+    )
+else:
+    matching_engine = MatchingEngine(
+        cell_size_deg=Config.MATCH_GRID_CELL_DEG,
+        max_recent_matches=Config.MATCH_RECENT_LIMIT
+    )
+# Append-only log of ingested records and matches, replayed on startup
+ingest_log = None
+if Config.INGEST_LOG_ENABLED:
+    ingest_log = IngestLog(Config.INGEST_LOG_PATH, batch_size=Config.INGEST_BATCH_SIZE,
+                           flush_interval=Config.INGEST_FLUSH_INTERVAL)
+# Every donation and NGO request ever ingested, in compact columns (GET /history)
+history_store = ColumnarStore(Config.HISTORY_STORE_CAPACITY) if Config.HISTORY_STORE_ENABLED else None
+# Held shared by handlers that log and apply state changes, exclusively by
+# snapshots and by the match stream while it reads one delta
+state_gate = snapshot.StateGate()
+# Server-sent delta events for GET /match/stream (publisher starts with the first subscriber)
+match_stream = None
+if Config.STREAM_ENABLED:
+    match_stream = MatchStream(matching_engine, coalesce_seconds=Config.STREAM_COALESCE_SECONDS,
+                               heartbeat_seconds=Config.STREAM_HEARTBEAT_SECONDS,
+                               history=Config.STREAM_HISTORY, gate=state_gate)
+# (version, serialized /match body) for the latest snapshot
+_match_body_cache = None
+
+# Distance Matrix results keyed by rounded coordinates (memory + SQLite)
+distance_cache = DistanceCache(
+    precision=Config.DISTANCE_CACHE_PRECISION,
+    ttl_seconds=Config.DISTANCE_CACHE_TTL,
+    max_entries=Config.DISTANCE_CACHE_MAX_ENTRIES,
+    path=Config.DISTANCE_CACHE_PATH,
+    enabled=Config.DISTANCE_CACHE_ENABLED
+)
+
+# Pooled, deadline-bounded client with a circuit breaker for Google Maps
+maps_client.DISTANCE_MATRIX_URL = Config.DISTANCE_MATRIX_URL
+maps_client.http_client = HTTPClient(
+    name='google-maps',
+    connect_timeout=Config.MAPS_CONNECT_TIMEOUT,
+    read_timeout=Config.MAPS_READ_TIMEOUT,
+    max_retries=Config.MAPS_MAX_RETRIES,
+    backoff_base=Config.MAPS_BACKOFF_BASE,
+    backoff_max=Config.MAPS_BACKOFF_MAX,
+    pool_size=Config.MAPS_POOL_SIZE,
+    failure_threshold=Config.MAPS_BREAKER_FAILURES,
+    reset_timeout=Config.MAPS_BREAKER_RESET
+)
+
+# /chat extraction results keyed by normalized message text
+chat_cache = LRUCache(max_entries=Config.CHAT_CACHE_MAX_ENTRIES, ttl_seconds=Config.CHAT_CACHE_TTL)
+chat_single_flight = SingleFlight()
+
+# Urgency-ordered queue with RPM/TPM token buckets in front of OpenAI calls
+llm_scheduler = None
+if Config.OPENAI_SCHEDULER_ENABLED:
+    llm_scheduler = LLMScheduler(
+        requests_per_minute=Config.OPENAI_RPM,
+        tokens_per_minute=Config.OPENAI_TPM,
+        max_queue=Config.OPENAI_QUEUE_MAX,
+        max_wait=Config.OPENAI_QUEUE_TIMEOUT,
+        burst_seconds=Config.OPENAI_BURST_SECONDS
+    )
+
+# Shared worker pool that caps concurrent upstream calls from /chat/batch
+chat_batch_executor = ThreadPoolExecutor(max_workers=Config.CHAT_BATCH_CONCURRENCY,
+                                         thread_name_prefix='chat-batch')
+
+# How each /chat message was answered: rules, cache or llm
+extraction_paths = {"rules": 0, "cache": 0, "llm": 0}
+extraction_paths_lock = threading.Lock()
+
+# Local place-name index that adds coordinates to /chat locations
+gazetteer = None
+if Config.GAZETTEER_ENABLED:
+    gazetteer = Gazetteer(Config.GAZETTEER_PATH, fuzzy_cutoff=Config.GAZETTEER_FUZZY_CUTOFF,
+                          max_unresolved=Config.GAZETTEER_MAX_UNRESOLVED)
+
+# Offline distance/ETA model used when the Distance Matrix API can't answer
+distance_estimator = DistanceEstimator(
+    road_factor=Config.ESTIMATOR_ROAD_FACTOR,
+    speed_kmh=Config.ESTIMATOR_SPEED_KMH,
+    overhead_minutes=Config.ESTIMATOR_OVERHEAD_MINUTES
+)
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.before_app_request
+def maybe_start_profile():
+    if not (Config.PROFILE_ADMIN_TOKEN or Config.PROFILE_SAMPLE_RATE):
+        return
+    # asgi.py routes requests it picked for profiling through Flask with this flag set
+    if request.environ.get('xylm.profile') or should_profile(request.headers.get('X-Profile')):
+        g.profile = profiling.start_profile(Config.PROFILE_MODE, f"{request.method} {request.path}",
+                                            Config.PROFILE_DIR, Config.PROFILE_INTERVAL)
+
+def should_profile(header):
+    """Profile requests with the admin X-Profile header, and a random sample of the rest"""
+    if header and Config.PROFILE_ADMIN_TOKEN and hmac.compare_digest(header, Config.PROFILE_ADMIN_TOKEN):
+        return True
+    return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+@bp.after_app_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        path = profile.stop()
+        print(f"Profile for {request.method} {request.path} written to {path}")
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+@bp.teardown_app_request
+def abandon_profile(exc):
+    # Handler raised before after_request ran: still release the profiler
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
 
-# Configure OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+@bp.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None and Config.METRICS_ENABLED:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.REQUESTS.inc(route, request.method, str(response.status_code))
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method)
+    return response
 
-@app.route('/')
+@bp.after_app_request
+def compress_response(response):
+    """gzip/brotli-encode large JSON and text responses the client accepts compressed"""
+    if (not Config.COMPRESSION_ENABLED or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in response_encoding.COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = response_encoding.choose_encoding(request.accept_encodings)
+    if encoding is None or len(data) < Config.COMPRESSION_MIN_BYTES:
+        return response
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity ones, so only a weak ETag still holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def compress_body(data, encoding):
+    return response_encoding.compress(data, encoding, gzip_level=Config.COMPRESSION_GZIP_LEVEL,
+                                      brotli_quality=Config.COMPRESSION_BROTLI_QUALITY)
+
+@metrics.registry.collector
+def collect_app_metrics():
+    """Cache, upstream and matching state read at scrape time"""
+    caches = []
+    distance = distance_cache.stats()
+    caches.append(("distance_memory", distance["memory"]))
+    if "disk" in distance:
+        caches.append(("distance_disk", distance["disk"]))
+    caches.append(("chat", chat_cache.stats.as_dict()))
+    if gazetteer is not None:
+        caches.append(("gazetteer", gazetteer.memo_stats()))
+    
+    breaker = maps_client.http_client.breaker.as_dict()
+    families = [
+        ("xylm_cache_hits_total", "counter", "Cache hits by cache",
+         [({"cache": name}, stats["hits"]) for name, stats in caches]),
+        ("xylm_cache_misses_total", "counter", "Cache misses by cache",
+         [({"cache": name}, stats["misses"]) for name, stats in caches]),
+        ("xylm_cache_hit_ratio", "gauge", "Cache hit ratio since start by cache",
+         [({"cache": name}, stats["hit_ratio"]) for name, stats in caches]),
+        ("xylm_chat_single_flight_shared_total", "counter",
+         "Chat extractions answered by an identical in-flight call",
+         [({}, chat_single_flight.shared)]),
+        ("xylm_upstream_circuit_open", "gauge", "1 when the upstream circuit breaker is not closed",
+         [({"upstream": "google_maps"}, 0 if breaker["state"] == "closed" else 1)]),
+        ("xylm_open_donations", "gauge", "Open donations in the matching engine",
+         [({}, matching_engine.summary()["open_donations"])]),
+        ("xylm_open_ngo_requests", "gauge", "Open NGO requests in the matching engine",
+         [({}, matching_engine.summary()["open_ngo_requests"])]),
+    ]
+    if llm_scheduler is not None:
+        stats = llm_scheduler.stats()
+        families.append(("xylm_openai_queue_depth", "gauge", "OpenAI calls waiting in the scheduler",
+                         [({}, stats["queued"])]))
+        families.append(("xylm_openai_scheduler_rejected_total", "counter",
+                         "OpenAI calls turned away with 429 (queue full, displaced or timed out)",
+                         [({"reason": "queue_full"}, stats["rejected"]),
+                          ({"reason": "timeout"}, stats["timed_out"])]))
+    if match_stream is not None:
+        families.append(("xylm_match_stream_subscribers", "gauge", "Open GET /match/stream connections",
+                         [({}, match_stream.broadcaster.subscribers)]))
+    if ingest_log is not None:
+        stats = ingest_log.stats()
+        families.append(("xylm_ingest_log_batches_total", "counter", "Ingest log batches fsync'd",
+                         [({}, stats["batches"])]))
+        families.append(("xylm_ingest_log_events_total", "counter", "Events appended to the ingest log",
+                         [({}, stats["appended"])]))
+    return families
+
+@bp.route('/')
 def home():
     return jsonify({
         "message": "XYLMCSCICS Food Donation Platform API",
         "endpoints": {
             "route": "/route - Get Google Maps directions between donor and NGO",
+            "route_batch": "/route/batch - Get routes for every donor/NGO pair in one call",
             "chat": "/chat - Process food donation messages with AI",
+            "chat_batch": "/chat/batch - Process a list of donation messages in one call",
+            "geocode": "/geocode - Resolve a place name to coordinates offline",
             "health": "/health - API health check",
-            "match": "/match - Get matching data for donors, NGOs, and food quantities"
+            "metrics": "/metrics - Prometheus metrics",
+            "cache_stats": "/cache/stats - Distance and chat cache hit/miss counters",
+            "match": "/match - Get matching data for donors, NGOs, and food quantities",
+            "match_stream": "/match/stream - Server-sent events with match and counter deltas",
+            "match_status": "/match/<match_id>/status - Update a match's delivery status",
+            "match_urgent": "/match/urgent - Open donations closest to expiry",
+            "match_assign": "/match/assign - Jointly assign open donations to NGO requests",
+            "donations": "/donations - Register an open food donation",
+            "history": "/history - Filter and aggregate every donation and NGO request received",
+            "ngo_requests": "/ngo-requests - Register an open NGO food request"
         }
     })
 
-@app.route('/health')
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text-format metrics"""
+    if not Config.METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled", "status": "error"}), 404
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/health')
 def health_check():
     return jsonify({
         "status": "healthy",
         "service": "XYLMCSCICS API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "upstreams": {
+            "google_maps": maps_client.http_client.breaker.as_dict()
+        },
+        "ingest_log": ingest_log.stats() if ingest_log is not None else None,
+        "match_shards": matching_engine.shard_stats() if Config.MATCH_SHARDS > 1 else None,
+        "startup": startup_stats,
+        "snapshot": {
+            "last": snapshotter.last,
+            "failures": snapshotter.failures,
+            "interval_seconds": snapshotter.interval
+        } if snapshotter is not None else None
     })
 
-@app.route('/chat', methods=['POST'])
+@bp.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the distance and chat caches"""
+    return jsonify({
+        "distance_cache": distance_cache.stats(),
+        "chat_cache": dict(chat_cache.stats.as_dict(), entries=len(chat_cache),
+                           max_entries=chat_cache.max_entries,
+                           shared_in_flight=chat_single_flight.shared),
+        "status": "success"
+    })
+
+@bp.route('/chat', methods=['POST'])
 def chat_endpoint():
     """
     Process user messages about food donations using OpenAI API
@@ -56,8 +323,13 @@ def chat_endpoint():
         "quantity": "20",
         "expiry": "4 hours",
         "location": "Delhi",
-        "status": "success"
+        "status": "success",
+        "extraction_path": "rules",
+        "confidence": 1.0
     }
+    
+    Messages the local rule-based extractor parses with enough confidence
+    never reach OpenAI; the rest go to the model (through the chat cache).
     """
     try:
         # Get JSON data from request
@@ -77,92 +349,193 @@ def chat_endpoint():
                 "status": "error"
             }), 400
         
-        # Check if OpenAI API key is configured
-        if not openai.api_key:
+        result, status_code = process_chat_message(user_message)
+        if status_code == 429:
+            return jsonify(result), status_code, {"Retry-After": str(result["retry_after"])}
+        return jsonify(result), status_code
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+def process_chat_message(user_message):
+    """
+    Extract donation fields from one message
+    
+    Returns (result, status_code) with the same payloads /chat returns:
+    success, partial_success (JSON parsing fallback) or error.
+    """
+    # Fast path: compiled patterns for the common message shape
+    result = try_rules_extraction(user_message)
+    if result is not None:
+        return add_coordinates(result), 200
+    
+    # Check if OpenAI API key is configured
+    if not load_openai().api_key:
+        return {
+            "error": "OpenAI API key not configured",
+            "status": "error"
+        }, 500
+    
+    try:
+        # Identical messages share one cached result and one in-flight call
+        return add_coordinates(extract_donation(user_message)), 200
+        
+    except SchedulerBusy as busy:
+        return scheduler_busy_result(busy), 429
+    except Exception as openai_error:
+        print(f"OpenAI API error: {openai_error}")
+        return {
+            "error": f"OpenAI API error: {str(openai_error)}",
+            "status": "error"
+        }, 500
+
+def scheduler_busy_result(busy):
+    return {
+        "error": f"OpenAI request queue is busy: {busy}",
+        "status": "error",
+        "retry_after": busy.retry_after
+    }
+
+def add_coordinates(result):
+    """
+    Add gazetteer coordinates for the extracted location to a /chat result
+    
+    Sets "coordinates" to {"lat", "lng", "name", "match"} (ready for
+    /route's donor_lat/donor_lng), or None when the location is unknown or
+    not in the gazetteer. ``result`` must be a fresh dict (it is updated).
+    """
+    if gazetteer is None:
+        return result
+    place = gazetteer.resolve(result.get("location"))
+    result["coordinates"] = None if place is None else {
+        "lat": place["lat"],
+        "lng": place["lng"],
+        "name": place["name"],
+        "match": place["match"]
+    }
+    return result
+
+def try_rules_extraction(user_message):
+    """Return the /chat result from the local extractor, or None if not confident"""
+    if not Config.CHAT_RULES_ENABLED:
+        return None
+    fields, confidence = extract_with_rules(user_message, gazetteer=gazetteer)
+    if confidence < Config.CHAT_RULES_MIN_CONFIDENCE:
+        return None
+    record_extraction_path("rules")
+    return dict(fields,
+                status="success",
+                original_message=user_message,
+                extraction_path="rules",
+                confidence=confidence)
+
+def extract_donation(user_message):
+    """
+    Extract donation fields from a message, using the chat cache
+    
+    Messages are keyed by their normalized form; concurrent identical
+    messages are collapsed into one OpenAI call. Only fully successful
+    extractions are cached.
+    """
+    if not Config.CHAT_CACHE_ENABLED:
+        result = scheduled_extraction(user_message)
+        record_extraction_path("llm", result["status"])
+        return dict(result, extraction_path="llm")
+    
+    key = normalize_message(user_message)
+    cached = chat_cache.get(key)
+    path = "cache"
+    if cached is None:
+        def compute():
+            result = scheduled_extraction(user_message)
+            if result["status"] == "success":
+                chat_cache.set(key, result)
+            return result
+        
+        cached = chat_single_flight.do(key, compute)
+        path = "llm"
+    
+    record_extraction_path(path, cached["status"])
+    return dict(cached, original_message=user_message, extraction_path=path)
+
+def scheduled_extraction(user_message):
+    """
+    ``extract_with_openai`` once the scheduler lets the call through
+    
+    Calls queue by how soon the food expires and are released within the
+    OPENAI_RPM/OPENAI_TPM budgets; raises SchedulerBusy when the queue is
+    full or the wait exceeds OPENAI_QUEUE_TIMEOUT.
+    """
+    if llm_scheduler is None:
+        return extract_with_openai(user_message)
+    return llm_scheduler.call(lambda: extract_with_openai(user_message),
+                              message_urgency(user_message), estimate_tokens(user_message))
+
+def record_extraction_path(path, status="success"):
+    with extraction_paths_lock:
+        extraction_paths[path] += 1
+    metrics.CHAT_EXTRACTIONS.inc(path, status)
+
+@bp.route('/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """
+    Process a burst of donation messages in one request
+    
+    Expected JSON payload:
+    {
+        "messages": ["I have 20 rotis in Delhi expiring in 4 hours", ...]
+    }
+    
+    Returns results in the same order as the messages, each with its own
+    status (success, partial_success or error). Messages needing the model
+    run concurrently, at most CHAT_BATCH_CONCURRENCY at a time.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                "error": "No JSON data provided",
+                "status": "error"
+            }), 400
+        
+        messages = data.get('messages')
+        
+        if not isinstance(messages, list) or not messages:
             return jsonify({
-                "error": "OpenAI API key not configured",
+                "error": "'messages' must be a non-empty list of strings",
                 "status": "error"
-            }), 500
-        
-        # Create system prompt to force JSON output
-        system_prompt = """You are a food donation assistant. Extract food donation information from user messages and return ONLY a valid JSON object with these exact fields:
-{
-    "food": "food item name",
-    "quantity": "amount/quantity",
-    "expiry": "expiry time",
-    "location": "city/location"
-}
-
-Rules:
-- Return ONLY the JSON object, no other text
-- Ensure the JSON is valid and parseable
-- Extract the most relevant information from the message
-- If a field is not mentioned, use "unknown" as the value
-- Keep responses concise and accurate
-
-Example input: "I have 20 rotis in Delhi expiring in 4 hours"
-Example output: {"food": "rotis", "quantity": "20", "expiry": "4 hours", "location": "Delhi"}"""
-
-        try:
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=150,
-                temperature=0.1  # Low temperature for consistent JSON output
-            )
-            
-            # Extract the response content
-            ai_response = response.choices[0].message.content.strip()
-            
-            # Try to parse the JSON response
-            try:
-                parsed_data = json.loads(ai_response)
-                
-                # Validate required fields
-                required_fields = ["food", "quantity", "expiry", "location"]
-                for field in required_fields:
-                    if field not in parsed_data:
-                        parsed_data[field] = "unknown"
-                
-                # Add status and original message
-                result = {
-                    "food": parsed_data.get("food", "unknown"),
-                    "quantity": parsed_data.get("quantity", "unknown"),
-                    "expiry": parsed_data.get("expiry", "unknown"),
-                    "location": parsed_data.get("location", "unknown"),
-                    "status": "success",
-                    "original_message": user_message
-                }
-                
-                return jsonify(result)
-                
-            except json.JSONDecodeError as e:
-                # If JSON parsing fails, try to extract information manually
-                print(f"JSON parsing failed: {e}")
-                print(f"AI response: {ai_response}")
-                
-                # Fallback: return a basic structure
-                return jsonify({
-                    "food": "unknown",
-                    "quantity": "unknown",
-                    "expiry": "unknown",
-                    "location": "unknown",
-                    "status": "partial_success",
-                    "original_message": user_message,
-                    "ai_response": ai_response,
-                    "note": "JSON parsing failed, using fallback"
-                })
-                
-        except Exception as openai_error:
-            print(f"OpenAI API error: {openai_error}")
+            }), 400
+        
+        if len(messages) > Config.CHAT_BATCH_MAX_MESSAGES:
             return jsonify({
-                "error": f"OpenAI API error: {str(openai_error)}",
+                "error": f"At most {Config.CHAT_BATCH_MAX_MESSAGES} messages per batch",
                 "status": "error"
-            }), 500
+            }), 400
+        
+        def process(message):
+            if not isinstance(message, str) or not message.strip():
+                return {"error": "Missing or empty message", "status": "error"}
+            result, _ = process_chat_message(message)
+            return result
+        
+        results = list(chat_batch_executor.map(process, messages))
+        for index, result in enumerate(results):
+            result["index"] = index
+        
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "status_counts": counts,
+            "status": "success" if counts.get("success") == len(results) else "partial_success"
+        })
         
     except Exception as e:
         return jsonify({
@@ -170,7 +543,54 @@ Example output: {"food": "rotis", "quantity": "20", "expiry": "4 hours", "locati
             "status": "error"
         }), 500
 
-@app.route('/chat', methods=['GET'])
+@bp.route('/geocode', methods=['GET'])
+def geocode():
+    """
+    Resolve a place name with the local gazetteer
+    
+    Query parameters: q (place name). No external geocoding calls are made.
+    """
+    if gazetteer is None:
+        return jsonify({"error": "Gazetteer is disabled", "status": "error"}), 503
+    
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"error": "Missing 'q' parameter", "status": "error"}), 400
+    
+    place = gazetteer.resolve(query)
+    if place is None:
+        return jsonify({"query": query, "error": "Location not found", "status": "not_found"}), 404
+    return jsonify({"query": query, "place": place, "status": "success"})
+
+@bp.route('/geocode/unresolved', methods=['GET'])
+def unresolved_locations():
+    """Location names /chat could not resolve, most frequent first, to grow gazetteer.csv"""
+    if gazetteer is None:
+        return jsonify({"error": "Gazetteer is disabled", "status": "error"}), 503
+    
+    limit = request.args.get('limit', default=50, type=int)
+    names, distinct = gazetteer.unresolved(limit=max(1, limit))
+    return jsonify({
+        "unresolved": [{"location": name, "count": count} for name, count in names],
+        "distinct": distinct,
+        "status": "success"
+    })
+
+@bp.route('/chat/stats', methods=['GET'])
+def chat_stats():
+    """How many /chat messages were answered by rules, cache or the LLM"""
+    with extraction_paths_lock:
+        counts = dict(extraction_paths)
+    total = sum(counts.values())
+    return jsonify({
+        "extraction_paths": counts,
+        "total": total,
+        "offload_ratio": round((counts["rules"] + counts["cache"]) / total, 4) if total else 0.0,
+        "scheduler": llm_scheduler.stats() if llm_scheduler is not None else None,
+        "status": "success"
+    })
+
+@bp.route('/chat', methods=['GET'])
 def chat_info():
     """GET endpoint to show chat endpoint information"""
     return jsonify({
@@ -189,13 +609,15 @@ def chat_info():
             "expiry": "4 hours",
             "location": "Delhi",
             "status": "success",
-            "original_message": "I have 20 rotis in Delhi expiring in 4 hours"
+            "original_message": "I have 20 rotis in Delhi expiring in 4 hours",
+            "extraction_path": "rules",
+            "confidence": 1.0
         },
         "ai_model": "GPT-3.5 Turbo",
-        "note": "Requires OPENAI_API_KEY environment variable"
+        "note": "Requires OPENAI_API_KEY environment variable for messages the local extractor can't parse confidently"
     })
 
-@app.route('/route', methods=['POST'])
+@bp.route('/route', methods=['POST'])
 def get_route():
     """
     Generate Google Maps directions link between donor and NGO coordinates
@@ -205,7 +627,8 @@ def get_route():
         "donor_lat": float,
         "donor_lng": float,
         "ngo_lat": float,
-        "ngo_lng": float
+        "ngo_lng": float,
+        "use_cache": bool (optional, default true)
     }
     
     Returns:
@@ -215,59 +638,32 @@ def get_route():
         "duration": "15 mins",
         "status": "success"
     }
+    
+    Multi-stop mode: send a depot and a list of pickups instead,
+    {
+        "depot": {"lat": float, "lng": float},
+        "pickups": [{"lat": float, "lng": float, "expiryTime": hours (optional)}, ...],
+        "return_to_depot": bool (optional, default true)
+    }
+    and get back the stop order, one multi-waypoint route_url and the total
+    distance and ETA (see plan_pickup_route).
     """
     try:
         # Get JSON data from request
         data = request.get_json()
         
-        if not data:
-            return jsonify({
-                "error": "No JSON data provided",
-                "status": "error"
-            }), 400
+        if data and 'pickups' in data:
+            payload, status_code = plan_pickup_route(data)
+            return jsonify(payload), status_code
         
-        # Extract coordinates
-        donor_lat = data.get('donor_lat')
-        donor_lng = data.get('donor_lng')
-        ngo_lat = data.get('ngo_lat')
-        ngo_lng = data.get('ngo_lng')
-        
-        # Validate coordinates
-        if not all([donor_lat, donor_lng, ngo_lat, ngo_lng]):
-            return jsonify({
-                "error": "Missing coordinates. Required: donor_lat, donor_lng, ngo_lat, ngo_lng",
-                "status": "error"
-            }), 400
-        
-        # Validate coordinate ranges
-        if not (-90 <= donor_lat <= 90) or not (-180 <= donor_lng <= 180):
-            return jsonify({
-                "error": "Invalid donor coordinates. Latitude must be between -90 and 90, longitude between -180 and 180",
-                "status": "error"
-            }), 400
-            
-        if not (-90 <= ngo_lat <= 90) or not (-180 <= ngo_lng <= 180):
-            return jsonify({
-                "error": "Invalid NGO coordinates. Latitude must be between -90 and 90, longitude between -180 and 180",
-                "status": "error"
-            }), 400
-        
-        # Generate Google Maps directions URL
-        route_url = f"https://www.google.com/maps/dir/{donor_lat},{donor_lng}/{ngo_lat},{ngo_lng}"
+        coordinates, error = parse_route_request(data)
+        if error:
+            return jsonify(error[0]), error[1]
         
         # Optional: Get distance and duration using Google Maps Distance Matrix API
-        distance_info = get_distance_info(donor_lat, donor_lng, ngo_lat, ngo_lng)
+        distance_info = get_distance_info(*coordinates, use_cache=data.get('use_cache', True))
         
-        return jsonify({
-            "route_url": route_url,
-            "distance": distance_info.get("distance", "Unknown"),
-            "duration": distance_info.get("duration", "Unknown"),
-            "status": "success",
-            "coordinates": {
-                "donor": {"lat": donor_lat, "lng": donor_lng},
-                "ngo": {"lat": ngo_lat, "lng": ngo_lng}
-            }
-        })
+        return jsonify(build_route_response(coordinates, distance_info))
         
     except Exception as e:
         return jsonify({
@@ -275,41 +671,293 @@ def get_route():
             "status": "error"
         }), 500
 
-def get_distance_info(origin_lat, origin_lng, dest_lat, dest_lng):
+def plan_pickup_route(data):
+    """
+    Order one van run from an NGO depot through donor pickups
+    
+    Pickups may reference an open donation ("donation_id") instead of giving
+    lat/lng, in which case its coordinates and expiry come from the matching
+    engine. Travel times come from one batched Distance Matrix call over all
+    stops (falling back to offline estimates); the order is built with
+    nearest insertion and improved with 2-opt, keeping expiring food on time
+    where possible. Returns (payload, status_code).
+    """
+    depot = data.get('depot') or {}
+    try:
+        depot_point = parse_points([depot], 'depot')[0]
+        pickups = data.get('pickups')
+        if not isinstance(pickups, list) or not pickups:
+            raise ValueError("'pickups' must be a non-empty list")
+        if len(pickups) > Config.ROUTE_MAX_PICKUPS:
+            raise ValueError(f"'pickups' can contain at most {Config.ROUTE_MAX_PICKUPS} stops")
+        
+        pickups = [resolve_pickup(pickup, i) for i, pickup in enumerate(pickups)]
+        points = [depot_point] + parse_points(
+            [{"lat": p["lat"], "lng": p["lng"]} for p in pickups], 'pickups')
+    except ValueError as e:
+        return {"error": str(e), "status": "error"}, 400
+    except KeyError as e:
+        return {"error": str(e.args[0]), "status": "error"}, 404
+    
+    matrix, requests_made = get_distance_matrix(
+        points, points, cache=distance_cache if data.get('use_cache', True) else None
+    )
+    matrix = fill_unknown_distances(matrix, points, points)
+    if any("duration_seconds" not in element for row in matrix for element in row):
+        # Estimator fallback is switched off: still order stops by estimates
+        estimates = distance_estimator.element_matrix(points, points)
+        matrix = [[element if "duration_seconds" in element else estimates[i][j]
+                   for j, element in enumerate(row)] for i, row in enumerate(matrix)]
+    durations = [[0 if i == j else element["duration_seconds"] for j, element in enumerate(row)]
+                 for i, row in enumerate(matrix)]
+    meters = [[0 if i == j else element["distance_meters"] for j, element in enumerate(row)]
+              for i, row in enumerate(matrix)]
+    
+    deadlines = [None] + [p["deadline_seconds"] for p in pickups]
+    return_to_depot = data.get('return_to_depot', True)
+    service_seconds = Config.ROUTE_STOP_MINUTES * 60
+    order, arrivals, lateness = plan_stops(durations, deadlines, service_seconds, return_to_depot)
+    
+    legs = [0] + order + ([0] if return_to_depot else [])
+    total_meters = sum(meters[a][b] for a, b in zip(legs, legs[1:]))
+    total_seconds = sum(durations[a][b] for a, b in zip(legs, legs[1:])) + service_seconds * len(order)
+    sources = {element_source(matrix[a][b]) for a, b in zip(legs, legs[1:])}
+    
+    stops = []
+    for position, (node, arrival) in enumerate(zip(order, arrivals)):
+        pickup = pickups[node - 1]
+        deadline = deadlines[node]
+        stops.append({
+            "position": position + 1,
+            "pickup_index": node - 1,
+            "donation_id": pickup.get("donation_id"),
+            "lat": pickup["lat"],
+            "lng": pickup["lng"],
+            "eta": format_duration(arrival / 60),
+            "eta_seconds": int(round(arrival)),
+            "on_time": deadline is None or arrival <= deadline
+        })
+    
+    route_url = "https://www.google.com/maps/dir/" + "/".join(
+        f"{points[node][0]},{points[node][1]}" for node in legs)
+    
+    return {
+        "route_url": route_url,
+        "stops": stops,
+        "distance": format_distance(total_meters / 1000),
+        "duration": format_duration(total_seconds / 60),
+        "distance_meters": int(total_meters),
+        "duration_seconds": int(round(total_seconds)),
+        "late_stops": sum(1 for stop in stops if not stop["on_time"]),
+        "distance_source": sources.pop() if len(sources) == 1 else "mixed",
+        "upstream_requests": requests_made,
+        "status": "success"
+    }, 200
+
+def resolve_pickup(pickup, index):
+    """Normalize one pickup to lat/lng/deadline_seconds, looking up donation_id if given"""
+    if not isinstance(pickup, dict):
+        raise ValueError(f"pickups[{index}] must be an object")
+    
+    if pickup.get('donation_id'):
+        donation = matching_engine.get_donation(pickup['donation_id'])
+        if donation is None:
+            raise KeyError(f"Unknown or expired donation: {pickup['donation_id']}")
+        if donation.get('lat') is None or donation.get('lng') is None:
+            raise ValueError(f"Donation {pickup['donation_id']} has no coordinates")
+        deadline = None
+        if donation.get('expires_at'):
+            expires_at = datetime.fromisoformat(donation['expires_at'])
+            deadline = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        return {"donation_id": pickup['donation_id'], "lat": donation['lat'], "lng": donation['lng'],
+                "deadline_seconds": deadline}
+    
+    expiry = pickup.get('expiryTime')
+    if expiry is not None and (isinstance(expiry, bool) or not isinstance(expiry, (int, float)) or expiry <= 0):
+        raise ValueError(f"pickups[{index}].expiryTime must be a positive number of hours")
+    return {"lat": pickup.get('lat'), "lng": pickup.get('lng'),
+            "deadline_seconds": None if expiry is None else expiry * 3600}
+
+def parse_route_request(data):
+    """
+    Validate a /route payload
+    
+    Returns ((donor_lat, donor_lng, ngo_lat, ngo_lng), None) or
+    (None, (error_payload, status_code)).
+    """
+    if not data:
+        return None, ({
+            "error": "No JSON data provided",
+            "status": "error"
+        }, 400)
+    
+    # Extract coordinates
+    donor_lat = data.get('donor_lat')
+    donor_lng = data.get('donor_lng')
+    ngo_lat = data.get('ngo_lat')
+    ngo_lng = data.get('ngo_lng')
+    
+    # Validate coordinates
+    if not all([donor_lat, donor_lng, ngo_lat, ngo_lng]):
+        return None, ({
+            "error": "Missing coordinates. Required: donor_lat, donor_lng, ngo_lat, ngo_lng",
+            "status": "error"
+        }, 400)
+    
+    # Validate coordinate ranges
+    if not (-90 <= donor_lat <= 90) or not (-180 <= donor_lng <= 180):
+        return None, ({
+            "error": "Invalid donor coordinates. Latitude must be between -90 and 90, longitude between -180 and 180",
+            "status": "error"
+        }, 400)
+        
+    if not (-90 <= ngo_lat <= 90) or not (-180 <= ngo_lng <= 180):
+        return None, ({
+            "error": "Invalid NGO coordinates. Latitude must be between -90 and 90, longitude between -180 and 180",
+            "status": "error"
+        }, 400)
+    
+    return (donor_lat, donor_lng, ngo_lat, ngo_lng), None
+
+def build_route_response(coordinates, distance_info):
+    """Build the /route success payload"""
+    donor_lat, donor_lng, ngo_lat, ngo_lng = coordinates
+    
+    # Generate Google Maps directions URL
+    route_url = f"https://www.google.com/maps/dir/{donor_lat},{donor_lng}/{ngo_lat},{ngo_lng}"
+    
+    return {
+        "route_url": route_url,
+        "distance": distance_info.get("distance", "Unknown"),
+        "duration": distance_info.get("duration", "Unknown"),
+        "distance_source": distance_info.get("source", "unknown"),
+        "status": "success",
+        "coordinates": {
+            "donor": {"lat": donor_lat, "lng": donor_lng},
+            "ngo": {"lat": ngo_lat, "lng": ngo_lng}
+        }
+    }
+
+def get_distance_info(origin_lat, origin_lng, dest_lat, dest_lng, use_cache=True):
     """
     Get distance and duration information using Google Maps Distance Matrix API
-    Note: Requires Google Maps API key
+    Note: Requires Google Maps API key. Results are served from the distance
+    cache when available unless use_cache is False, and fall back to the
+    offline estimator when the API can't answer.
     """
-    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+    origin, destination = (origin_lat, origin_lng), (dest_lat, dest_lng)
+    matrix, _ = get_distance_matrix([origin], [destination],
+                                    cache=distance_cache if use_cache else None)
+    return distance_info_from_matrix(matrix, origin, destination)
+
+def distance_info_from_matrix(matrix, origin, destination):
+    """Turn a 1x1 distance matrix into get_distance_info's result"""
+    matrix = fill_unknown_distances(matrix, [origin], [destination])
+    element = matrix[0][0]
+    return {
+        "distance": element["distance"],
+        "duration": element["duration"],
+        "source": element_source(element)
+    }
+
+def element_source(element):
+    """Where a distance element came from: google, estimate or unknown"""
+    if element.get("estimated"):
+        return "estimate"
+    return "unknown" if element["distance"] == "Unknown" else "google"
+
+def fill_unknown_distances(matrix, origins, destinations):
+    """Replace Unknown elements with offline estimates (one vectorized call)"""
+    if not Config.DISTANCE_ESTIMATE_FALLBACK:
+        return matrix
+    if not any(element["distance"] == "Unknown" for row in matrix for element in row):
+        return matrix
+    estimates = distance_estimator.element_matrix(origins, destinations)
+    return [[estimates[i][j] if element["distance"] == "Unknown" else element
+             for j, element in enumerate(row)] for i, row in enumerate(matrix)]
+
+def parse_points(points, label):
+    """Validate a list of {"lat", "lng"} objects and return (lat, lng) pairs"""
+    if not isinstance(points, list) or not points:
+        raise ValueError(f"'{label}' must be a non-empty list of {{\"lat\", \"lng\"}} objects")
+    if len(points) > Config.ROUTE_BATCH_MAX_POINTS:
+        raise ValueError(f"'{label}' can contain at most {Config.ROUTE_BATCH_MAX_POINTS} points")
     
-    if not api_key:
-        return {"distance": "Unknown", "duration": "Unknown"}
+    parsed = []
+    for i, point in enumerate(points):
+        if not isinstance(point, dict) or point.get('lat') is None or point.get('lng') is None:
+            raise ValueError(f"{label}[{i}] is missing lat/lng")
+        error = validate_coordinates(point['lat'], point['lng'], f"{label}[{i}]")
+        if error:
+            raise ValueError(error)
+        parsed.append((point['lat'], point['lng']))
+    return parsed
+
+@bp.route('/route/batch', methods=['POST'])
+def get_batch_routes():
+    """
+    Generate routes for every donor/NGO pair using batched Distance Matrix calls
     
+    Expected JSON payload:
+    {
+        "donors": [{"lat": float, "lng": float}, ...],
+        "ngos": [{"lat": float, "lng": float}, ...],
+        "use_cache": bool (optional, default true)
+    }
+    
+    Returns a donors x NGOs matrix where routes[i][j] holds route_url,
+    distance and duration from donor i to NGO j.
+    """
     try:
-        url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-        params = {
-            'origins': f"{origin_lat},{origin_lng}",
-            'destinations': f"{dest_lat},{dest_lng}",
-            'key': api_key,
-            'units': 'metric'
-        }
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                "error": "No JSON data provided",
+                "status": "error"
+            }), 400
         
-        response = requests.get(url, params=params)
-        data = response.json()
+        try:
+            donors = parse_points(data.get('donors'), 'donors')
+            ngos = parse_points(data.get('ngos'), 'ngos')
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+        
+        matrix, requests_made = get_distance_matrix(
+            donors, ngos, cache=distance_cache if data.get('use_cache', True) else None
+        )
+        matrix = fill_unknown_distances(matrix, donors, ngos)
+        
+        routes = []
+        for i, (donor_lat, donor_lng) in enumerate(donors):
+            row = []
+            for j, (ngo_lat, ngo_lng) in enumerate(ngos):
+                element = matrix[i][j]
+                row.append({
+                    "donor_index": i,
+                    "ngo_index": j,
+                    "route_url": f"https://www.google.com/maps/dir/{donor_lat},{donor_lng}/{ngo_lat},{ngo_lng}",
+                    "distance": element["distance"],
+                    "duration": element["duration"],
+                    "distance_source": element_source(element)
+                })
+            routes.append(row)
+        
+        return jsonify({
+            "routes": routes,
+            "donor_count": len(donors),
+            "ngo_count": len(ngos),
+            "upstream_requests": requests_made,
+            "status": "success"
+        })
         
-        if data['status'] == 'OK' and data['rows'][0]['elements'][0]['status'] == 'OK':
-            element = data['rows'][0]['elements'][0]
-            distance = element['distance']['text']
-            duration = element['duration']['text']
-            return {"distance": distance, "duration": duration}
-        else:
-            return {"distance": "Unknown", "duration": "Unknown"}
-            
     except Exception as e:
-        print(f"Error getting distance info: {e}")
-        return {"distance": "Unknown", "duration": "Unknown"}
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
 
-@app.route('/route', methods=['GET'])
+@bp.route('/route', methods=['GET'])
 def route_info():
     """GET endpoint to show route endpoint information"""
     return jsonify({
@@ -336,63 +984,426 @@ def route_info():
         }
     })
 
-@app.route('/match', methods=['GET'])
+def validate_coordinates(lat, lng, label):
+    """Return an error message if a coordinate pair is present but invalid"""
+    if lat is None and lng is None:
+        return None
+    if not isinstance(lat, (int, float)) or not isinstance(lng, (int, float)):
+        return f"Invalid {label} coordinates. Both lat and lng must be numbers"
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        return f"Invalid {label} coordinates. Latitude must be between -90 and 90, longitude between -180 and 180"
+    return None
+
+def validate_max_distance(value):
+    """Return an error message if an optional "max_distance_km" is not a positive number"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not (0 < value < float('inf')):
+        return "'max_distance_km' must be a positive number"
+    return None
+
+@bp.route('/donations', methods=['POST'])
+def add_donation():
+    """
+    Register open food donations with the matching engine
+    
+    Expected JSON payload (same shape as the donor form in app.js), either a
+    single record or a list of records (or {"records": [...]}) for bulk uploads:
+    {
+        "foodType": "Rice",
+        "quantity": "5kg",
+        "expiryTime": 24,
+        "location": "Delhi",
+        "lat": 28.6139,
+        "lng": 77.2090,
+        "userId": "guest"
+    }
+    """
+    return ingest_request('donation', DONATION_FIELDS, matching_engine.add_donation)
+
+@bp.route('/ngo-requests', methods=['POST'])
+def add_ngo_request():
+    """
+    Register open NGO food requests with the matching engine
+    
+    Expected JSON payload (same shape as the NGO form in app.js), either a
+    single record or a list of records (or {"records": [...]}) for bulk uploads:
+    {
+        "ngoName": "Hope Foundation",
+        "foodNeeded": "Rice, Vegetables",
+        "location": "Delhi",
+        "lat": 28.6139,
+        "lng": 77.2090
+    }
+    """
+    return ingest_request('ngo_request', NGO_REQUEST_FIELDS, matching_engine.add_ngo_request)
+
+DONATION_FIELDS = ('foodType', 'quantity', 'location')
+NGO_REQUEST_FIELDS = ('ngoName', 'foodNeeded', 'location')
+
+def validate_record(record, required, label):
+    """Return the validation errors for one submitted record (mirrors validateFormData in app.js)"""
+    if not isinstance(record, dict):
+        return ["Record must be a JSON object"]
+    
+    errors = [f"{field} is required" for field in required
+              if not record.get(field) or (isinstance(record[field], str) and not record[field].strip())]
+    
+    expiry = record.get('expiryTime')
+    if expiry is not None:
+        if isinstance(expiry, bool) or not isinstance(expiry, (int, float)):
+            errors.append("Expiry time must be a number of hours")
+        elif not (1 <= expiry <= 8760):  # Max 1 year
+            errors.append("Expiry time must be between 1 and 8760 hours")
+    
+    error = validate_coordinates(record.get('lat'), record.get('lng'), label)
+    if error:
+        errors.append(error)
+    return errors
+
+def log_events(events):
+    """
+    Append ``events`` to the ingest log and wait for the fsync
+
+    Returns False if the sync timed out: the events are already queued and
+    will still be written (and replayed after a restart), so callers apply
+    them and report ``"durable": false`` rather than failing the request.
+    """
+    if ingest_log is None:
+        return True
+    try:
+        ingest_log.append(events)
+    except TimeoutError as e:
+        print(f"Ingest log sync pending: {e}")
+        return False
+    return True
+
+def with_durability(body, durable):
+    """Mark a response body whose logged changes are not fsync'd yet"""
+    if not durable:
+        body["durable"] = False
+    return body
+
+def ingest_request(kind, required, register):
+    """
+    Validate single or bulk records, log them durably, then register them
+    
+    Valid records are appended to the ingest log as one batch (a single
+    fsync for the whole request) before they reach the matching engine.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                "error": "No JSON data provided",
+                "status": "error"
+            }), 400
+        
+        single = isinstance(data, dict) and 'records' not in data
+        records = [data] if single else (data.get('records') if isinstance(data, dict) else data)
+        if not isinstance(records, list) or not records:
+            return jsonify({
+                "error": "'records' must be a non-empty list",
+                "status": "error"
+            }), 400
+        if len(records) > Config.INGEST_MAX_RECORDS:
+            return jsonify({
+                "error": f"Too many records. Maximum is {Config.INGEST_MAX_RECORDS}",
+                "status": "error"
+            }), 400
+        
+        label = 'donation' if kind == 'donation' else 'NGO'
+        accepted = []
+        rejected = []
+        for index, record in enumerate(records):
+            errors = validate_record(record, required, label)
+            if errors:
+                rejected.append({"index": index, "errors": errors})
+            else:
+                accepted.append(dict(record, id=record.get('id') or uuid.uuid4().hex,
+                                     created_at=datetime.now(timezone.utc).isoformat()))
+        
+        if single and rejected:
+            return jsonify({"error": "; ".join(rejected[0]["errors"]), "status": "error"}), 400
+        
+        with state_gate.shared():
+            durable = log_events([{"type": kind, "record": record} for record in accepted])
+            ids = [register(record) for record in accepted]
+            if history_store is not None and accepted:
+                history_store.extend(kind, accepted)
+        
+        if single:
+            body = {"id": ids[0], "status": "success"}
+        else:
+            body = {
+                "ids": ids,
+                "accepted": len(ids),
+                "rejected": rejected,
+                "status": "success" if not rejected else ("partial_success" if ids else "error")
+            }
+        return jsonify(with_durability(body, durable)), 201 if ids else 400
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+def replay_ingest_log(after_seq=0, offset=0):
+    """Rebuild the matching engine (and the history store) from the ingest log at startup"""
+    replayed = 0
+    history = {'donation': [], 'ngo_request': []}
+    for event in ingest_log.replay(after_seq, offset):
+        kind = event.get('type')
+        if kind in history:
+            history[kind].append(event['record'])
+        if kind == 'donation':
+            matching_engine.add_donation(event['record'])
+        elif kind == 'ngo_request':
+            matching_engine.add_ngo_request(event['record'])
+        elif kind == 'match':
+            matching_engine.restore_match(event['match'])
+        elif kind == 'match_status':
+            try:
+                matching_engine.update_match_status(event['match_id'], event['status'], event.get('updated_at'))
+            except KeyError:
+                pass  # the match has left the recent window
+        replayed += 1
+    if history_store is not None:
+        for kind, records in history.items():
+            history_store.extend(kind, records)
+    if replayed:
+        print(f"Replayed {replayed} ingest log events from {ingest_log.path}")
+    return replayed
+
+def snapshot_caches():
+    return {"chat": chat_cache, "distance": distance_cache.memory}
+
+def save_state_snapshot():
+    """Write the warm-restart snapshot now (also run periodically and at exit)"""
+    return snapshot.save(Config.SNAPSHOT_PATH, state_gate, matching_engine, ingest_log=ingest_log,
+                         history_store=history_store, caches=snapshot_caches())
+
+def state_position():
+    return (ingest_log.next_seq if ingest_log is not None else 0, matching_engine.version)
+
+def restore_state():
+    """
+    Load the latest snapshot, then replay only the ingest log written after it
+    
+    Timings go to startup_stats for /health; "ready_seconds" is measured
+    from process start where the OS reports it.
+    """
+    started = time.perf_counter()
+    restored = None
+    if Config.SNAPSHOT_ENABLED:
+        restored = snapshot.restore(Config.SNAPSHOT_PATH, matching_engine, history_store=history_store,
+                                    caches=snapshot_caches())
+    loaded = time.perf_counter()
+    replayed = 0
+    if ingest_log is not None:
+        if restored is not None:
+            replayed = replay_ingest_log(restored["ingest_seq"], restored["ingest_offset"])
+        else:
+            replayed = replay_ingest_log()
+    finished = time.perf_counter()
+    startup_stats.update({
+        "snapshot": restored,
+        "snapshot_load_seconds": round(loaded - started, 4),
+        "replayed_events": replayed,
+        "replay_seconds": round(finished - loaded, 4),
+        "restore_seconds": round(finished - started, 4),
+        "ready_seconds": snapshot.process_age()
+    })
+    if restored is not None:
+        print(f"Restored snapshot {restored['path']} ({restored['created_at']}) "
+              f"and {replayed} newer log events in {finished - started:.2f}s")
+    return startup_stats
+
+def catch_up_state(seq, offset):
+    """
+    Apply events logged after this process's parent loaded the state
+    
+    A preloading server's worker is forked from the state restored at
+    import; events an earlier worker logged since then are replayed here
+    when the new worker claims the ingest log (see ``IngestLog.claim``).
+    """
+    replayed = replay_ingest_log(seq, offset)
+    startup_stats["caught_up_events"] = replayed
+    return replayed
+
+# How the state was rebuilt at startup (reported by /health)
+startup_stats = {}
+snapshotter = None
+_restore_lock = threading.Lock()
+# Sharded state lives in shard processes, which must belong to the process
+# serving requests rather than a preloading master: claim_state restores it
+if not isinstance(matching_engine, ShardedMatchingEngine):
+    restore_state()
+    if ingest_log is not None:
+        ingest_log.catch_up = catch_up_state
+if Config.SNAPSHOT_ENABLED:
+    snapshotter = snapshot.Snapshotter(Config.SNAPSHOT_INTERVAL, save_state_snapshot, state_position)
+    atexit.register(snapshotter.save_if_changed)
+
+@bp.before_app_request
+def claim_state():
+    """The process serving requests owns the ingest log and snapshots (one per deployment, see wsgi.py)"""
+    if ingest_log is not None:
+        ingest_log.claim()
+    if not startup_stats:
+        with _restore_lock:
+            if not startup_stats:
+                restore_state()
+    if snapshotter is not None:
+        snapshotter.start()
+
+@bp.route('/match', methods=['GET'])
 def get_match_data():
     """
     Get matching data for donors, NGOs, and food quantities
-    Returns mock data for demonstration purposes
+    Aggregates are maintained incrementally by the matching engine and served
+    as a versioned snapshot: polls sending a matching If-None-Match get a 304
+    without the payload being rebuilt or re-serialized, and the encoded (and
+    compressed) body is shared by every poll of the same version.
+    
+    The snapshot includes "match_cursor". Polling with ?since=<cursor>
+    (optional &limit=N) returns the same aggregates but only the recent
+    matches made after the cursor, plus "next_cursor" for the next poll,
+    "has_more" when another page is waiting and "cursor_reset" when the
+    client should replace its list instead of prepending to it.
     """
     try:
-        # Mock data for demonstration
-        mock_data = {
-            "total_donors": 45,
-            "total_ngos": 23,
-            "total_food_quantity": 1250,
-            "food_units": "kg",
-            "donations_by_food_type": {
-                "Rice": 300,
-                "Wheat": 250,
-                "Vegetables": 200,
-                "Fruits": 150,
-                "Bread": 100,
-                "Milk": 150,
-                "Pulses": 100
-            },
-            "donations_by_location": {
-                "Delhi": 400,
-                "Mumbai": 300,
-                "Bangalore": 250,
-                "Chennai": 200,
-                "Kolkata": 100
-            },
-            "recent_matches": [
-                {
-                    "donor": "Restaurant ABC",
-                    "ngo": "Food Bank XYZ",
-                    "food": "Rice",
-                    "quantity": "50 kg",
-                    "status": "Matched"
-                },
-                {
-                    "donor": "Hotel DEF",
-                    "ngo": "Community Kitchen",
-                    "food": "Bread",
-                    "quantity": "25 kg",
-                    "status": "In Transit"
-                },
-                {
-                    "donor": "Catering GHI",
-                    "ngo": "Orphanage Home",
-                    "food": "Vegetables",
-                    "quantity": "30 kg",
-                    "status": "Delivered"
-                }
-            ],
-            "status": "success",
-            "last_updated": "2024-01-15T10:30:00Z"
-        }
+        if 'since' in request.args:
+            return match_delta(request.args['since'])
+        
+        version = matching_engine.current_version()
+        if request.if_none_match.contains_weak(match_etag(version)):
+            return not_modified(match_etag(version))
+        
+        encoding = response_encoding.choose_encoding(request.accept_encodings) if Config.COMPRESSION_ENABLED else None
+        version, body, encoding = match_body(encoding)
+        response = Response(body, mimetype='application/json', headers={"Cache-Control": "no-cache"})
+        response.set_etag(match_etag(version), weak=encoding is not None)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+def match_etag(version):
+    return f"{matching_engine.instance_id}-{version}"
+
+def not_modified(etag):
+    return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+
+def match_body(encoding=None):
+    """
+    (version, serialized /match snapshot, content coding), encoded once per engine version
+    
+    With a content coding ("gzip", "br") the compressed body is returned and
+    kept for the version too; snapshots under COMPRESSION_MIN_BYTES are sent
+    as they are and the returned coding is None.
+    """
+    global _match_body_cache
+    version, payload = matching_engine.snapshot()
+    cached = _match_body_cache
+    if cached is None or cached[0] != version:
+        cached = _match_body_cache = (version, current_app.json.dumps(payload).encode('utf-8'), {})
+    if encoding is None or len(cached[1]) < Config.COMPRESSION_MIN_BYTES:
+        return version, cached[1], None
+    compressed = cached[2].get(encoding)
+    if compressed is None:
+        compressed = cached[2][encoding] = compress_body(cached[1], encoding)
+    return version, compressed, encoding
+
+def match_delta(since):
+    """
+    GET /match?since=<cursor>: the snapshot with only the matches made after the cursor
+    
+    The ETag covers the engine version, cursor and limit, so a repeated poll
+    with nothing new gets a 304 before anything is looked up or serialized.
+    """
+    limit = request.args.get('limit', Config.MATCH_PAGE_LIMIT, type=int)
+    if limit < 1:
+        return jsonify({"error": "'limit' must be a positive integer", "status": "error"}), 400
+    etag = f"{match_etag(matching_engine.current_version())}-{since}-{limit}"
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    try:
+        matches, next_cursor, has_more, reset = matching_engine.matches_since(since, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e), "status": "error"}), 400
+    
+    payload = dict(matching_engine.snapshot()[1])
+    payload.update({
+        "recent_matches": matches,
+        "since": since,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "cursor_reset": reset
+    })
+    response = jsonify(payload)
+    response.headers["Cache-Control"] = "no-cache"
+    # The version read before the lookup: a change in between only costs the next poll a full response
+    response.set_etag(etag)
+    return response
+
+@bp.route('/match/stream', methods=['GET'])
+def match_stream_endpoint():
+    """
+    Server-sent events for the match dashboard
+    
+    Opens with a "snapshot" event (the GET /match payload), then sends a
+    "delta" event whenever something changes: "matches" made since the last
+    event, "status_changes" ({"id", "status", "updated_at"}) and the
+    "counters" whose values changed. Reconnecting clients send Last-Event-ID
+    and get the events they missed, or a fresh snapshot if those are gone.
+    Each connection holds a worker thread here; asgi.py serves the same
+    stream on its event loop for large numbers of idle dashboards.
+    """
+    if match_stream is None:
+        return jsonify({"error": "Match stream is disabled", "status": "error"}), 404
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(match_stream.frames(last_event_id), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@bp.route('/match/<match_id>/status', methods=['POST'])
+def update_match_status(match_id):
+    """
+    Update the delivery status of a recent match
+    
+    Expected JSON payload:
+    {
+        "status": "In Transit"        (one of "Matched", "In Transit", "Delivered")
+    }
+    """
+    try:
+        data = request.get_json(silent=True)
         
-        return jsonify(mock_data)
+        if not data or 'status' not in data:
+            return jsonify({
+                "error": "Missing 'status' field",
+                "status": "error"
+            }), 400
+        
+        with state_gate.shared():
+            try:
+                match = matching_engine.update_match_status(match_id, data['status'])
+            except ValueError as e:
+                return jsonify({"error": str(e), "status": "error"}), 400
+            except KeyError as e:
+                return jsonify({"error": str(e.args[0]), "status": "error"}), 404
+            
+            durable = log_events([{"type": "match_status", "match_id": match_id, "status": match['status'],
+                                   "updated_at": match['status_updated_at']}])
+        return jsonify(with_durability({"match": match, "status": "success"}, durable))
         
     except Exception as e:
         return jsonify({
@@ -400,6 +1411,334 @@ def get_match_data():
             "status": "error"
         }), 500
 
+@bp.route('/match', methods=['POST'])
+def create_match():
+    """
+    Match an open donation with an NGO request
+    
+    Expected JSON payload:
+    {
+        "donation_id": "abc123",
+        "ngo_id": "def456"            (optional, defaults to nearest compatible NGO)
+        "max_distance_km": 25         (optional)
+    }
+    or {"urgent": true} to match the open donation closest to expiry that
+    has a compatible NGO.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not (data.get('donation_id') or data.get('urgent')):
+            return jsonify({
+                "error": "Missing 'donation_id' field",
+                "status": "error"
+            }), 400
+        
+        error = validate_max_distance(data.get('max_distance_km'))
+        if error:
+            return jsonify({"error": error, "status": "error"}), 400
+        
+        with state_gate.shared():
+            try:
+                if data.get('donation_id'):
+                    match = matching_engine.match_donation(
+                        data['donation_id'],
+                        ngo_id=data.get('ngo_id'),
+                        max_distance_km=data.get('max_distance_km')
+                    )
+                else:
+                    match = matching_engine.match_most_urgent(
+                        max_distance_km=data.get('max_distance_km'),
+                        scan_limit=Config.MATCH_URGENT_SCAN
+                    )
+            except KeyError as e:
+                return jsonify({"error": str(e.args[0]), "status": "error"}), 404
+            except ValueError as e:
+                # The requested NGO doesn't need this food or is too far away
+                return jsonify({"error": str(e), "status": "error"}), 400
+            
+            if match is None:
+                return jsonify({
+                    "error": "No compatible NGO request found",
+                    "status": "no_match"
+                }), 404
+            
+            durable = log_events([{"type": "match", "match": match}])
+        return jsonify(with_durability({"match": match, "status": "success"}, durable))
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+@bp.route('/match/assign', methods=['POST'])
+def assign_matches():
+    """
+    Jointly assign open donations to NGO requests
+    
+    Unlike POST /match, which gives one donation its nearest NGO, this solves
+    all open donations at once so donors competing for the same NGO are
+    spread out. NGO requests may carry a "capacity" (donations they can take).
+    
+    Expected JSON payload (all optional):
+    {
+        "k": 5,                   (nearest compatible NGOs considered per donation)
+        "max_distance_km": 25,
+        "commit": false           (true records the matches, removes the donations
+                                   and uses up the NGO requests' capacity)
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        k = data.get('k', Config.ASSIGN_CANDIDATES_K)
+        if not isinstance(k, int) or isinstance(k, bool) or not (1 <= k <= 50):
+            return jsonify({
+                "error": "'k' must be an integer between 1 and 50",
+                "status": "error"
+            }), 400
+        error = validate_max_distance(data.get('max_distance_km'))
+        if error:
+            return jsonify({"error": error, "status": "error"}), 400
+        
+        plan, considered = plan_assignment(
+            matching_engine,
+            k=k,
+            max_distance_km=data.get('max_distance_km'),
+            match_value_km=Config.ASSIGN_MATCH_VALUE_KM,
+            urgency_weight_km=Config.ASSIGN_URGENCY_WEIGHT_KM,
+            epsilon=Config.ASSIGN_EPSILON
+        )
+        
+        matches = []
+        durable = True
+        if data.get('commit'):
+            with state_gate.shared():
+                for entry in plan:
+                    try:
+                        match = matching_engine.match_donation(entry['donation_id'], ngo_id=entry['ngo_id'],
+                                                               consume_ngo=True)
+                    except (KeyError, ValueError):
+                        # Taken, expired or filled since the plan was computed
+                        continue
+                    matches.append(match)
+                durable = log_events([{"type": "match", "match": match} for match in matches])
+        
+        return jsonify(with_durability({
+            "assignments": plan,
+            "matches": matches,
+            "assigned": len(plan),
+            "unassigned": considered - len(plan),
+            "total_distance_km": round(sum(entry['distance_km'] for entry in plan), 3),
+            "status": "success"
+        }, durable))
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+@bp.route('/match/urgent', methods=['GET'])
+def urgent_donations():
+    """
+    List open donations closest to expiry, soonest first
+    
+    Query parameters: optional limit (default 10). Donations without an
+    expiry time are not listed; expired ones have already been dropped.
+    """
+    try:
+        limit = request.args.get('limit', default=10, type=int)
+        donations = matching_engine.urgent_donations(limit=max(1, min(limit, 500)))
+        return jsonify({"donations": donations, "count": len(donations), "status": "success"})
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+@bp.route('/match/nearest', methods=['GET'])
+def nearest_ngos():
+    """
+    Find the nearest compatible NGO requests for a donation
+    
+    Query parameters: either donation_id, or lat & lng (and optionally food),
+    plus optional limit (default 5), max_distance_km and road=true to re-rank
+    the top candidates by Distance Matrix travel time.
+    """
+    try:
+        limit = request.args.get('limit', default=5, type=int)
+        max_distance_km = request.args.get('max_distance_km', type=float)
+        donation_id = request.args.get('donation_id')
+        
+        if donation_id:
+            try:
+                ngos = matching_engine.nearest_ngos(donation_id, limit=limit,
+                                                    max_distance_km=max_distance_km)
+            except KeyError as e:
+                return jsonify({"error": str(e.args[0]), "status": "error"}), 404
+            donation = matching_engine.get_donation(donation_id)
+            if donation is None:
+                return jsonify({"error": f"Unknown or expired donation: {donation_id}",
+                                "status": "error"}), 404
+            origin = (donation.get('lat'), donation.get('lng'))
+        else:
+            lat = request.args.get('lat', type=float)
+            lng = request.args.get('lng', type=float)
+            if lat is None or lng is None:
+                return jsonify({
+                    "error": "Provide either donation_id or lat and lng",
+                    "status": "error"
+                }), 400
+            error = validate_coordinates(lat, lng, 'query')
+            if error:
+                return jsonify({"error": error, "status": "error"}), 400
+            ngos = matching_engine.nearest_ngos(lat=lat, lng=lng,
+                                                food_type=request.args.get('food'),
+                                                limit=limit,
+                                                max_distance_km=max_distance_km)
+            origin = (lat, lng)
+        
+        if ngos:
+            ngos = rank_by_travel_time(origin, ngos,
+                                       use_road=request.args.get('road', 'false').lower() == 'true')
+        
+        return jsonify({"ngos": ngos, "count": len(ngos), "status": "success"})
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+@bp.route('/history', methods=['GET'])
+def history():
+    """
+    Filter and aggregate every donation and NGO request received
+    
+    Query parameters (all optional): kind (donation | ngo_request), food,
+    location, user, compatible_with (an NGO's "food needed" text), since /
+    until (ISO timestamps), expires_before, lat & lng & radius_km,
+    group_by (location | food | user, default location) and limit (most
+    recent matching records to include, default 0). Filters and totals run
+    over whole columns of the history store.
+    """
+    if history_store is None:
+        return jsonify({"error": "History store is disabled", "status": "error"}), 404
+    try:
+        args = request.args
+        limit = args.get('limit', default=0, type=int)
+        lat = args.get('lat', type=float)
+        lng = args.get('lng', type=float)
+        radius_km = args.get('radius_km', type=float)
+        near = None
+        if lat is not None or lng is not None or radius_km is not None:
+            if lat is None or lng is None or radius_km is None:
+                return jsonify({
+                    "error": "lat, lng and radius_km must be given together",
+                    "status": "error"
+                }), 400
+            error = validate_coordinates(lat, lng, 'query')
+            if error:
+                return jsonify({"error": error, "status": "error"}), 400
+            near = (lat, lng)
+        
+        group_by = args.get('group_by', 'location')
+        try:
+            mask = history_store.mask(
+                kind=args.get('kind'), food=args.get('food'), location=args.get('location'),
+                user=args.get('user'), compatible_with=args.get('compatible_with'),
+                since=args.get('since'), until=args.get('until'),
+                expires_before=args.get('expires_before'), near=near, radius_km=radius_km
+            )
+            groups = history_store.aggregate(group_by, mask)
+        except ValueError as e:
+            return jsonify({"error": str(e), "status": "error"}), 400
+        
+        return jsonify({
+            "total": history_store.totals(mask),
+            "group_by": group_by,
+            "groups": groups,
+            "records": history_store.records(mask, limit=max(0, min(limit, 1000))),
+            "store": history_store.memory_stats(),
+            "status": "success"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "error": f"An error occurred: {str(e)}",
+            "status": "error"
+        }), 500
+
+def rank_by_travel_time(origin, ngos, use_road=False):
+    """
+    Attach estimated ETAs to candidate NGOs and optionally re-rank by road time
+    
+    The offline estimator scores every candidate in one vectorized call; only
+    the best MATCH_ROAD_CANDIDATES are then sent to the (paid) Distance Matrix
+    API in a single request and re-ordered by real travel time.
+    """
+    destinations = [(ngo['lat'], ngo['lng']) for ngo in ngos]
+    road_km, minutes = distance_estimator.estimate_matrix([origin], destinations)
+    for ngo, km, mins in zip(ngos, road_km[0].tolist(), minutes[0].tolist()):
+        ngo['estimated_distance_km'] = round(km, 3)
+        ngo['estimated_minutes'] = round(mins, 1)
+    
+    if not use_road:
+        return ngos
+    
+    order = distance_estimator.top_candidates(origin, destinations, Config.MATCH_ROAD_CANDIDATES)
+    shortlist = [ngos[i] for i in order]
+    shortlist_destinations = [destinations[i] for i in order]
+    matrix, _ = get_distance_matrix([origin], shortlist_destinations, cache=distance_cache)
+    matrix = fill_unknown_distances(matrix, [origin], shortlist_destinations)
+    for ngo, element in zip(shortlist, matrix[0]):
+        ngo['distance'] = element['distance']
+        ngo['duration'] = element['duration']
+        ngo['duration_seconds'] = element.get('duration_seconds')
+        ngo['distance_source'] = element_source(element)
+    
+    shortlist.sort(key=lambda ngo: ngo['duration_seconds'] if ngo['duration_seconds'] is not None
+                   else ngo['estimated_minutes'] * 60)
+    chosen = {id(ngo) for ngo in shortlist}
+    return shortlist + [ngo for ngo in ngos if id(ngo) not in chosen]
+
+def create_app(config_name=None):
+    """
+    Build the Flask app with the settings class from config.py
+    
+    ``config_name`` is a key of ``config.config`` ("development",
+    "production", "testing"); FLASK_ENV picks it by default. The matching
+    engine, caches and ingest log are module-level and shared by every app
+    built in the process, so a server that preloads this module (see wsgi.py)
+    builds them once before forking its workers.
+    """
+    config_class = config.get(config_name or Config.FLASK_ENV, config['default'])
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    config_class.init_app(app)
+    
+    origins = app.config['CORS_ORIGINS']
+    CORS(app, origins='*' if origins == '*' else [origin.strip() for origin in origins.split(',')])
+    if app.config['FAST_JSON_ENABLED']:
+        app.json = response_encoding.FastJSONProvider(app)
+    app.register_blueprint(bp)
+    return app
+
+_default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    """``app.app``: the default application, built on first access"""
+    if name == 'app':
+        with _default_app_lock:
+            if 'app' not in globals():
+                globals()['app'] = create_app()
+        return globals()['app']
+    if name == 'openai':
+        return load_openai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
     # Get port from environment variable or use default
     port = int(os.environ.get('PORT', 5000))
@@ -415,4 +1754,5 @@ if __name__ == '__main__':
     else:
         print("✅ OpenAI API key configured. Chat endpoint is ready.")
     
-    app.run(host='0.0.0.0', port=port, debug=True)
+    app = create_app()
+    app.run(host='0.0.0.0', port=port, debug=app.config.get('DEBUG', False))
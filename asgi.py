@@ -0,0 +1,361 @@
+"""
+ASGI serving mode for the XYLMCSCICS Food Donation Platform API
+
+POST /chat and POST /route are served natively on the event loop and await
+OpenAI / the Distance Matrix API without holding a thread, so one process
+can keep hundreds of requests in flight. GET /match/stream is native too:
+an idle dashboard connection is a suspended coroutine rather than a
+thread. Every other route is passed to the Flask app from app.py on a
+small thread pool, so endpoints and response shapes are identical in both
+modes. Native responses are compressed like Flask's, and native requests
+picked for profiling (X-Profile or PROFILE_SAMPLE_RATE) go through Flask,
+whose hooks profile them.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.http import parse_accept_header
+
+import app as api
+import maps_client
+import metrics
+import response_encoding
+from cache import AsyncSingleFlight
+from config import Config
+from extraction import extract_with_openai_async, load_openai, normalize_message
+from http_client import AsyncHTTPClient
+from scheduler import SchedulerBusy, estimate_tokens, message_urgency
+
+flask_app = api.app
+
+# Threads for routes that still run through Flask (cheap, non-blocking handlers)
+wsgi_executor = ThreadPoolExecutor(max_workers=Config.ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+chat_single_flight = AsyncSingleFlight()
+
+
+def setup_upstreams():
+    """Create the aiohttp Maps client, sharing the sync client's circuit breaker"""
+    if maps_client.async_http_client is None:
+        maps_client.async_http_client = AsyncHTTPClient(
+            name='google-maps',
+            connect_timeout=Config.MAPS_CONNECT_TIMEOUT,
+            read_timeout=Config.MAPS_READ_TIMEOUT,
+            max_retries=Config.MAPS_MAX_RETRIES,
+            backoff_base=Config.MAPS_BACKOFF_BASE,
+            backoff_max=Config.MAPS_BACKOFF_MAX,
+            pool_size=Config.MAPS_POOL_SIZE,
+            breaker=maps_client.http_client.breaker
+        )
+
+
+async def close_upstreams():
+    if maps_client.async_http_client is not None:
+        await maps_client.async_http_client.close()
+        maps_client.async_http_client = None
+
+
+async def scheduled_extraction_async(user_message):
+    """Async ``app.scheduled_extraction``: waits for the scheduler without holding a thread"""
+    if api.llm_scheduler is None:
+        return await extract_with_openai_async(user_message)
+    return await api.llm_scheduler.acall(lambda: extract_with_openai_async(user_message),
+                                         message_urgency(user_message), estimate_tokens(user_message))
+
+
+async def extract_donation_async(user_message):
+    """Async ``app.extract_donation``: same cache, one in-flight call per message"""
+    if not Config.CHAT_CACHE_ENABLED:
+        result = await scheduled_extraction_async(user_message)
+        api.record_extraction_path("llm", result["status"])
+        return dict(result, extraction_path="llm")
+
+    key = normalize_message(user_message)
+    cached = api.chat_cache.get(key)
+    path = "cache"
+    if cached is None:
+        async def compute():
+            result = await scheduled_extraction_async(user_message)
+            if result["status"] == "success":
+                api.chat_cache.set(key, result)
+            return result
+
+        cached = await chat_single_flight.do(key, compute)
+        path = "llm"
+
+    api.record_extraction_path(path, cached["status"])
+    return dict(cached, original_message=user_message, extraction_path=path)
+
+
+async def chat_endpoint(data):
+    """Async POST /chat; mirrors ``app.chat_endpoint``"""
+    if not data:
+        return {"error": "No JSON data provided", "status": "error"}, 400
+
+    user_message = data.get('message')
+    if not user_message:
+        return {"error": "Missing 'message' field", "status": "error"}, 400
+
+    result = api.try_rules_extraction(user_message)
+    if result is not None:
+        return api.add_coordinates(result), 200
+
+    if not load_openai().api_key:
+        return {"error": "OpenAI API key not configured", "status": "error"}, 500
+
+    try:
+        return api.add_coordinates(await extract_donation_async(user_message)), 200
+    except SchedulerBusy as busy:
+        return api.scheduler_busy_result(busy), 429
+    except Exception as openai_error:
+        print(f"OpenAI API error: {openai_error}")
+        return {"error": f"OpenAI API error: {str(openai_error)}", "status": "error"}, 500
+
+
+async def route_endpoint(data):
+    """Async POST /route; mirrors ``app.get_route``"""
+    if data and 'pickups' in data:
+        # Multi-stop planning is CPU work around one matrix call: keep it off the loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(wsgi_executor, api.plan_pickup_route, data)
+
+    coordinates, error = api.parse_route_request(data)
+    if error:
+        return error
+
+    origin, destination = coordinates[:2], coordinates[2:]
+    use_cache = data.get('use_cache', True)
+    matrix, _ = await maps_client.get_distance_matrix_async(
+        [origin], [destination], cache=api.distance_cache if use_cache else None
+    )
+    distance_info = api.distance_info_from_matrix(matrix, origin, destination)
+    return api.build_route_response(coordinates, distance_info), 200
+
+
+NATIVE_ROUTES = {
+    ('POST', '/chat'): chat_endpoint,
+    ('POST', '/route'): route_endpoint,
+}
+
+
+def cors_headers(scope):
+    """
+    Access-Control-Allow-Origin for a native route, as flask-cors sends it for the others
+
+    With a list of origins in CORS_ORIGINS the request's Origin is echoed
+    back only when it is on the list.
+    """
+    if Config.CORS_ORIGINS == '*':
+        return [(b'access-control-allow-origin', b'*')]
+    origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin-1')
+    if origin and origin in {allowed.strip() for allowed in Config.CORS_ORIGINS.split(',')}:
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    return []
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def match_stream_endpoint(scope, receive, send):
+    """GET /match/stream (see ``app.match_stream_endpoint``) without a thread per connection"""
+    if api.match_stream is None:
+        await send_json(send, {"error": "Match stream is disabled", "status": "error"}, 404, scope)
+        return
+    headers = dict(scope.get('headers', []))
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1')
+    if not last_event_id:
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        last_event_id = query.get('last_event_id', [None])[0]
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ] + cors_headers(scope)})
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    frames = api.match_stream.aframes(last_event_id)
+    try:
+        while True:
+            next_frame = asyncio.ensure_future(frames.__anext__())
+            await asyncio.wait({next_frame, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_frame.done():
+                next_frame.cancel()
+                await asyncio.wait({next_frame})
+                break
+            await send({'type': 'http.response.body', 'body': next_frame.result(), 'more_body': True})
+    finally:
+        disconnected.cancel()
+        await frames.aclose()
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+async def send_response(send, status_code, headers, body):
+    await send({'type': 'http.response.start', 'status': status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def compress_json(body, status_code, scope):
+    """``(body, headers)``: a native JSON body compressed as ``app.compress_response`` would"""
+    if not Config.COMPRESSION_ENABLED or status_code != 200:
+        return body, []
+    accept = dict(scope.get('headers', [])).get(b'accept-encoding', b'').decode('latin-1')
+    encoding = response_encoding.choose_encoding(parse_accept_header(accept))
+    if encoding is None or len(body) < Config.COMPRESSION_MIN_BYTES:
+        return body, [(b'vary', b'Accept-Encoding')]
+    return api.compress_body(body, encoding), [(b'content-encoding', encoding.encode('latin-1')),
+                                               (b'vary', b'Accept-Encoding')]
+
+
+async def send_json(send, payload, status_code, scope):
+    body = flask_app.json.dumps(payload).encode('utf-8') + b'\n'
+    body, encoding_headers = compress_json(body, status_code, scope)
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1')),
+    ] + encoding_headers + cors_headers(scope)
+    if status_code == 429 and 'retry_after' in payload:
+        headers.append((b'retry-after', str(payload['retry_after']).encode('latin-1')))
+    await send_response(send, status_code, headers, body)
+
+
+def wants_profile(scope):
+    """Whether a native request should be profiled (see ``app.should_profile``)"""
+    if not (Config.PROFILE_ADMIN_TOKEN or Config.PROFILE_SAMPLE_RATE):
+        return False
+    header = dict(scope.get('headers', [])).get(b'x-profile', b'').decode('latin-1')
+    return api.should_profile(header)
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        # The whole body is already read, so this also covers chunked uploads
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def run_wsgi(environ):
+    """Call the Flask app synchronously and collect the full response"""
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured['status'] = int(status.split(' ', 1)[0])
+        captured['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: None
+
+    result = flask_app.wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return captured['status'], captured['headers'], body
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                # Native routes skip Flask's before_request hooks: claim the state here
+                api.claim_state()
+            except RuntimeError as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            setup_upstreams()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_upstreams()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    setup_upstreams()
+    if (scope['method'], scope['path']) == ('GET', '/match/stream'):
+        await match_stream_endpoint(scope, receive, send)
+        return
+    body = await read_body(receive)
+    handler = NATIVE_ROUTES.get((scope['method'], scope['path']))
+    profile = handler is not None and wants_profile(scope)
+
+    if handler is None or profile:
+        environ = build_environ(scope, body)
+        if profile:
+            environ['xylm.profile'] = True
+        loop = asyncio.get_running_loop()
+        status_code, headers, response_body = await loop.run_in_executor(wsgi_executor, run_wsgi, environ)
+        await send_response(send, status_code, headers, response_body)
+        return
+
+    started = time.perf_counter()
+    try:
+        data = json.loads(body) if body else None
+        payload, status_code = await handler(data)
+    except Exception as e:
+        payload, status_code = {"error": f"An error occurred: {str(e)}", "status": "error"}, 500
+    await send_json(send, payload, status_code, scope)
+    if Config.METRICS_ENABLED:
+        metrics.REQUESTS.inc(scope['path'], scope['method'], str(status_code))
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, scope['path'], scope['method'])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5000))
+    print(f"🚀 Starting XYLMCSCICS API (ASGI mode) on port {port}")
+    uvicorn.run('asgi:application', host='0.0.0.0', port=port, workers=Config.ASGI_WORKERS)
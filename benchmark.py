@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load test for the XYLMCSCICS Food Donation Platform API
+
+Starts the Flask app in-process against local stand-ins for the OpenAI Chat
+Completions and Google Distance Matrix APIs (with configurable latency and
+error rates), drives ``/chat``, ``/route`` and ``/match`` at a target
+concurrency and writes throughput and p50/p95/p99 latency as JSON. No API
+keys or network access are needed, so runs are comparable between releases.
+
+Usage:
+    python benchmark.py --concurrency 16 --duration 10 --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.2   # exit 1 on regressions
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from estimator import format_distance, format_duration
+from matching import haversine_km
+
+SCENARIOS = ('chat', 'route', 'match')
+
+FOODS = ('rice', 'dal', 'rotis', 'biryani', 'sandwiches', 'vegetables', 'fruits', 'bread')
+PLACES = ('Delhi', 'Saket', 'Noida', 'Gurgaon', 'Mumbai', 'Bangalore', 'Lajpat Nagar', 'Dwarka')
+
+# Donors and NGOs are placed inside this box (Delhi NCR)
+LAT_RANGE = (28.45, 28.75)
+LNG_RANGE = (76.95, 77.35)
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class FakeUpstreams:
+    """
+    Local OpenAI and Distance Matrix servers on one ephemeral port
+
+    Every request waits ``latency_ms`` (plus up to ``jitter_ms``) and fails
+    with HTTP 500 with probability ``error_rate``. Distance Matrix answers are
+    great-circle distances scaled like a road network.
+    """
+
+    def __init__(self, latency_ms=50, jitter_ms=10, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = {"openai": 0, "distance_matrix": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def openai_api_base(self):
+        return self.base_url + '/v1'
+
+    @property
+    def distance_matrix_url(self):
+        return self.base_url + '/maps/api/distancematrix/json'
+
+    def start(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.startswith('/v1/chat/completions'):
+                    return self._send(404, {"error": {"message": "Not found"}})
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if upstreams._delay('openai'):
+                    return self._send(500, {"error": {"message": "Injected failure", "type": "server_error"}})
+                self._send(200, upstreams.completion(json.loads(body or b'{}')))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/maps/api/distancematrix/json':
+                    return self._send(404, {"status": "NOT_FOUND"})
+                if upstreams._delay('distance_matrix'):
+                    return self._send(500, {"status": "UNKNOWN_ERROR"})
+                self._send(200, upstreams.distance_matrix(parse_qs(url.query)))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-upstreams', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _delay(self, upstream):
+        """Count the call, sleep for the simulated latency and say whether it should fail"""
+        with self._lock:
+            self.calls[upstream] += 1
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        return fail
+
+    def completion(self, request_body):
+        """A Chat Completions response naming the food and place found in the prompt"""
+        text = str((request_body.get('messages') or [{}])[-1].get('content', '')).lower()
+        food = next((food for food in FOODS if food in text), 'unknown')
+        place = next((place for place in PLACES if place.lower() in text), 'unknown')
+        content = json.dumps({"food": food, "quantity": "unknown", "expiry": "unknown", "location": place})
+        return {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request_body.get('model', 'gpt-3.5-turbo'),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    def distance_matrix(self, params):
+        def points(name):
+            return [tuple(float(x) for x in point.split(','))
+                    for point in params.get(name, [''])[0].split('|') if point]
+
+        rows = []
+        for origin in points('origins'):
+            elements = []
+            for destination in points('destinations'):
+                km = haversine_km(*origin, *destination) * 1.3
+                minutes = km / 25 * 60 + 2
+                elements.append({
+                    "status": "OK",
+                    "distance": {"text": format_distance(km), "value": int(km * 1000)},
+                    "duration": {"text": format_duration(minutes), "value": int(minutes * 60)}
+                })
+            rows.append({"elements": elements})
+        return {"status": "OK", "rows": rows}
+
+
+def _random_point(rng):
+    return round(rng.uniform(*LAT_RANGE), 5), round(rng.uniform(*LNG_RANGE), 5)
+
+
+def chat_operation(call, rng, n, llm_share=0.5):
+    """
+    One ``/chat`` message
+
+    Structured messages come from a small pool (rules extractor and cache);
+    the ``llm_share`` of free-form ones are unique, so each reaches the
+    OpenAI stand-in.
+    """
+    if rng.random() < llm_share:
+        message = (f"Hi, order {n} from our event left a lot of {rng.choice(FOODS)}, "
+                   f"could someone near {rng.choice(PLACES)} come collect it")
+    else:
+        message = (f"I have {rng.randint(2, 12)} kg of {rng.choice(FOODS)} in {rng.choice(PLACES)}, "
+                   f"expires in {rng.randint(1, 8)} hours")
+    call('POST', '/chat', 'POST /chat', json={"message": message})
+
+
+def route_operation(call, rng, n, pickups=5):
+    """A donor-to-NGO route, or every fifth operation a multi-stop pickup plan"""
+    if n % 5 == 4:
+        depot_lat, depot_lng = _random_point(rng)
+        stops = []
+        for _ in range(pickups):
+            lat, lng = _random_point(rng)
+            stops.append({"lat": lat, "lng": lng, "expiryTime": rng.randint(1, 12)})
+        call('POST', '/route', 'POST /route (pickups)',
+             json={"depot": {"lat": depot_lat, "lng": depot_lng}, "pickups": stops})
+        return
+    donor_lat, donor_lng = _random_point(rng)
+    ngo_lat, ngo_lng = _random_point(rng)
+    call('POST', '/route', 'POST /route',
+         json={"donor_lat": donor_lat, "donor_lng": donor_lng, "ngo_lat": ngo_lat, "ngo_lng": ngo_lng})
+
+
+def match_operation(call, rng, n):
+    """Register a donation and a compatible NGO request, then match them (every tenth also reads /match)"""
+    food = rng.choice(FOODS)
+    lat, lng = _random_point(rng)
+    donation = call('POST', '/donations', 'POST /donations', json={
+        "foodType": food, "quantity": f"{rng.randint(2, 20)}kg", "expiryTime": rng.randint(1, 48),
+        "location": "Delhi", "lat": lat, "lng": lng, "userId": "benchmark"
+    })
+    ngo = call('POST', '/ngo-requests', 'POST /ngo-requests', json={
+        "ngoName": f"Benchmark NGO {n}", "foodNeeded": food, "location": "Delhi",
+        "lat": round(lat + rng.uniform(-0.02, 0.02), 5), "lng": round(lng + rng.uniform(-0.02, 0.02), 5)
+    })
+    if donation and ngo and donation.get('id') and ngo.get('id'):
+        call('POST', '/match', 'POST /match', json={"donation_id": donation['id'], "ngo_id": ngo['id']})
+    if n % 10 == 0:
+        call('GET', '/match', 'GET /match')
+
+
+OPERATIONS = {"chat": chat_operation, "route": route_operation, "match": match_operation}
+
+
+def run_load(base_url, operation, concurrency=8, duration=None, operations=None, seed=0):
+    """
+    Run ``operation`` from ``concurrency`` threads until ``duration`` seconds
+    pass or ``operations`` have been started
+
+    Returns ``(samples, elapsed, operations_done)`` where each sample is
+    ``(label, status, seconds)``; status 0 means the request raised.
+    """
+    if duration is None and operations is None:
+        raise ValueError("Pass duration or operations")
+    counter = itertools.count()
+    samples = []
+    samples_lock = threading.Lock()
+    done = [0]
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+
+    def worker(index):
+        session = requests.Session()
+        rng = random.Random(seed * 1000 + index)
+        local = []
+
+        def call(method, path, label, **kwargs):
+            request_started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, timeout=60, **kwargs)
+                status = response.status_code
+                body = response.json() if 'json' in response.headers.get('Content-Type', '') else None
+            except Exception:
+                status, body = 0, None
+            local.append((label, status, time.perf_counter() - request_started))
+            return body
+
+        count = 0
+        while True:
+            n = next(counter)
+            if operations is not None and n >= operations:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            operation(call, rng, n)
+            count += 1
+        session.close()
+        with samples_lock:
+            samples.extend(local)
+            done[0] += count
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'bench-{i}') for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started, done[0]
+
+
+def summarize(samples, elapsed):
+    """Request count, error rate, throughput and latency percentiles (ms) for a list of samples"""
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples)
+    errors = sum(1 for _, status, _ in samples if not 200 <= status < 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 50)),
+            "p95": _round(percentile(latencies, 95)),
+            "p99": _round(percentile(latencies, 99)),
+            "mean": _round(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _round(latencies[-1]) if latencies else None
+        }
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+class AppServer:
+    """The Flask app served by werkzeug's threaded server on an ephemeral port"""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='bench-app', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _point_app_at(app_module, upstreams):
+    """Send the app's OpenAI and Distance Matrix calls to ``upstreams``; returns an undo function"""
+    import maps_client
+    openai = app_module.openai
+    saved = (openai.api_key, openai.api_base, maps_client.DISTANCE_MATRIX_URL, os.environ.get('GOOGLE_MAPS_API_KEY'))
+    openai.api_key = 'benchmark-key'
+    openai.api_base = upstreams.openai_api_base
+    maps_client.DISTANCE_MATRIX_URL = upstreams.distance_matrix_url
+    os.environ['GOOGLE_MAPS_API_KEY'] = 'benchmark-key'
+
+    def restore():
+        openai.api_key, openai.api_base, maps_client.DISTANCE_MATRIX_URL, maps_key = saved
+        if maps_key is None:
+            os.environ.pop('GOOGLE_MAPS_API_KEY', None)
+        else:
+            os.environ['GOOGLE_MAPS_API_KEY'] = maps_key
+    return restore
+
+
+def run_benchmark(scenarios=SCENARIOS, concurrency=8, duration=None, operations=None, warmup=0,
+                  latency_ms=50, jitter_ms=10, error_rate=0.0, seed=0):
+    """
+    Benchmark each scenario against a fresh set of fake upstreams
+
+    ``warmup`` operations per scenario are run first and left out of the
+    results. Returns the report dict written by ``main``.
+    """
+    import app as app_module
+
+    upstreams = FakeUpstreams(latency_ms, jitter_ms, error_rate, seed).start()
+    restore = _point_app_at(app_module, upstreams)
+    server = AppServer(app_module.app).start()
+    results = {}
+    try:
+        for name in scenarios:
+            operation = OPERATIONS[name]
+            if warmup:
+                run_load(server.base_url, operation, concurrency, operations=warmup, seed=seed + 1)
+            calls_before = dict(upstreams.calls)
+            samples, elapsed, done = run_load(server.base_url, operation, concurrency,
+                                              duration=duration, operations=operations, seed=seed)
+            result = summarize(samples, elapsed)
+            result["operations"] = done
+            result["duration_s"] = round(elapsed, 3)
+            result["upstream_calls"] = {key: upstreams.calls[key] - calls_before[key] for key in upstreams.calls}
+            result["endpoints"] = {
+                label: summarize([sample for sample in samples if sample[0] == label], elapsed)
+                for label in sorted({sample[0] for sample in samples})
+            }
+            results[name] = result
+    finally:
+        server.stop()
+        restore()
+        upstreams.stop()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "operations": operations,
+            "warmup": warmup,
+            "upstream": {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate}
+        },
+        "scenarios": results
+    }
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Regressions of ``report`` against ``baseline``
+
+    A scenario regresses when its p95 or p99 latency grows, or its
+    throughput drops, by more than ``tolerance`` (a fraction), or its error
+    rate rises by more than one percentage point. Returns a list of messages.
+    """
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for key in ("p95", "p99"):
+            before, after = previous["latency_ms"].get(key), current["latency_ms"].get(key)
+            if before and after and after > before * (1 + tolerance):
+                regressions.append(f"{name}: {key} latency {before:.1f} ms -> {after:.1f} ms")
+        before, after = previous["throughput_rps"], current["throughput_rps"]
+        if before and after < before * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before:.1f} -> {after:.1f} req/s")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {previous['error_rate']:.2%} -> {current['error_rate']:.2%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /chat, /route and /match against fake upstreams")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="comma-separated scenarios (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument('--operations', type=int, help="operations per scenario instead of --duration")
+    parser.add_argument('--warmup', type=int, default=20, help="unmeasured operations per scenario")
+    parser.add_argument('--upstream-latency-ms', type=float, default=50)
+    parser.add_argument('--upstream-jitter-ms', type=float, default=10)
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', help="earlier report to compare against; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed fractional slowdown")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    # Keep the app's on-disk state out of the working tree
+    state_dir = tempfile.mkdtemp(prefix='xylmcscics-bench-')
+    os.environ.setdefault('INGEST_LOG_PATH', os.path.join(state_dir, 'ingest_log.jsonl'))
+    os.environ.setdefault('DISTANCE_CACHE_PATH', os.path.join(state_dir, 'distance_cache.sqlite3'))
+    os.environ.setdefault('SNAPSHOT_PATH', os.path.join(state_dir, 'state.snapshot'))
+
+    report = run_benchmark(scenarios, args.concurrency,
+                           duration=None if args.operations else args.duration,
+                           operations=args.operations, warmup=args.warmup,
+                           latency_ms=args.upstream_latency_ms, jitter_ms=args.upstream_jitter_ms,
+                           error_rate=args.upstream_error_rate, seed=args.seed)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(f"{name:>6}: {result['throughput_rps']:8.1f} req/s  p50 {latency['p50']} ms  "
+              f"p95 {latency['p95']} ms  p99 {latency['p99']} ms  errors {result['errors']}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Caching helpers for the XYLMCSCICS Food Donation Platform
+
+``LRUCache`` is a size-bounded in-memory cache with per-entry TTL.
+``SQLiteCache`` is a persistent key/value tier so hit rates survive restarts.
+``DistanceCache`` combines both for Distance Matrix results.
+``SingleFlight`` collapses concurrent calls for the same key into one
+(``AsyncSingleFlight`` does the same for coroutines).
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheStats:
+    """Hit/miss counters shared by the cache tiers"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with a TTL per entry"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Return a cached value (refreshing its recency) or ``default``"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds=None, expires_at=None):
+        """Store a value, evicting the least recently used entries if full"""
+        if expires_at is None:
+            ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+            expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def entries(self):
+        """Unexpired ``(key, value, expires_at)`` tuples, least recently used first"""
+        now = time.time()
+        with self._lock:
+            return [(key, value, expires_at) for key, (value, expires_at) in self._data.items()
+                    if expires_at is None or expires_at > now]
+
+    def load(self, entries):
+        """Add entries produced by ``entries()`` (e.g. from a snapshot), skipping expired ones"""
+        now = time.time()
+        for key, value, expires_at in entries:
+            if expires_at is None or expires_at > now:
+                self.set(key, value, expires_at=expires_at)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one in-flight call
+
+    The first caller for a key runs the function; callers arriving while it
+    is running wait and receive the same result (or exception).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Run ``fn()`` for ``key`` unless an identical call is already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines running on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Await ``fn()`` for ``key`` unless an identical call is already in flight"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: release the waiters rather than leave them hanging
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+class SQLiteCache:
+    """
+    Persistent JSON key/value cache stored in a local SQLite file
+
+    SQLite connections must not cross ``fork()``, so a process forked from
+    the one that opened the cache (a preloaded server's worker) opens its
+    own connection on first use.
+    """
+
+    def __init__(self, path, ttl_seconds=None, table='cache'):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._connection()
+
+    def _connection(self):
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key):
+        """Return ``(value, expires_at)`` for a live entry, or None"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                conn.commit()
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            return json.loads(value), expires_at
+
+    def set(self, key, value):
+        """Store a JSON-serializable value and return its expiry timestamp"""
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            conn.commit()
+        return expires_at
+
+    def purge_expired(self):
+        """Delete expired rows and return how many were removed"""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+
+class DistanceCache:
+    """
+    Two-tier cache for Distance Matrix elements
+
+    Keys are origin/destination coordinates rounded to ``precision`` decimal
+    places (4 places is roughly 11 m), so the same restaurant or kitchen hits
+    the cache even when its GPS fix jitters slightly. Lookups go to the
+    in-memory LRU first and fall back to the SQLite tier, promoting hits.
+    """
+
+    def __init__(self, precision=4, ttl_seconds=7 * 24 * 3600, max_entries=10000,
+                 path=None, enabled=True):
+        self.precision = precision
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk = SQLiteCache(path, ttl_seconds=ttl_seconds, table='distances') if path else None
+
+    def key(self, origin, destination):
+        p = self.precision
+        return (f"{round(origin[0], p)},{round(origin[1], p)}|"
+                f"{round(destination[0], p)},{round(destination[1], p)}")
+
+    def get(self, origin, destination):
+        """Return the cached element for a pair, or None"""
+        if not self.enabled:
+            return None
+        key = self.key(origin, destination)
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        entry = self.disk.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        self.memory.set(key, value, expires_at=expires_at)
+        return value
+
+    def set(self, origin, destination, element):
+        """Cache a successful element in both tiers"""
+        if not self.enabled:
+            return
+        key = self.key(origin, destination)
+        expires_at = self.disk.set(key, element) if self.disk is not None else None
+        self.memory.set(key, element, expires_at=expires_at)
+
+    def stats(self):
+        stats = {
+            "enabled": self.enabled,
+            "precision": self.precision,
+            "memory": dict(self.memory.stats.as_dict(), entries=len(self.memory),
+                           max_entries=self.memory.max_entries)
+        }
+        hits = self.memory.stats.hits
+        misses = self.memory.stats.misses
+        if self.disk is not None:
+            stats["disk"] = dict(self.disk.stats.as_dict(), entries=len(self.disk), path=self.disk.path)
+            hits += self.disk.stats.hits
+            misses = self.disk.stats.misses
+        lookups = hits + misses
+        stats["hits"] = hits
+        stats["misses"] = misses
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,303 @@
+"""
+Columnar store for historical donations and NGO requests
+
+Each record costs a few dozen bytes in NumPy columns instead of a Python
+dict of strings: food types, cities and user ids are dictionary-encoded
+(every distinct value is stored once and rows hold its integer code),
+coordinates are packed float32 and timestamps uint32 epoch seconds.
+Filters and aggregates work on whole columns, and predicates on encoded
+values (e.g. food compatibility) are evaluated once per distinct value
+rather than once per row.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from estimator import EARTH_RADIUS_KM
+from matching import is_compatible, normalize_label, parse_expiry_hours, parse_quantity
+
+KINDS = ('donation', 'ngo_request')
+
+# (column, dtype); timestamps are epoch seconds with 0 meaning "none"
+COLUMNS = (
+    ('kind', np.uint8),
+    ('food', np.int32),
+    ('city', np.int32),
+    ('user', np.int32),
+    ('quantity', np.float32),
+    ('lat', np.float32),
+    ('lng', np.float32),
+    ('created_at', np.uint32),
+    ('expires_at', np.uint32),
+)
+
+
+def epoch_seconds(value):
+    """Epoch seconds for an ISO 8601 string, datetime or number (None if unparseable)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # app.js timestamps may be milliseconds
+        return int(value / 1000 if value > 1e11 else value)
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+class Dictionary:
+    """Interned strings: each distinct value is kept once and rows store its code"""
+
+    def __init__(self):
+        self._codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """Code for ``value``, or None if no row has it"""
+        return self._codes.get(value)
+
+    def codes_where(self, predicate):
+        """Codes of the values satisfying ``predicate`` (evaluated once per distinct value)"""
+        return np.array([code for code, value in enumerate(list(self.values)) if predicate(value)],
+                        dtype=np.int32)
+
+
+class ColumnarStore:
+    """
+    Append-only columns for donation and NGO request records
+
+    Records take the shapes built in app.js (``foodType``/``foodNeeded``,
+    ``quantity``, ``expiryTime``, ``location``, ``userId``/``ngoName``,
+    ``timestamp``/``created_at``, optional ``lat``/``lng``). ``mask``
+    builds a row filter, ``aggregate`` and ``totals`` reduce over it and
+    ``records`` turns selected rows back into dicts.
+    """
+
+    # Filter/grouping name -> (dictionary attribute, column)
+    GROUPS = {'food': ('foods', 'food'), 'location': ('cities', 'city'), 'user': ('users', 'user')}
+
+    def __init__(self, capacity=4096):
+        self.foods = Dictionary()
+        self.cities = Dictionary()
+        self.users = Dictionary()
+        self._columns = {name: np.zeros(max(1, capacity), dtype=dtype) for name, dtype in COLUMNS}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra):
+        capacity = max(1, len(self._columns['kind']))
+        needed = self._size + extra
+        # Columns loaded from a snapshot are read-only views of the mapped file
+        writeable = all(column.flags.writeable for column in self._columns.values())
+        if needed <= capacity and writeable:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _encode(self, kind, record):
+        if kind == 'donation':
+            food = record.get('foodType')
+            user = record.get('userId') or record.get('donor')
+        else:
+            food = record.get('foodNeeded')
+            user = record.get('ngoName')
+        created = epoch_seconds(record.get('created_at') or record.get('timestamp')) or 0
+        hours = parse_expiry_hours(record) if created else None
+        lat, lng = record.get('lat'), record.get('lng')
+        return (
+            KINDS.index(kind),
+            self.foods.encode(normalize_label(food)),
+            self.cities.encode(normalize_label(record.get('location'))),
+            self.users.encode(str(user or '')),
+            parse_quantity(record.get('quantity')),
+            np.nan if lat is None else float(lat),
+            np.nan if lng is None else float(lng),
+            created,
+            0 if hours is None else int(created + hours * 3600),
+        )
+
+    def extend(self, kind, records):
+        """Append ``records`` of one kind ("donation" or "ngo_request"); returns the first row number"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown record kind: {kind}")
+        with self._lock:
+            rows = [self._encode(kind, record) for record in records]
+            start = self._size
+            self._reserve(len(rows))
+            end = start + len(rows)
+            for (name, _), values in zip(COLUMNS, zip(*rows)):
+                self._columns[name][start:end] = values
+            self._size = end
+            return start
+
+    def append(self, kind, record):
+        return self.extend(kind, [record])
+
+    def _view(self):
+        with self._lock:
+            size = self._size
+            return {name: column[:size] for name, column in self._columns.items()}
+
+    def mask(self, kind=None, food=None, location=None, user=None, compatible_with=None,
+             since=None, until=None, expires_before=None, near=None, radius_km=None):
+        """
+        Boolean row mask for the given filters
+
+        ``food``/``location``/``user`` match encoded values exactly (food and
+        location after ``normalize_label``); ``compatible_with`` keeps rows
+        whose food type satisfies that "food needed" text; ``since``,
+        ``until`` and ``expires_before`` take anything ``epoch_seconds``
+        accepts; ``near=(lat, lng)`` with ``radius_km`` keeps rows within
+        that great-circle distance.
+        """
+        columns = self._view()
+        selected = np.ones(len(columns['kind']), dtype=bool)
+        if kind is not None:
+            if kind not in KINDS:
+                raise ValueError(f"Unknown record kind: {kind}")
+            selected &= columns['kind'] == KINDS.index(kind)
+        for name, value in (('food', food), ('location', location), ('user', user)):
+            if value is None:
+                continue
+            dictionary_name, column = self.GROUPS[name]
+            code = getattr(self, dictionary_name).code(str(value) if name == 'user' else normalize_label(value))
+            if code is None:
+                return np.zeros(len(selected), dtype=bool)
+            selected &= columns[column] == code
+        if compatible_with is not None:
+            codes = self.foods.codes_where(lambda food_type: is_compatible(food_type, compatible_with))
+            selected &= np.isin(columns['food'], codes)
+        for bound, column, keep in ((since, 'created_at', np.greater_equal), (until, 'created_at', np.less),
+                                    (expires_before, 'expires_at', np.less)):
+            if bound is None:
+                continue
+            seconds = epoch_seconds(bound)
+            if seconds is None:
+                raise ValueError(f"Invalid timestamp: {bound}")
+            selected &= keep(columns[column], seconds) & (columns[column] > 0)
+        if near is not None:
+            selected &= self._distances(columns, *near) <= radius_km
+        return selected
+
+    @staticmethod
+    def _distances(columns, lat, lng):
+        lat1, lng1 = np.radians(lat), np.radians(lng)
+        lat2 = np.radians(columns['lat'].astype(np.float64))
+        lng2 = np.radians(columns['lng'].astype(np.float64))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        with np.errstate(invalid='ignore'):
+            # Rows without coordinates come out as NaN and never pass a radius check
+            return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    def totals(self, mask=None):
+        """{"count", "quantity_kg"} over the selected rows"""
+        quantity = self._view()['quantity']
+        if mask is not None:
+            # Rows appended after the mask was built are not selected
+            quantity = quantity[:len(mask)][mask]
+        return {"count": int(len(quantity)), "quantity_kg": round(float(quantity.sum(dtype=np.float64)), 2)}
+
+    def aggregate(self, by='location', mask=None):
+        """{label: {"count", "quantity_kg"}} for the selected rows, grouped by "food", "location" or "user\""""
+        if by not in self.GROUPS:
+            raise ValueError(f"Cannot group by {by} (expected one of {', '.join(self.GROUPS)})")
+        dictionary_name, column = self.GROUPS[by]
+        dictionary = getattr(self, dictionary_name)
+        columns = self._view()
+        codes, quantity = columns[column], columns['quantity']
+        if mask is not None:
+            codes, quantity = codes[:len(mask)][mask], quantity[:len(mask)][mask]
+        counts = np.bincount(codes, minlength=len(dictionary))
+        sums = np.bincount(codes, weights=quantity, minlength=len(dictionary))
+        return {dictionary.values[code]: {"count": int(counts[code]), "quantity_kg": round(float(sums[code]), 2)}
+                for code in np.flatnonzero(counts)}
+
+    def records(self, mask=None, limit=100):
+        """The ``limit`` most recently added selected rows as dicts, newest first"""
+        columns = self._view()
+        rows = np.arange(len(columns['kind'])) if mask is None else np.flatnonzero(mask)
+        results = []
+        for row in rows[::-1][:limit]:
+            lat, lng = columns['lat'][row], columns['lng'][row]
+            created, expires = int(columns['created_at'][row]), int(columns['expires_at'][row])
+            results.append({
+                "row": int(row),
+                "kind": KINDS[columns['kind'][row]],
+                "food": self.foods.values[columns['food'][row]],
+                "location": self.cities.values[columns['city'][row]],
+                "user": self.users.values[columns['user'][row]],
+                "quantity_kg": round(float(columns['quantity'][row]), 2),
+                "lat": None if np.isnan(lat) else round(float(lat), 6),
+                "lng": None if np.isnan(lng) else round(float(lng), 6),
+                "created_at": datetime.fromtimestamp(created, timezone.utc).isoformat() if created else None,
+                "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat() if expires else None
+            })
+        return results
+
+    def export_columns(self):
+        """
+        ``(dictionaries, columns)`` describing every row, for a snapshot file
+
+        Columns are views of the filled rows; rows are never rewritten, so
+        they stay valid while new records are appended.
+        """
+        with self._lock:
+            size = self._size
+            dictionaries = {name: list(getattr(self, name).values) for name in ('foods', 'cities', 'users')}
+            return dictionaries, {name: column[:size] for name, column in self._columns.items()}
+
+    def load_columns(self, dictionaries, columns):
+        """
+        Replace the contents with exported columns
+
+        The arrays are used as they are (e.g. read-only views of a
+        memory-mapped snapshot), so loading is immediate; they are copied
+        into writable memory the first time a record is appended.
+        """
+        with self._lock:
+            for name, values in dictionaries.items():
+                dictionary = Dictionary()
+                for value in values:
+                    dictionary.encode(value)
+                setattr(self, name, dictionary)
+            self._columns = {name: columns[name] for name, _ in COLUMNS}
+            self._size = len(self._columns['kind'])
+
+    def memory_stats(self):
+        """Row count, column and dictionary sizes"""
+        with self._lock:
+            size = self._size
+            column_bytes = sum(column.itemsize * size for column in self._columns.values())
+            allocated = sum(column.nbytes for column in self._columns.values())
+        return {
+            "records": size,
+            "column_bytes": column_bytes,
+            "allocated_bytes": allocated,
+            "bytes_per_record": sum(np.dtype(dtype).itemsize for _, dtype in COLUMNS),
+            "distinct": {"food": len(self.foods), "location": len(self.cities), "user": len(self.users)}
+        }
@@ -11,6 +11,66 @@ class Config:
     # Get your API key from: https://developers.google.com/maps/documentation/distance-matrix/get-api-key
     GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
     
+    # Google Maps upstream: pooled HTTP client, deadlines, retries, circuit breaker
+    MAPS_CONNECT_TIMEOUT = float(os.getenv('MAPS_CONNECT_TIMEOUT', 3.05))
+    MAPS_READ_TIMEOUT = float(os.getenv('MAPS_READ_TIMEOUT', 5))
+    MAPS_MAX_RETRIES = int(os.getenv('MAPS_MAX_RETRIES', 2))
+    MAPS_BACKOFF_BASE = float(os.getenv('MAPS_BACKOFF_BASE', 0.2))
+    MAPS_BACKOFF_MAX = float(os.getenv('MAPS_BACKOFF_MAX', 2))
+    MAPS_POOL_SIZE = int(os.getenv('MAPS_POOL_SIZE', 10))
+    MAPS_BREAKER_FAILURES = int(os.getenv('MAPS_BREAKER_FAILURES', 5))
+    MAPS_BREAKER_RESET = float(os.getenv('MAPS_BREAKER_RESET', 30))
+    
+    # Upstream endpoints; point these at local stand-ins to benchmark without
+    # real API keys (see benchmark.py). Empty OPENAI_API_BASE keeps the SDK default
+    OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', '')
+    DISTANCE_MATRIX_URL = os.getenv('DISTANCE_MATRIX_URL', 'https://maps.googleapis.com/maps/api/distancematrix/json')
+    
+    # Distance cache: in-memory LRU backed by a local SQLite file
+    DISTANCE_CACHE_ENABLED = os.getenv('DISTANCE_CACHE_ENABLED', 'true').lower() == 'true'
+    DISTANCE_CACHE_PRECISION = int(os.getenv('DISTANCE_CACHE_PRECISION', 4))
+    DISTANCE_CACHE_TTL = int(os.getenv('DISTANCE_CACHE_TTL', 7 * 24 * 3600))
+    DISTANCE_CACHE_MAX_ENTRIES = int(os.getenv('DISTANCE_CACHE_MAX_ENTRIES', 10000))
+    DISTANCE_CACHE_PATH = os.getenv('DISTANCE_CACHE_PATH', 'distance_cache.sqlite3')
+    
+    # Offline distance/ETA estimator (fallback and pre-filter for Distance Matrix)
+    DISTANCE_ESTIMATE_FALLBACK = os.getenv('DISTANCE_ESTIMATE_FALLBACK', 'true').lower() == 'true'
+    ESTIMATOR_ROAD_FACTOR = float(os.getenv('ESTIMATOR_ROAD_FACTOR', 1.3))
+    ESTIMATOR_SPEED_KMH = float(os.getenv('ESTIMATOR_SPEED_KMH', 25))
+    ESTIMATOR_OVERHEAD_MINUTES = float(os.getenv('ESTIMATOR_OVERHEAD_MINUTES', 2))
+    MATCH_ROAD_CANDIDATES = int(os.getenv('MATCH_ROAD_CANDIDATES', 3))
+    
+    # Maximum donors (and NGOs) accepted by one /route/batch call
+    ROUTE_BATCH_MAX_POINTS = int(os.getenv('ROUTE_BATCH_MAX_POINTS', 100))
+    
+    # Multi-stop POST /route: pickups per run and minutes spent loading at each stop
+    ROUTE_MAX_PICKUPS = int(os.getenv('ROUTE_MAX_PICKUPS', 25))
+    ROUTE_STOP_MINUTES = float(os.getenv('ROUTE_STOP_MINUTES', 5))
+    
+    # ASGI serving mode (asgi.py): uvicorn workers and threads for Flask-served routes
+    ASGI_WORKERS = int(os.getenv('ASGI_WORKERS', 1))
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 16))
+    
+    # Response encoding: orjson for JSON when installed, and gzip/brotli for
+    # responses of at least COMPRESSION_MIN_BYTES when the client accepts them
+    FAST_JSON_ENABLED = os.getenv('FAST_JSON_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+    
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Opt-in request profiling: requests sending "X-Profile: <PROFILE_ADMIN_TOKEN>"
+    # are profiled, plus a random PROFILE_SAMPLE_RATE fraction (0 = off).
+    # PROFILE_MODE is "sample" (folded stacks for flamegraphs) or "cprofile" (.prof)
+    PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN', '')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.002))
+    
     # Flask Configuration
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     PORT = int(os.getenv('PORT', 5000))
@@ -18,6 +78,81 @@ class Config:
     # CORS Configuration
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
     
+    # /chat local rule-based extractor; the LLM is only called below this confidence
+    CHAT_RULES_ENABLED = os.getenv('CHAT_RULES_ENABLED', 'true').lower() == 'true'
+    CHAT_RULES_MIN_CONFIDENCE = float(os.getenv('CHAT_RULES_MIN_CONFIDENCE', 0.75))
+    
+    # Scheduler in front of OpenAI calls: requests/tokens per minute to stay under
+    # (token buckets hold OPENAI_BURST_SECONDS of each), how many calls may queue
+    # (most urgent expiry first) and how long one may wait before a 429
+    OPENAI_SCHEDULER_ENABLED = os.getenv('OPENAI_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    OPENAI_RPM = float(os.getenv('OPENAI_RPM', 3500))
+    OPENAI_TPM = float(os.getenv('OPENAI_TPM', 90000))
+    OPENAI_BURST_SECONDS = float(os.getenv('OPENAI_BURST_SECONDS', 10))
+    OPENAI_QUEUE_MAX = int(os.getenv('OPENAI_QUEUE_MAX', 200))
+    OPENAI_QUEUE_TIMEOUT = float(os.getenv('OPENAI_QUEUE_TIMEOUT', 30))
+    
+    # /chat/batch: messages per request and concurrent model calls
+    CHAT_BATCH_MAX_MESSAGES = int(os.getenv('CHAT_BATCH_MAX_MESSAGES', 500))
+    CHAT_BATCH_CONCURRENCY = int(os.getenv('CHAT_BATCH_CONCURRENCY', 8))
+    
+    # Offline gazetteer used to add coordinates to /chat locations
+    GAZETTEER_ENABLED = os.getenv('GAZETTEER_ENABLED', 'true').lower() == 'true'
+    GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv'))
+    GAZETTEER_FUZZY_CUTOFF = float(os.getenv('GAZETTEER_FUZZY_CUTOFF', 0.82))
+    GAZETTEER_MAX_UNRESOLVED = int(os.getenv('GAZETTEER_MAX_UNRESOLVED', 1000))
+    
+    # /chat extraction cache (normalized message -> extracted fields)
+    CHAT_CACHE_ENABLED = os.getenv('CHAT_CACHE_ENABLED', 'true').lower() == 'true'
+    CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', 5000))
+    CHAT_CACHE_TTL = int(os.getenv('CHAT_CACHE_TTL', 3600))
+    
+    # Matching engine: spatial grid cell size in degrees (~5.5 km at 0.05)
+    MATCH_GRID_CELL_DEG = float(os.getenv('MATCH_GRID_CELL_DEG', 0.05))
+    MATCH_RECENT_LIMIT = int(os.getenv('MATCH_RECENT_LIMIT', 50))
+    # Worker processes the matching state is sharded across by city (1 keeps it
+    # in the API process). Shards live in the process that started them, so use
+    # a single server process (threads or ASGI) when this is above 1
+    MATCH_SHARDS = int(os.getenv('MATCH_SHARDS', 1))
+    # Most recent matches returned by one GET /match?since=<cursor> page
+    MATCH_PAGE_LIMIT = int(os.getenv('MATCH_PAGE_LIMIT', 100))
+    # Donations (soonest expiry first) tried by POST /match {"urgent": true}
+    MATCH_URGENT_SCAN = int(os.getenv('MATCH_URGENT_SCAN', 20))
+    # GET /match/stream (server-sent events): how long changes are gathered into
+    # one delta event, keep-alive interval for idle connections, and how many
+    # recent events a reconnecting client (Last-Event-ID) can catch up from
+    STREAM_ENABLED = os.getenv('STREAM_ENABLED', 'true').lower() == 'true'
+    STREAM_COALESCE_SECONDS = float(os.getenv('STREAM_COALESCE_SECONDS', 0.25))
+    STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+    STREAM_HISTORY = int(os.getenv('STREAM_HISTORY', 256))
+    
+    # Bulk assignment (POST /match/assign): nearest NGOs kept per donation, what a
+    # match is worth and the extra weight for food about to expire (both in km
+    # of driving), and the auction's optimality tolerance
+    ASSIGN_CANDIDATES_K = int(os.getenv('ASSIGN_CANDIDATES_K', 5))
+    ASSIGN_MATCH_VALUE_KM = float(os.getenv('ASSIGN_MATCH_VALUE_KM', 50))
+    ASSIGN_URGENCY_WEIGHT_KM = float(os.getenv('ASSIGN_URGENCY_WEIGHT_KM', 25))
+    ASSIGN_EPSILON = float(os.getenv('ASSIGN_EPSILON', 0.05))
+    
+    # Ingestion log: append-only JSON lines, fsync'd once per batch and replayed on startup
+    INGEST_LOG_ENABLED = os.getenv('INGEST_LOG_ENABLED', 'true').lower() == 'true'
+    INGEST_LOG_PATH = os.getenv('INGEST_LOG_PATH', 'ingest_log.jsonl')
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+    INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', 0.05))
+    INGEST_MAX_RECORDS = int(os.getenv('INGEST_MAX_RECORDS', 5000))
+    
+    # Warm restarts: matching state, history and in-memory caches are written to a
+    # memory-mappable snapshot every SNAPSHOT_INTERVAL seconds (when something
+    # changed) and at exit; startup loads it and replays only the newer log tail
+    SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true'
+    SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'state.snapshot')
+    SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', 300))
+    
+    # Columnar history of every ingested donation/NGO request behind GET /history
+    # (initial rows allocated; columns double as they fill)
+    HISTORY_STORE_ENABLED = os.getenv('HISTORY_STORE_ENABLED', 'true').lower() == 'true'
+    HISTORY_STORE_CAPACITY = int(os.getenv('HISTORY_STORE_CAPACITY', 4096))
+    
     # Optional: Database configuration (if you want to add database support later)
     # DATABASE_URL = os.getenv('DATABASE_URL')
     
@@ -0,0 +1,11 @@
+"""
+Shared pytest setup: keep the app's on-disk state out of the working tree
+"""
+
+import os
+import tempfile
+
+_state_dir = tempfile.mkdtemp(prefix='xylmcscics-tests-')
+os.environ.setdefault('INGEST_LOG_PATH', os.path.join(_state_dir, 'ingest_log.jsonl'))
+os.environ.setdefault('DISTANCE_CACHE_PATH', os.path.join(_state_dir, 'distance_cache.sqlite3'))
+os.environ.setdefault('SNAPSHOT_PATH', os.path.join(_state_dir, 'state.snapshot'))
@@ -0,0 +1,282 @@
+"""
+Server-sent events for the XYLMCSCICS Food Donation Platform dashboard
+
+``MatchStream`` watches the matching engine and publishes one ``delta``
+event per burst of changes: new matches, status changes ("In Transit" to
+"Delivered") and the aggregate counters that changed. Each event is encoded
+once and the same bytes are written to every subscriber. Subscribers can be
+threads (the Flask route) or coroutines (asgi.py); all idle coroutines on
+an event loop wait on one shared future, so thousands of open dashboards
+cost little more than their sockets.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from response_encoding import dumps
+
+# Sent when nothing happened for a while so proxies keep the connection open
+HEARTBEAT = b": keepalive\n\n"
+# Reconnect delay suggested to EventSource clients (ms)
+RETRY = b"retry: 3000\n\n"
+
+# /match payload fields that are bookkeeping rather than dashboard counters
+_NON_COUNTER_KEYS = frozenset({"recent_matches", "status", "last_updated", "version", "match_cursor"})
+
+
+def encode_event(event_id, event_type, data):
+    """One SSE frame; ``data`` is single-line JSON text"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode('utf-8')
+
+
+def counter_changes(previous, current):
+    """
+    Counters in ``current`` that differ from ``previous`` (both /match payloads)
+
+    Breakdown dicts only carry the keys that changed, with 0 for keys that
+    disappeared.
+    """
+    changes = {}
+    for key, value in current.items():
+        if key in _NON_COUNTER_KEYS:
+            continue
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            diff = {k: v for k, v in value.items() if old.get(k) != v}
+            diff.update({k: 0 for k in old if k not in value})
+            if diff:
+                changes[key] = diff
+        elif value != old:
+            changes[key] = value
+    return changes
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Broadcaster:
+    """
+    Recently published frames plus wake-ups for waiting threads and loops
+
+    Event ids are ``<instance>.<n>``, so a reconnecting client's
+    ``Last-Event-ID`` replays what it missed unless those frames are gone
+    (or came from another process), in which case it needs a new snapshot.
+    """
+
+    def __init__(self, instance_id, history=256):
+        self.instance_id = instance_id
+        self.subscribers = 0
+        self._frames = deque(maxlen=history)
+        self._last = 0
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._loop_futures = {}
+
+    @property
+    def last_id(self):
+        with self._lock:
+            return f"{self.instance_id}.{self._last}"
+
+    def publish(self, event_type, data):
+        """Encode one event and wake every subscriber; returns the frame"""
+        with self._lock:
+            self._last += 1
+            frame = encode_event(f"{self.instance_id}.{self._last}", event_type, data)
+            self._frames.append((self._last, frame))
+            self._published.notify_all()
+            futures, self._loop_futures = self._loop_futures, {}
+        for loop, future in futures.items():
+            loop.call_soon_threadsafe(_resolve, future)
+        return frame
+
+    def _position(self, last_id):
+        instance, _, n = str(last_id or '').rpartition('.')
+        if instance != self.instance_id or not n.isdigit():
+            return None
+        return int(n)
+
+    def frames_after(self, last_id):
+        """
+        ``(frames, new_last_id)`` published after ``last_id``
+
+        ``frames`` is None when the client has to start over from a snapshot.
+        """
+        n = self._position(last_id)
+        with self._lock:
+            current = f"{self.instance_id}.{self._last}"
+            if n is None or n > self._last:
+                return None, current
+            if n < self._last and (not self._frames or self._frames[0][0] > n + 1):
+                return None, current
+            return [frame for frame_n, frame in self._frames if frame_n > n], current
+
+    def wait(self, last_id, timeout):
+        """Block until something is published after ``last_id``, or ``timeout`` seconds"""
+        n = self._position(last_id)
+        with self._lock:
+            if n is not None and n >= self._last:
+                self._published.wait(timeout)
+
+    async def wait_async(self, last_id, timeout):
+        """``wait`` for coroutines; every waiter on a loop shares one future"""
+        n = self._position(last_id)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if n is None or n < self._last:
+                return
+            future = self._loop_futures.get(loop)
+            if future is None:
+                future = self._loop_futures[loop] = loop.create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _subscribed(self, delta):
+        with self._lock:
+            self.subscribers += delta
+
+
+class MatchStream:
+    """
+    Delta events for ``/match/stream`` built from a ``MatchingEngine``
+
+    A publisher thread (started with the first subscriber) wakes on engine
+    changes, waits ``coalesce_seconds`` so a burst becomes one event, and
+    publishes the difference from the previous state. New subscribers get
+    a ``snapshot`` event (the full /match payload, encoded once per
+    event) followed by the deltas.
+
+    The snapshot is the state the latest delta was computed from, so it is
+    exactly what a client holds after applying every event up to its id.
+    Pass the app's ``StateGate`` as ``gate`` so each delta reads a state
+    no handler is half-way through changing.
+    """
+
+    def __init__(self, engine, coalesce_seconds=0.1, heartbeat_seconds=15.0, history=256, gate=None):
+        self.engine = engine
+        self.gate = gate
+        self.coalesce_seconds = coalesce_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.broadcaster = Broadcaster(engine.instance_id, history)
+        self._changed = threading.Event()
+        self._start_lock = threading.Lock()
+        # Held while a delta is read and published, and while a snapshot
+        # frame pairs the published state with its event id
+        self._publish_lock = threading.Lock()
+        self._thread = None
+        self._payload = None
+        self._match_cursor = None
+        self._status_seq = 0
+        self._snapshot_frame = None
+        engine.add_listener(self._on_change)
+
+    def _on_change(self, version):
+        self._changed.set()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                with self._publish_lock, self.gate.exclusive() if self.gate is not None else nullcontext():
+                    _, self._status_seq = self.engine.status_changes_since(0)
+                    _, self._payload = self.engine.snapshot()
+                    self._match_cursor = self._payload["match_cursor"]
+                self._changed.clear()
+                self._thread = threading.Thread(target=self._run, name='match-stream', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._changed.wait(self.heartbeat_seconds):
+                # Quiet period: let due donations expire so their counters update
+                self.engine.current_version()
+                continue
+            # Let the rest of a burst land so it goes out as one event
+            time.sleep(self.coalesce_seconds)
+            self._changed.clear()
+            try:
+                self.publish_delta()
+            except Exception as e:
+                print(f"Match stream publish failed: {e}")
+
+    def publish_delta(self):
+        """Publish what changed since the last delta; returns the frame or None"""
+        with self._publish_lock:
+            with self.gate.exclusive() if self.gate is not None else nullcontext():
+                changes, self._status_seq = self.engine.status_changes_since(self._status_seq)
+                matches, cursor, _, reset = self.engine.matches_since(self._match_cursor)
+                version, payload = self.engine.snapshot()
+            counters = counter_changes(self._payload, payload)
+            self._payload = payload
+            self._match_cursor = cursor
+            if not (matches or changes or counters):
+                return None
+            delta = {
+                "version": version,
+                "last_updated": payload["last_updated"],
+                "match_cursor": cursor,
+                "matches": matches,
+                "status_changes": changes,
+                "counters": counters
+            }
+            if reset:
+                delta["reset"] = True
+            return self.broadcaster.publish('delta', dumps(delta))
+
+    def snapshot_frame(self):
+        """``(frame, event_id)`` with the /match payload as of ``event_id``, encoded once per event"""
+        with self._publish_lock:
+            last_id = self.broadcaster.last_id
+            payload = self._payload
+            cached = self._snapshot_frame
+            if cached is None or cached[0] is not payload or cached[1] != last_id:
+                cached = self._snapshot_frame = (payload, last_id, encode_event(last_id, 'snapshot', dumps(payload)))
+            return cached[2], last_id
+
+    def frames(self, last_event_id=None):
+        """Frames for one threaded subscriber (e.g. a Flask streaming response)"""
+        self.start()
+        self.broadcaster._subscribed(1)
+        try:
+            yield RETRY
+            missed, cursor = self.broadcaster.frames_after(last_event_id)
+            while True:
+                if missed is None:
+                    frame, cursor = self.snapshot_frame()
+                    yield frame
+                elif missed:
+                    yield from missed
+                self.broadcaster.wait(cursor, self.heartbeat_seconds)
+                missed, new_cursor = self.broadcaster.frames_after(cursor)
+                if missed == [] and new_cursor == cursor:
+                    yield HEARTBEAT
+                cursor = new_cursor
+        finally:
+            self.broadcaster._subscribed(-1)
+
+    async def aframes(self, last_event_id=None):
+        """Frames for one asyncio subscriber (asgi.py)"""
+        self.start()
+        self.broadcaster._subscribed(1)
+        try:
+            yield RETRY
+            missed, cursor = self.broadcaster.frames_after(last_event_id)
+            while True:
+                if missed is None:
+                    frame, cursor = self.snapshot_frame()
+                    yield frame
+                elif missed:
+                    for frame in missed:
+                        yield frame
+                await self.broadcaster.wait_async(cursor, self.heartbeat_seconds)
+                missed, new_cursor = self.broadcaster.frames_after(cursor)
+                if missed == [] and new_cursor == cursor:
+                    yield HEARTBEAT
+                cursor = new_cursor
+        finally:
+            self.broadcaster._subscribed(-1)
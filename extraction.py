@@ -0,0 +1,337 @@
+"""
+Donation message extraction for the /chat endpoint
+
+Turns a free-text message into the ``food``/``quantity``/``expiry``/
+``location`` fields, either locally with compiled patterns (the common
+"I have 20 rotis in Delhi expiring in 4 hours" shape) or with the OpenAI
+model, and normalizes messages to key the extraction cache.
+"""
+
+import json
+import re
+import threading
+import time
+import unicodedata
+
+from config import Config
+from metrics import UPSTREAM_SECONDS
+
+REQUIRED_FIELDS = ["food", "quantity", "expiry", "location"]
+
+# Create system prompt to force JSON output
+SYSTEM_PROMPT = """You are a food donation assistant. Extract food donation information from user messages and return ONLY a valid JSON object with these exact fields:
+{
+    "food": "food item name",
+    "quantity": "amount/quantity",
+    "expiry": "expiry time",
+    "location": "city/location"
+}
+
+Rules:
+- Return ONLY the JSON object, no other text
+- Ensure the JSON is valid and parseable
+- Extract the most relevant information from the message
+- If a field is not mentioned, use "unknown" as the value
+- Keep responses concise and accurate
+
+Example input: "I have 20 rotis in Delhi expiring in 4 hours"
+Example output: {"food": "rotis", "quantity": "20", "expiry": "4 hours", "location": "Delhi"}"""
+
+# The OpenAI SDK, imported on first use (see load_openai)
+_openai = None
+_openai_lock = threading.Lock()
+
+_THOUSANDS_RE = re.compile(r'(?<=\d),(?=\d{3}\b)')
+_TRAILING_ZEROS_RE = re.compile(r'\b(\d+)\.0+\b')
+_LEADING_ZEROS_RE = re.compile(r'\b(?<!\.)0+(\d)')
+_PUNCTUATION_RE = re.compile(r'[^\w\s.:/-]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def load_openai():
+    """
+    The ``openai`` module, imported and configured on first use
+
+    The SDK takes a few hundred milliseconds to import (it pulls in aiohttp),
+    so workers only pay for it once a message actually needs the model. It
+    reads ``OPENAI_API_KEY`` from the environment itself.
+    """
+    global _openai
+    if _openai is None:
+        with _openai_lock:
+            if _openai is None:
+                import openai
+                if Config.OPENAI_API_BASE:
+                    openai.api_base = Config.OPENAI_API_BASE
+                _openai = openai
+    return _openai
+
+
+def __getattr__(name):
+    # ``extraction.openai`` still works for callers that patch the SDK
+    if name == 'openai':
+        return load_openai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def normalize_message(message):
+    """
+    Canonical form of a message for cache keys
+
+    Folds case, Unicode width variants, punctuation and whitespace, and
+    number formatting ("1,000" -> "1000", "20.0" -> "20", "05" -> "5"), so
+    the same WhatsApp forward from several volunteers maps to one key.
+    """
+    text = unicodedata.normalize('NFKC', str(message)).casefold()
+    text = _THOUSANDS_RE.sub('', text)
+    text = _TRAILING_ZEROS_RE.sub(r'\1', text)
+    text = _LEADING_ZEROS_RE.sub(r'\1', text)
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip(' .')
+
+
+_UNITS = {
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'g': 'g', 'gm': 'g', 'gms': 'g', 'gram': 'g', 'grams': 'g',
+    'l': 'litres', 'ltr': 'litres', 'ltrs': 'litres', 'litre': 'litres', 'litres': 'litres',
+    'liter': 'litres', 'liters': 'litres',
+    'packet': 'packets', 'packets': 'packets', 'pack': 'packets', 'packs': 'packets',
+    'box': 'boxes', 'boxes': 'boxes', 'plate': 'plates', 'plates': 'plates',
+    'piece': 'pieces', 'pieces': 'pieces', 'pcs': 'pieces',
+    'serving': 'servings', 'servings': 'servings', 'meal': 'meals', 'meals': 'meals',
+    'dozen': 'dozen', 'bag': 'bags', 'bags': 'bags', 'tray': 'trays', 'trays': 'trays',
+    'bottle': 'bottles', 'bottles': 'bottles', 'container': 'containers', 'containers': 'containers'
+}
+_TIME_UNITS = {
+    'min': 'minute', 'mins': 'minute', 'minute': 'minute', 'minutes': 'minute',
+    'h': 'hour', 'hr': 'hour', 'hrs': 'hour', 'hour': 'hour', 'hours': 'hour',
+    'day': 'day', 'days': 'day'
+}
+# Head nouns that count who is fed rather than name a food ("for 50 people")
+_COUNT_NOUNS = {
+    'people', 'person', 'persons', 'servings', 'serving', 'plates', 'plate', 'families', 'family',
+    'guests', 'guest', 'kids', 'children', 'members', 'individuals', 'heads', 'pax', 'students',
+    'workers', 'households', 'beneficiaries'
+}
+# Foods the rules trust without a second opinion; anything else lowers the confidence
+_FOOD_WORDS = {
+    'rice', 'roti', 'chapati', 'chapatti', 'phulka', 'paratha', 'naan', 'puri', 'bread', 'bun', 'pav',
+    'dal', 'daal', 'dhal', 'chawal', 'khichdi', 'biryani', 'pulao', 'sambar', 'rasam', 'curry',
+    'sabzi', 'sabji', 'paneer', 'rajma', 'chole', 'chana', 'poha', 'upma', 'idli', 'dosa', 'vada',
+    'halwa', 'kheer', 'ladoo', 'laddu', 'sweets', 'mithai', 'snack', 'samosa', 'thali', 'meal',
+    'veg', 'vegetable', 'vegetables', 'fruit', 'fruits', 'banana', 'apple', 'mango', 'orange',
+    'potato', 'potatoes', 'onion', 'onions', 'tomato', 'tomatoes', 'milk', 'curd', 'yogurt',
+    'egg', 'eggs', 'chicken', 'mutton', 'fish', 'meat', 'flour', 'atta', 'wheat', 'sugar', 'oil',
+    'noodles', 'pasta', 'sandwich', 'biscuits', 'biscuit', 'cake', 'juice', 'water', 'soup',
+    'grain', 'grains', 'pulses', 'lentils', 'cereal', 'oats', 'food', 'groceries', 'ration', 'rations'
+}
+
+_STOP_WORDS = (r'in|at|from|near|around|expir\w*|that|which|for|available|left|good|fresh|'
+               r'valid|to|by|within|today|tonight|tomorrow|and|with|before|can|will|should|'
+               r'must|please|is|are')
+
+_UNIT_PATTERN = '|'.join(sorted((re.escape(unit) for unit in _UNITS), key=len, reverse=True))
+_QUANTITY_FOOD_RE = re.compile(
+    r'\b(\d+(?:\.\d+)?)\s*(' + _UNIT_PATTERN + r')?\.?\s+(?:of\s+)?'
+    r'((?:(?!(?:' + _STOP_WORDS + r')\b)[a-z][a-z\'-]*)(?:\s+(?!(?:' + _STOP_WORDS + r')\b)[a-z][a-z\'-]*){0,3})',
+    re.IGNORECASE
+)
+_FOOD_ONLY_RE = re.compile(
+    r'\b(?:have|donate|donating|got|offering|giving|extra|leftover|surplus)\s+(?:some\s+|a\s+lot\s+of\s+)?(?:leftover\s+|extra\s+|surplus\s+)?'
+    r'((?:(?!(?:' + _STOP_WORDS + r')\b)[a-z][a-z\'-]*)(?:\s+(?!(?:' + _STOP_WORDS + r')\b)[a-z][a-z\'-]*){0,3})',
+    re.IGNORECASE
+)
+_EXPIRY_RE = re.compile(
+    r'\b(?:expir\w*|good|fresh|valid|lasts?|usable|consume|eat(?:en)?|spoils?|within)'
+    r'(?:\s+(?:in|for|within|by|till|until|next|upto|up\s+to|before))?\s+'
+    r'(\d+(?:\.\d+)?)\s*(' + '|'.join(sorted(_TIME_UNITS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+_EXPIRY_WORD_RE = re.compile(r'\b(?:expir\w*|good|fresh|valid)\s+(?:by\s+|till\s+|until\s+)?(today|tonight|tomorrow)\b',
+                             re.IGNORECASE)
+_LOCATION_RE = re.compile(
+    r'\b(?:in|at|from|near|around)\s+((?:(?!(?:' + _STOP_WORDS + r')\b)[A-Za-z][\w\'-]*)'
+    r'(?:\s+(?!(?:' + _STOP_WORDS + r')\b)[A-Za-z][\w\'-]*){0,3})',
+    re.IGNORECASE
+)
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+# Phrases after "in"/"at" that are not places: "in the morning", "at night"
+_NON_PLACE_LEADS = {'the', 'a', 'an', 'my', 'our', 'your', 'this', 'that', 'some', 'any'}
+_TIME_WORDS = {
+    'morning', 'mornings', 'afternoon', 'evening', 'evenings', 'night', 'nights', 'noon', 'midnight',
+    'today', 'tonight', 'tomorrow', 'yesterday', 'week', 'weekend', 'month', 'time', 'while',
+    'minute', 'minutes', 'hour', 'hours', 'day', 'days', 'am', 'pm', 'monday', 'tuesday',
+    'wednesday', 'thursday', 'friday', 'saturday', 'sunday'
+}
+# Messages saying what is *not* there ("I do not have any rice") need the LLM
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|nothing|none|cannot|\w+n't|dont|cant|wont)\b", re.IGNORECASE)
+
+# How much each extracted field contributes to the rule confidence score
+FIELD_WEIGHTS = {"food": 0.3, "quantity": 0.25, "expiry": 0.2, "location": 0.25}
+
+
+def _format_number(value):
+    number = float(value)
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def _is_known_food(food):
+    for word in food.lower().split():
+        # Plurals: "rotis", "tomatoes"
+        if {word, word[:-1] if word.endswith('s') else word,
+                word[:-2] if word.endswith('es') else word} & _FOOD_WORDS:
+            return True
+    return False
+
+
+def _location_candidates(text):
+    """Phrases after "in", "at", "from"... that could name a place, in order"""
+    for match in _LOCATION_RE.finditer(text):
+        location = match.group(1).strip()
+        words = location.lower().split()
+        if words[0] in _NON_PLACE_LEADS or _TIME_WORDS.intersection(words):
+            continue
+        yield location
+
+
+def extract_with_rules(user_message, gazetteer=None):
+    """
+    Extract donation fields locally with compiled patterns
+
+    Returns ``(fields, confidence)`` where ``fields`` has the four
+    ``REQUIRED_FIELDS`` ("unknown" when not found) and ``confidence`` is
+    in [0, 1]: the weight of the fields found, reduced when the message
+    holds more numbers than the patterns could account for, the food is
+    not a known food word or the location is not in ``gazetteer`` (when
+    given). Negated messages get a confidence of 0.
+    """
+    text = str(user_message)
+    fields = dict.fromkeys(REQUIRED_FIELDS, "unknown")
+    used_numbers = 0
+
+    match = _QUANTITY_FOOD_RE.search(text)
+    if match:
+        number, unit, food = match.groups()
+        unit = _UNITS.get(unit.lower()) if unit else None
+        head = food.split()[0].lower()
+        if not unit and head in _COUNT_NOUNS:
+            # "50 people": a head count, not a food
+            unit, food = _UNITS.get(head, head), None
+        fields["quantity"] = f"{_format_number(number)} {unit}" if unit else _format_number(number)
+        if food:
+            fields["food"] = food.strip()
+        used_numbers += 1
+    if fields["food"] == "unknown":
+        match = _FOOD_ONLY_RE.search(text)
+        if match:
+            fields["food"] = match.group(1).strip()
+
+    match = _EXPIRY_RE.search(text)
+    if match:
+        number, unit = match.groups()
+        unit = _TIME_UNITS[unit.lower()]
+        number = _format_number(number)
+        fields["expiry"] = f"{number} {unit}{'' if number == '1' else 's'}"
+        used_numbers += 1
+    else:
+        match = _EXPIRY_WORD_RE.search(text)
+        if match:
+            fields["expiry"] = match.group(1).lower()
+
+    known_location = True
+    candidates = list(_location_candidates(text))
+    if candidates:
+        fields["location"] = candidates[0]
+        if gazetteer is not None:
+            known = [location for location in candidates if gazetteer.resolve(location, record=False)]
+            known_location = bool(known)
+            if known:
+                fields["location"] = known[0]
+
+    if _NEGATION_RE.search(text):
+        return fields, 0.0
+    confidence = sum(weight for field, weight in FIELD_WEIGHTS.items() if fields[field] != "unknown")
+    unexplained_numbers = len(_NUMBER_RE.findall(text)) - used_numbers
+    if unexplained_numbers > 0:
+        confidence *= 0.5
+    if fields["food"] != "unknown" and not _is_known_food(fields["food"]):
+        confidence *= 0.7
+    if not known_location:
+        confidence *= 0.7
+    return fields, round(confidence, 3)
+
+
+def completion_request(user_message):
+    """Keyword arguments for the ChatCompletion call extracting ``user_message``"""
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 150,
+        "temperature": 0.1  # Low temperature for consistent JSON output
+    }
+
+
+def parse_completion(response, user_message):
+    """
+    Turn a ChatCompletion response into the ``/chat`` result dict
+
+    Status is ``success``, or the ``partial_success`` fallback when the
+    model's answer isn't valid JSON.
+    """
+    # Extract the response content
+    ai_response = response.choices[0].message.content.strip()
+
+    # Try to parse the JSON response
+    try:
+        parsed_data = json.loads(ai_response)
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing failed: {e}")
+        print(f"AI response: {ai_response}")
+
+        # Fallback: return a basic structure
+        return {
+            "food": "unknown",
+            "quantity": "unknown",
+            "expiry": "unknown",
+            "location": "unknown",
+            "status": "partial_success",
+            "original_message": user_message,
+            "ai_response": ai_response,
+            "note": "JSON parsing failed, using fallback"
+        }
+
+    result = {field: parsed_data.get(field, "unknown") for field in REQUIRED_FIELDS}
+    result["status"] = "success"
+    result["original_message"] = user_message
+    return result
+
+
+def extract_with_openai(user_message):
+    """
+    Ask the model for the donation fields in ``user_message``
+
+    OpenAI errors propagate to the caller.
+    """
+    started = time.perf_counter()
+    try:
+        response = load_openai().ChatCompletion.create(**completion_request(user_message))
+    except Exception:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, 'openai', 'error')
+        raise
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, 'openai', 'ok')
+    return parse_completion(response, user_message)
+
+
+async def extract_with_openai_async(user_message):
+    """Async variant of ``extract_with_openai`` for the ASGI server"""
+    started = time.perf_counter()
+    try:
+        response = await load_openai().ChatCompletion.acreate(**completion_request(user_message))
+    except Exception:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, 'openai', 'error')
+        raise
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, 'openai', 'ok')
+    return parse_completion(response, user_message)
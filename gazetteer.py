@@ -0,0 +1,202 @@
+"""
+Offline place-name lookup for the XYLMCSCICS Food Donation Platform
+
+Resolves the free-text ``location`` that ``/chat`` extracts ("Delhi",
+"Lajpat Nagar, New Delhi", "banglore") to coordinates from a local CSV
+file of cities, localities and common misspellings, without calling a
+geocoding API. Names are indexed in a prefix trie; exact and unique-prefix
+matches are tried first and ``difflib`` covers typos. Names that still
+can't be resolved are counted so the data file can be extended.
+"""
+
+import csv
+import difflib
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from cache import LRUCache
+
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PART_SPLIT_RE = re.compile(r'\s*(?:,|;|/|\bnear\b|\bin\b|\bat\b)\s*')
+# Trailing qualifiers that never change which place is meant
+_SUFFIX_RE = re.compile(r'\s+(?:india|city|district|area)$')
+
+# More specific places win when a text names several ("Saket, Delhi")
+KIND_RANK = {"locality": 0, "city": 1}
+
+_MISSING = object()
+
+
+def normalize_place(text):
+    """Canonical form of a place name: folded case, no punctuation or extra spaces"""
+    text = unicodedata.normalize('NFKC', str(text or '')).casefold()
+    text = _NON_WORD_RE.sub(' ', text)
+    text = _WHITESPACE_RE.sub(' ', text).strip()
+    return _SUFFIX_RE.sub('', text)
+
+
+class PrefixTrie:
+    """Character trie mapping normalized names to values"""
+
+    _END = '\0'
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, key, value):
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            self._size += 1
+        node[self._END] = value
+
+    def get(self, key, default=None):
+        node = self._find(key)
+        if node is None:
+            return default
+        return node.get(self._END, default)
+
+    def _find(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix, limit=None):
+        """``(key, value)`` pairs for every key starting with ``prefix``"""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        results = []
+        stack = [(prefix, node)]
+        while stack:
+            key, node = stack.pop()
+            for char, child in node.items():
+                if char == self._END:
+                    results.append((key, child))
+                    if limit is not None and len(results) >= limit:
+                        return results
+                else:
+                    stack.append((key + char, child))
+        return results
+
+
+class Gazetteer:
+    """
+    Place names with coordinates, loaded from a CSV file
+
+    Columns: ``name, kind, parent, lat, lng, aliases`` where ``kind`` is
+    ``city`` or ``locality`` and ``aliases`` lists alternative spellings
+    separated by ``|``.
+    """
+
+    def __init__(self, path=None, fuzzy_cutoff=0.82, max_unresolved=1000, memo_size=10000):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.max_unresolved = max_unresolved
+        self.places = []
+        self._trie = PrefixTrie()
+        self._memo = LRUCache(max_entries=memo_size)
+        self._unresolved = Counter()
+        self._unresolved_lock = threading.Lock()
+        if path:
+            self.load(path)
+
+    def __len__(self):
+        return len(self.places)
+
+    def load(self, path):
+        """Add every place (and alias) from a CSV file"""
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                aliases = [alias for alias in (row.get('aliases') or '').split('|') if alias.strip()]
+                self.add(row['name'], float(row['lat']), float(row['lng']),
+                         kind=row.get('kind') or 'city', parent=row.get('parent') or None,
+                         aliases=aliases)
+        self._memo.clear()
+
+    def add(self, name, lat, lng, kind='city', parent=None, aliases=()):
+        place = {"name": name, "lat": lat, "lng": lng, "kind": kind, "parent": parent}
+        self.places.append(place)
+        for label in (name, *aliases):
+            key = normalize_place(label)
+            if key:
+                existing = self._trie.get(key)
+                if existing is None or KIND_RANK.get(kind, 2) < KIND_RANK.get(existing["kind"], 2):
+                    self._trie.insert(key, place)
+        return place
+
+    def resolve(self, text, record=True):
+        """
+        Coordinates for a free-text location, or None
+
+        Returns ``{"name", "lat", "lng", "kind", "parent", "match"}`` where
+        ``match`` is ``exact``, ``prefix`` or ``fuzzy``. Unresolved names are
+        counted for ``unresolved()`` unless ``record`` is false (e.g. when
+        only checking whether a phrase is a place).
+        """
+        key = normalize_place(text)
+        if not key or key == 'unknown':
+            return None
+        result = self._memo.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._resolve(key)
+            self._memo.set(key, result)
+        if result is None:
+            if record:
+                self._record_unresolved(key)
+            return None
+        return dict(result)
+
+    def _resolve(self, key):
+        parts = [part for part in _PART_SPLIT_RE.split(key) if part]
+
+        # Exact names anywhere in the text (longest phrases first); the most
+        # specific place wins, so "saket new delhi" resolves to Saket
+        hits = []
+        for part in parts:
+            words = part.split()
+            for size in range(min(len(words), 4), 0, -1):
+                for start in range(len(words) - size + 1):
+                    place = self._trie.get(' '.join(words[start:start + size]))
+                    if place is not None:
+                        hits.append((KIND_RANK.get(place["kind"], 2), -size, place))
+        if hits:
+            hits.sort(key=lambda hit: hit[:2])
+            return dict(hits[0][2], match="exact")
+
+        for part in parts:
+            # A unique completion of a typed-in prefix ("hydera")
+            if len(part) >= 4:
+                completions = self._trie.complete(part, limit=2)
+                if len({id(place) for _, place in completions}) == 1:
+                    return dict(completions[0][1], match="prefix")
+
+            # Typos: compare against names sharing the first letter
+            candidates = [name for name, _ in self._trie.complete(part[0])]
+            close = difflib.get_close_matches(part, candidates, n=1, cutoff=self.fuzzy_cutoff)
+            if close:
+                return dict(self._trie.get(close[0]), match="fuzzy")
+        return None
+
+    def memo_stats(self):
+        return self._memo.stats.as_dict()
+
+    def _record_unresolved(self, key):
+        with self._unresolved_lock:
+            if key in self._unresolved or len(self._unresolved) < self.max_unresolved:
+                self._unresolved[key] += 1
+
+    def unresolved(self, limit=50):
+        """Most frequent names that could not be resolved, as (name, count) pairs"""
+        with self._unresolved_lock:
+            return self._unresolved.most_common(limit), len(self._unresolved)
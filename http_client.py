@@ -0,0 +1,224 @@
+"""
+Shared HTTP client for upstream APIs (Google Maps)
+
+One connection-pooled ``requests.Session`` per upstream, connect/read
+deadlines on every call, bounded retries with full-jitter backoff and a
+circuit breaker that fails fast while the upstream is unhealthy.
+``AsyncHTTPClient`` provides the same behaviour on aiohttp for asgi.py.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream keeps failing after all retries"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``failure_threshold`` consecutive failures
+
+    While open every call fails fast. After ``reset_timeout`` seconds one
+    trial call is let through (half-open); success closes the circuit and
+    failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.rejected_calls = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a call may go upstream right now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def as_dict(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected_calls": self.rejected_calls
+        }
+
+
+class HTTPClient:
+    """Connection-pooled, deadline-bounded JSON client for one upstream"""
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=5.0, max_retries=2,
+                 backoff_base=0.2, backoff_max=2.0, pool_size=10,
+                 failure_threshold=5, reset_timeout=30.0, session=None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get_json(self, url, params=None):
+        """
+        GET ``url`` and return the decoded JSON body
+
+        Raises ``CircuitOpenError`` without touching the network while the
+        breaker is open, and ``UpstreamError`` once retries are exhausted.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = UpstreamError(f"{self.name} returned HTTP {response.status_code}")
+                    continue
+                response.raise_for_status()
+                data = response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+            except ValueError as e:
+                self.breaker.record_failure()
+                raise UpstreamError(f"{self.name} returned an invalid JSON body: {e}") from e
+            except requests.RequestException as e:
+                # Non-retryable client error: the upstream itself is responding
+                self.breaker.record_success()
+                raise UpstreamError(f"{self.name} request failed: {e}") from e
+
+            self.breaker.record_success()
+            return data
+
+        self.breaker.record_failure()
+        raise UpstreamError(f"{self.name} failed after {self.max_retries + 1} attempts: {last_error}")
+
+
+class AsyncHTTPClient:
+    """
+    asyncio counterpart of ``HTTPClient`` built on aiohttp
+
+    Pass the sync client's ``breaker`` so both serving modes see the same
+    upstream health. The pooled session is created on first use, inside
+    the running event loop.
+    """
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=5.0, max_retries=2,
+                 backoff_base=0.2, backoff_max=2.0, pool_size=10, breaker=None):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                              sock_read=self.read_timeout)
+            )
+        return self._session
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def get_json(self, url, params=None):
+        """Async ``HTTPClient.get_json`` with the same retry and breaker rules"""
+        import aiohttp
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            try:
+                async with session.get(url, params=params) as response:
+                    if response.status in RETRYABLE_STATUS_CODES:
+                        last_error = UpstreamError(f"{self.name} returned HTTP {response.status}")
+                        continue
+                    if response.status >= 400:
+                        self.breaker.record_success()
+                        raise UpstreamError(f"{self.name} request failed: HTTP {response.status}")
+                    data = await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                last_error = e
+                continue
+            except ValueError as e:
+                self.breaker.record_failure()
+                raise UpstreamError(f"{self.name} returned an invalid JSON body: {e}") from e
+
+            self.breaker.record_success()
+            return data
+
+        self.breaker.record_failure()
+        raise UpstreamError(f"{self.name} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
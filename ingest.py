@@ -0,0 +1,296 @@
+"""
+Append-only ingestion log for donations, NGO requests and matches
+
+Records are buffered in memory and written to a JSON-lines file in batches,
+with one fsync per batch instead of one per record (group commit). Callers
+that need durability wait for the batch holding their records to be synced.
+On startup the log is replayed to rebuild the matching state.
+
+Only one process may write a log: the first append (or ``claim``) takes an
+exclusive lock on ``<path>.lock``, and a second process trying to write the
+same file gets a RuntimeError instead of handing out duplicate sequence
+numbers.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows: no writer lock
+    fcntl = None
+
+# Logs to reset in a forked child (see IngestLog._after_fork)
+_open_logs = weakref.WeakSet()
+
+
+def _reset_in_child():
+    for log in list(_open_logs):
+        log._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_in_child)
+
+
+class IngestLog:
+    """Buffered, batch-fsync'd JSON-lines log"""
+
+    def __init__(self, path, batch_size=500, flush_interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.appended = 0
+        self.batches = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._synced = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._flusher = None
+        self._closed = False
+        self._owner = None
+        self._lock_file = None
+        self._forked = False
+        # Called as catch_up(seq, offset) by claim() in a forked process when
+        # other processes have logged events after the parent's last one
+        self.catch_up = None
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.next_seq = self._last_seq() + 1
+        # Everything already in the file is on disk
+        self.flushed = self.next_seq - 1
+        self.flushed_offset = os.path.getsize(path) if os.path.exists(path) else 0
+        _open_logs.add(self)
+
+    def _after_fork(self):
+        # The child starts without the parent's flusher thread, and locks or
+        # buffers held by other parent threads would never be released
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._synced = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._file = None
+        self._flusher = None
+        self._owner = None
+        self._lock_file = None
+        self._forked = True
+        self.appended = 0
+        self.batches = 0
+
+    def claim(self):
+        """
+        Make this process the log's writer (done by the first append)
+
+        In a process forked after the log was opened (a preloading server's
+        worker) the sequence numbers are read from the file again, since
+        the parent's may be stale (e.g. an earlier worker logged more), and
+        ``catch_up`` is given the parent's position so the newer events can
+        be applied before any request appends. Raises RuntimeError if
+        another live process holds the log.
+        """
+        if self._owner == os.getpid():
+            return
+        with self._lock:
+            if self._owner == os.getpid():
+                return
+            if fcntl is not None:
+                lock_file = open(f"{self.path}.lock", 'a+')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.seek(0)
+                    holder = lock_file.read().strip() or 'unknown'
+                    lock_file.close()
+                    raise RuntimeError(f"Ingest log {self.path} is in use by process {holder}; "
+                                       f"run a single server process (see wsgi.py)")
+                lock_file.truncate(0)
+                lock_file.write(str(os.getpid()))
+                lock_file.flush()
+                self._lock_file = lock_file
+            if self._forked:
+                seen = (self.flushed, self.flushed_offset)
+                self.next_seq = self._last_seq() + 1
+                self.flushed = self.next_seq - 1
+                self.flushed_offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                self._forked = False
+                if self.catch_up is not None and self.flushed > seen[0]:
+                    try:
+                        self.catch_up(*seen)
+                    finally:
+                        # Claimed even if catching up failed: retrying would apply events twice
+                        self._owner = os.getpid()
+            self._owner = os.getpid()
+
+    def _last_seq(self, tail_bytes=1 << 20):
+        """Sequence number of the last event, read from the end of the file"""
+        if not os.path.exists(self.path):
+            return 0
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            f.seek(max(0, size - tail_bytes))
+            lines = f.read().splitlines()
+        if size > tail_bytes:
+            lines = lines[1:]  # probably starts mid-line
+        for line in reversed(lines):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and 'seq' in event:
+                return event['seq']
+        if size <= tail_bytes:
+            return 0
+        last = 0
+        for event in self.replay():
+            last = event.get('seq', last)
+        return last
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._file = open(self.path, 'ab')
+            self._flusher = threading.Thread(target=self._run, name='ingest-flusher', daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def append(self, events, wait=True, timeout=5.0):
+        """
+        Queue events (dicts with at least ``type``) for the log
+
+        Each event gets a ``seq`` and ``ts``. With ``wait`` the call returns
+        once the batch containing these events has been fsync'd; returns the
+        last sequence number assigned. A TimeoutError after ``timeout``
+        seconds leaves the events queued: they are still written, so the
+        caller should treat them as logged but not yet durable.
+        """
+        if not events:
+            return self.next_seq - 1
+        self.claim()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Ingest log is closed")
+            self._ensure_flusher()
+            now = time.time()
+            for event in events:
+                event['seq'] = self.next_seq
+                event.setdefault('ts', now)
+                self.next_seq += 1
+                self._buffer.append(event)
+            self.appended += len(events)
+            last_seq = self.next_seq - 1
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify()
+
+            if wait:
+                deadline = time.monotonic() + timeout
+                while self.flushed < last_seq:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for the ingest log to sync")
+                    self._synced.wait(remaining)
+        return last_seq
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._buffer and not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed and not self._buffer:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write and fsync everything buffered so far as one batch"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            data = b''.join(json.dumps(event, separators=(',', ':')).encode('utf-8') + b'\n'
+                            for event in batch)
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            with self._lock:
+                self.flushed = batch[-1]['seq']
+                self.flushed_offset = self._file.tell()
+                self.batches += 1
+                self._synced.notify_all()
+            return len(batch)
+
+    def checkpoint(self):
+        """
+        ``(seq, offset)`` after flushing: the last event on disk and the file size
+
+        ``replay(seq, offset)`` later reads only what was written after this
+        point without scanning the rest of the file.
+        """
+        self.claim()
+        self.flush()
+        with self._flush_lock:
+            with self._lock:
+                seq = self.flushed
+            offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return seq, offset
+
+    def replay(self, after_seq=0, offset=0):
+        """
+        Yield logged events with ``seq`` greater than ``after_seq``
+
+        ``offset`` (from ``checkpoint``) skips straight to that position
+        unless it no longer falls on a line boundary (e.g. the file was
+        replaced), in which case the whole file is read.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            if 0 < offset <= os.fstat(f.fileno()).st_size:
+                f.seek(offset - 1)
+                if f.read(1) != b'\n':
+                    f.seek(0)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Torn final write from a crash; earlier records are intact
+                    print(f"Skipping corrupt ingest log line in {self.path}")
+                    continue
+                if event.get('seq', 0) > after_seq:
+                    yield event
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "appended": self.appended,
+                "flushed_seq": self.flushed,
+                "buffered": len(self._buffer),
+                "batches": self.batches
+            }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self.flush()
+            self._file.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self._owner = None
@@ -0,0 +1,232 @@
+"""
+Google Maps Distance Matrix client for the XYLMCSCICS Food Donation Platform
+
+Origins and destinations are packed into as few Distance Matrix requests as
+the API's element limits allow; larger matrices are split into blocks.
+"""
+
+import asyncio
+import math
+import os
+import time
+
+from http_client import CircuitOpenError, HTTPClient
+from metrics import UPSTREAM_SECONDS
+
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+# Distance Matrix API limits per request
+MAX_ORIGINS_PER_REQUEST = 25
+MAX_DESTINATIONS_PER_REQUEST = 25
+MAX_ELEMENTS_PER_REQUEST = 100
+
+UNKNOWN = {"distance": "Unknown", "duration": "Unknown"}
+
+# Shared pooled client; app.py replaces it with one configured from config.py
+http_client = HTTPClient(name='google-maps')
+
+# aiohttp client used by the ASGI server (asgi.py sets it up)
+async_http_client = None
+
+
+def format_point(point):
+    """Format a (lat, lng) pair the way the Distance Matrix API expects"""
+    lat, lng = point
+    return f"{lat},{lng}"
+
+
+def plan_matrix_requests(n_origins, n_destinations,
+                         max_origins=MAX_ORIGINS_PER_REQUEST,
+                         max_destinations=MAX_DESTINATIONS_PER_REQUEST,
+                         max_elements=MAX_ELEMENTS_PER_REQUEST):
+    """
+    Split an origins x destinations matrix into request-sized blocks
+
+    Picks the block shape that needs the fewest requests and returns a list
+    of (origin_range, destination_range) pairs covering the whole matrix.
+    """
+    if n_origins <= 0 or n_destinations <= 0:
+        return []
+
+    best = None
+    for rows in range(1, min(max_origins, n_origins) + 1):
+        cols = min(max_destinations, n_destinations, max_elements // rows)
+        if cols < 1:
+            break
+        count = math.ceil(n_origins / rows) * math.ceil(n_destinations / cols)
+        if best is None or count < best[0]:
+            best = (count, rows, cols)
+
+    _, rows, cols = best
+    blocks = []
+    for i in range(0, n_origins, rows):
+        for j in range(0, n_destinations, cols):
+            blocks.append((range(i, min(i + rows, n_origins)),
+                           range(j, min(j + cols, n_destinations))))
+    return blocks
+
+
+def _parse_element(element):
+    if element.get('status') != 'OK':
+        return dict(UNKNOWN)
+    return {
+        "distance": element['distance']['text'],
+        "duration": element['duration']['text'],
+        "distance_meters": element['distance']['value'],
+        "duration_seconds": element['duration']['value']
+    }
+
+
+def _matrix_params(origins, destinations, api_key):
+    return {
+        'origins': '|'.join(format_point(p) for p in origins),
+        'destinations': '|'.join(format_point(p) for p in destinations),
+        'key': api_key,
+        'units': 'metric'
+    }
+
+
+def _parse_matrix(data, origins, destinations):
+    if data.get('status') != 'OK':
+        print(f"Distance Matrix error: {data.get('status')} {data.get('error_message', '')}")
+        return [[dict(UNKNOWN) for _ in destinations] for _ in origins]
+
+    return [[_parse_element(element) for element in row['elements']]
+            for row in data['rows']]
+
+
+def _observe(started, outcome):
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, 'google_distance_matrix', outcome)
+
+
+def fetch_matrix_block(origins, destinations, api_key):
+    """Make one Distance Matrix request and return a rows x cols result grid"""
+    started = time.perf_counter()
+    try:
+        data = http_client.get_json(DISTANCE_MATRIX_URL, params=_matrix_params(origins, destinations, api_key))
+    except CircuitOpenError:
+        _observe(started, 'circuit_open')
+        raise
+    except Exception:
+        _observe(started, 'error')
+        raise
+    _observe(started, 'ok')
+    return _parse_matrix(data, origins, destinations)
+
+
+async def fetch_matrix_block_async(origins, destinations, api_key):
+    """Async ``fetch_matrix_block`` using ``async_http_client``"""
+    started = time.perf_counter()
+    try:
+        data = await async_http_client.get_json(DISTANCE_MATRIX_URL,
+                                                params=_matrix_params(origins, destinations, api_key))
+    except CircuitOpenError:
+        _observe(started, 'circuit_open')
+        raise
+    except Exception:
+        _observe(started, 'error')
+        raise
+    _observe(started, 'ok')
+    return _parse_matrix(data, origins, destinations)
+
+
+def _prepare_matrix(origins, destinations, cache):
+    """Fill cached pairs and work out which rows/columns still need fetching"""
+    matrix = [[dict(UNKNOWN) for _ in destinations] for _ in origins]
+    pending_origins = set()
+    pending_destinations = set()
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            cached = cache.get(origin, destination) if cache is not None else None
+            if cached is not None:
+                matrix[i][j] = dict(cached)
+            else:
+                pending_origins.add(i)
+                pending_destinations.add(j)
+    return matrix, sorted(pending_origins), sorted(pending_destinations)
+
+
+def _block_points(block, origins, destinations, origin_index, destination_index):
+    origin_range, destination_range = block
+    return ([origins[origin_index[i]] for i in origin_range],
+            [destinations[destination_index[j]] for j in destination_range])
+
+
+def _merge_block(matrix, result, block, origins, destinations, origin_index, destination_index, cache):
+    origin_range, destination_range = block
+    for row, i in zip(result, origin_range):
+        for element, j in zip(row, destination_range):
+            oi, dj = origin_index[i], destination_index[j]
+            matrix[oi][dj] = element
+            if cache is not None and element["distance"] != "Unknown":
+                cache.set(origins[oi], destinations[dj], element)
+
+
+def get_distance_matrix(origins, destinations, api_key=None, cache=None):
+    """
+    Get distance and duration for every origin/destination pair
+
+    ``origins`` and ``destinations`` are lists of (lat, lng) pairs. Returns a
+    ``len(origins) x len(destinations)`` grid of dicts with at least
+    ``distance`` and ``duration`` ("Unknown" when unavailable), plus the
+    number of upstream requests made.
+
+    With a ``cache`` (see ``cache.DistanceCache``) only the origins and
+    destinations that still have uncached pairs are sent upstream, and
+    successful elements are stored back.
+    """
+    api_key = api_key or os.getenv('GOOGLE_MAPS_API_KEY')
+    matrix, origin_index, destination_index = _prepare_matrix(origins, destinations, cache)
+
+    if not api_key or not origin_index:
+        return matrix, 0
+
+    requests_made = 0
+    for block in plan_matrix_requests(len(origin_index), len(destination_index)):
+        block_origins, block_destinations = _block_points(block, origins, destinations,
+                                                          origin_index, destination_index)
+        try:
+            result = fetch_matrix_block(block_origins, block_destinations, api_key)
+        except CircuitOpenError as e:
+            # Upstream is unhealthy: fail fast and leave the rest as Unknown
+            print(f"Skipping distance matrix: {e}")
+            break
+        except Exception as e:
+            # Sent, but failed
+            requests_made += 1
+            print(f"Error getting distance matrix: {e}")
+            continue
+        requests_made += 1
+
+        _merge_block(matrix, result, block, origins, destinations, origin_index, destination_index, cache)
+
+    return matrix, requests_made
+
+
+async def get_distance_matrix_async(origins, destinations, api_key=None, cache=None):
+    """Async ``get_distance_matrix``; the request blocks are fetched concurrently"""
+    api_key = api_key or os.getenv('GOOGLE_MAPS_API_KEY')
+    matrix, origin_index, destination_index = _prepare_matrix(origins, destinations, cache)
+
+    if not api_key or not origin_index:
+        return matrix, 0
+
+    blocks = plan_matrix_requests(len(origin_index), len(destination_index))
+    results = await asyncio.gather(*[
+        fetch_matrix_block_async(*_block_points(block, origins, destinations, origin_index, destination_index),
+                                 api_key)
+        for block in blocks
+    ], return_exceptions=True)
+
+    requests_made = 0
+    for block, result in zip(blocks, results):
+        if isinstance(result, CircuitOpenError):
+            print(f"Skipping distance matrix block: {result}")
+            continue
+        requests_made += 1
+        if isinstance(result, Exception):
+            print(f"Error getting distance matrix: {result}")
+            continue
+        _merge_block(matrix, result, block, origins, destinations, origin_index, destination_index, cache)
+
+    return matrix, requests_made
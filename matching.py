@@ -0,0 +1,781 @@
+"""
+In-process matching engine for the XYLMCSCICS Food Donation Platform
+
+Keeps the live donations and NGO requests in grid-bucketed spatial indexes so
+"nearest compatible NGOs for this donation" only looks at the cells around the
+donation instead of scanning every open record. Donations are also kept in an
+expiry-ordered heap so the most urgent ones come first and expired ones drop
+out of the live state as soon as they are due.
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+_QUANTITY_RE = re.compile(r'(\d+(?:\.\d+)?)')
+_FOOD_SPLIT_RE = re.compile(r'\s*(?:,|/|;|&|\band\b)\s*', re.IGNORECASE)
+_EXPIRY_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(m|mins?|minutes?|h|hrs?|hours?|d|days?)\b', re.IGNORECASE)
+_EXPIRY_UNIT_HOURS = {'m': 1 / 60, 'h': 1, 'd': 24}
+# Conservative horizons for relative words in /chat expiry text
+_EXPIRY_WORDS = {'today': 12, 'tonight': 12, 'tomorrow': 36}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two coordinates in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_quantity(quantity):
+    """Extract the numeric part of a free-text quantity ("5kg", "10 packets")"""
+    if isinstance(quantity, (int, float)):
+        return float(quantity)
+    match = _QUANTITY_RE.search(str(quantity or ''))
+    return float(match.group(1)) if match else 0.0
+
+
+def parse_expiry_hours(record):
+    """
+    Hours until a donation expires, from ``expiryTime`` or free-text ``expiry``
+
+    ``expiryTime`` is the number of hours from the donor form in app.js;
+    ``expiry`` is the text extracted by ``/chat`` ("4 hours", "30 mins",
+    "tomorrow"). Returns None when neither gives a usable value.
+    """
+    hours = record.get('expiryTime')
+    if isinstance(hours, (int, float)) and not isinstance(hours, bool):
+        return float(hours)
+
+    text = str(record.get('expiry') or '').strip().lower()
+    match = _EXPIRY_RE.search(text)
+    if match:
+        return float(match.group(1)) * _EXPIRY_UNIT_HOURS[match.group(2)[0].lower()]
+    for word, hours in _EXPIRY_WORDS.items():
+        if word in text:
+            return float(hours)
+    return None
+
+
+def normalize_label(value):
+    """Normalize a food type or city name for grouping ("  delhi " -> "Delhi")"""
+    value = str(value or '').strip()
+    return value.title() if value else 'Unknown'
+
+
+def _food_tokens(text):
+    tokens = set()
+    for token in _FOOD_SPLIT_RE.split(str(text or '').lower()):
+        token = token.strip()
+        if token:
+            tokens.add(token[:-1] if token.endswith('s') and len(token) > 3 else token)
+    return tokens
+
+
+def is_compatible(food_type, food_needed):
+    """Check whether a donated food type satisfies an NGO's "food needed" text"""
+    needed = _food_tokens(food_needed)
+    if not needed or needed & {'any', 'all', 'anything'}:
+        return True
+    offered = _food_tokens(food_type)
+    for have in offered:
+        for want in needed:
+            if have in want or want in have:
+                return True
+    return False
+
+
+class GridIndex:
+    """
+    Spatial index that buckets points into fixed-size lat/lng cells
+
+    Nearest-neighbour queries walk outwards ring by ring from the query cell
+    and stop as soon as no unvisited cell can hold a closer point.
+    """
+
+    def __init__(self, cell_size_deg=0.05):
+        self.cell_size_deg = cell_size_deg
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, item_id):
+        return item_id in self._points
+
+    def _cell(self, lat, lng):
+        return (int(math.floor(lat / self.cell_size_deg)),
+                int(math.floor(lng / self.cell_size_deg)))
+
+    def insert(self, item_id, lat, lng):
+        """Add (or move) a point in the index"""
+        if item_id in self._points:
+            self.remove(item_id)
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, {})[item_id] = (lat, lng)
+        self._points[item_id] = cell
+
+    def remove(self, item_id):
+        """Remove a point from the index, ignoring unknown ids"""
+        cell = self._points.pop(item_id, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[item_id]
+        if not bucket:
+            del self._cells[cell]
+
+    def _ring(self, center, radius):
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for dj in range(-radius, radius + 1):
+            yield (ci - radius, cj + dj)
+            yield (ci + radius, cj + dj)
+        for di in range(-radius + 1, radius):
+            yield (ci + di, cj - radius)
+            yield (ci + di, cj + radius)
+
+    def nearest(self, lat, lng, limit=5, max_distance_km=None, predicate=None):
+        """
+        Return up to ``limit`` (distance_km, item_id) pairs closest to a point
+
+        ``predicate`` filters candidates by id before they are ranked.
+        """
+        if not self._points or limit <= 0:
+            return []
+
+        # Smallest distance covered by one ring of cells at this latitude
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + self.cell_size_deg, 90.0))), 1e-6)
+        ring_km = self.cell_size_deg * KM_PER_DEGREE * cos_lat
+
+        center = self._cell(lat, lng)
+        best = []
+        visited_cells = 0
+        radius = 0
+        while True:
+            for cell in self._ring(center, radius):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                visited_cells += 1
+                for item_id, (plat, plng) in bucket.items():
+                    if predicate is not None and not predicate(item_id):
+                        continue
+                    distance = haversine_km(lat, lng, plat, plng)
+                    if max_distance_km is not None and distance > max_distance_km:
+                        continue
+                    best.append((distance, item_id))
+
+            if len(best) > limit:
+                best.sort()
+                del best[limit:]
+
+            # Everything outside this ring is at least radius * ring_km away
+            reach = radius * ring_km
+            if len(best) >= limit and max(best)[0] <= reach:
+                break
+            if max_distance_km is not None and reach > max_distance_km:
+                break
+            if visited_cells >= len(self._cells):
+                break
+            radius += 1
+
+        best.sort()
+        return best[:limit]
+
+
+# Delivery states a match moves through (POST /match/<id>/status)
+MATCH_STATUSES = ("Matched", "In Transit", "Delivered")
+
+
+class RunningAggregates:
+    """
+    Dashboard counters maintained incrementally as records come and go
+
+    Every add has a matching remove, so ``/match`` never has to rescan the
+    open donations to rebuild totals and breakdowns.
+    """
+
+    def __init__(self):
+        self.donors = {}
+        self.ngos = {}
+        self.total_quantity = 0.0
+        self.by_food_type = {}
+        self.by_location = {}
+
+    @staticmethod
+    def _bump(counter, key, delta):
+        count = counter.get(key, 0) + delta
+        if count:
+            counter[key] = count
+        else:
+            counter.pop(key, None)
+
+    @staticmethod
+    def _bump_group(groups, key, quantity, delta):
+        entry = groups.get(key)
+        if entry is None:
+            entry = groups[key] = [0, 0.0]
+        entry[0] += delta
+        entry[1] += quantity * delta
+        if entry[0] <= 0:
+            del groups[key]
+
+    @staticmethod
+    def donor_key(record):
+        return record.get('donor') or record.get('userId') or record['id']
+
+    @staticmethod
+    def ngo_key(record):
+        return record.get('ngoName') or record['id']
+
+    def _donation(self, record, delta):
+        quantity = parse_quantity(record.get('quantity'))
+        self._bump(self.donors, self.donor_key(record), delta)
+        self.total_quantity += quantity * delta
+        self._bump_group(self.by_food_type, normalize_label(record.get('foodType')), quantity, delta)
+        self._bump_group(self.by_location, normalize_label(record.get('location')), quantity, delta)
+        if not self.by_food_type:
+            # No open donations: drop accumulated floating-point drift
+            self.total_quantity = 0.0
+
+    def add_donation(self, record):
+        self._donation(record, 1)
+
+    def remove_donation(self, record):
+        self._donation(record, -1)
+
+    def add_ngo_request(self, record):
+        self._bump(self.ngos, self.ngo_key(record), 1)
+
+    def remove_ngo_request(self, record):
+        self._bump(self.ngos, self.ngo_key(record), -1)
+
+    def as_dict(self):
+        return {
+            "total_donors": len(self.donors),
+            "total_ngos": len(self.ngos),
+            "total_food_quantity": round(max(self.total_quantity, 0.0), 2),
+            "food_units": "kg",
+            "donations_by_food_type": {k: round(v[1], 2) for k, v in self.by_food_type.items()},
+            "donations_by_location": {k: round(v[1], 2) for k, v in self.by_location.items()}
+        }
+
+
+class MatchingEngine:
+    """
+    Live donations and NGO requests with spatial lookups and dashboard stats
+
+    Donations follow the shape built by ``handleDonorSubmission`` in app.js
+    (``foodType``, ``quantity``, ``expiryTime``, ``location``, ``userId``) and
+    NGO requests the shape built by ``handleNGOSubmission`` (``ngoName``,
+    ``foodNeeded``, ``location``). Records with ``lat``/``lng`` are indexed
+    spatially; the rest still count towards the aggregates. Donations with
+    an ``expiryTime`` or ``expiry`` leave the open pool once they expire;
+    with ``track_expired`` their ids are kept for ``drain_expired``.
+    """
+
+    def __init__(self, cell_size_deg=0.05, max_recent_matches=50, clock=time.time, track_expired=False):
+        self._lock = threading.RLock()
+        self._clock = clock
+        self._donations = {}
+        self._ngo_requests = {}
+        self._donation_index = GridIndex(cell_size_deg)
+        self._ngo_index = GridIndex(cell_size_deg)
+        # (sequence number, match), newest first; the sequence numbers back
+        # the cursors handed out for GET /match?since=
+        self._recent_matches = deque(maxlen=max_recent_matches)
+        self._match_seq = 0
+        # (sequence number, {"id", "status", "updated_at"}) for status updates
+        self._status_changes = deque(maxlen=max_recent_matches)
+        self._status_seq = 0
+        # Called with the new version after every change (see add_listener)
+        self._listeners = []
+        self._aggregates = RunningAggregates()
+        # Min-heap of (expires_at, donation_id); entries for donations that
+        # were matched or removed stay until they reach the top (lazy deletion)
+        self._expiry_heap = []
+        self._expires_at = {}
+        self._expired_ids = [] if track_expired else None
+        self.expired_count = 0
+        self._last_updated = datetime.now(timezone.utc)
+        self._snapshot = None
+        # Identifies this engine's lifetime so versions from a previous
+        # process are never mistaken for the current state
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.version = 0
+
+    def current_version(self):
+        """Version after expiring anything that is due"""
+        with self._lock:
+            self.expire()
+            return self.version
+
+    def _touch(self):
+        self._last_updated = datetime.now(timezone.utc)
+        self.version += 1
+        self._snapshot = None
+        for listener in self._listeners:
+            listener(self.version)
+
+    def add_listener(self, fn):
+        """
+        Call ``fn(version)`` after every change
+
+        Listeners run with the engine locked, so they should only signal
+        another thread (e.g. set an event), never call back into the engine.
+        """
+        with self._lock:
+            self._listeners.append(fn)
+
+    @staticmethod
+    def _coordinates(record):
+        lat = record.get('lat')
+        lng = record.get('lng')
+        if lat is None or lng is None:
+            return None
+        return float(lat), float(lng)
+
+    def add_donation(self, donation):
+        """Register an open donation and return its id"""
+        record = dict(donation)
+        record.setdefault('id', uuid.uuid4().hex)
+        record.setdefault('created_at', datetime.fromtimestamp(self._clock(), timezone.utc).isoformat())
+        with self._lock:
+            self.remove_donation(record['id'])
+            expires_at = self._expiry_timestamp(record)
+            if expires_at is not None:
+                if expires_at <= self._clock():
+                    if self._expired_ids is not None:
+                        self._expired_ids.append(record['id'])
+                    return record['id']
+                record['expires_at'] = datetime.fromtimestamp(expires_at, timezone.utc).isoformat()
+                self._expires_at[record['id']] = expires_at
+                heapq.heappush(self._expiry_heap, (expires_at, record['id']))
+            self._donations[record['id']] = record
+            self._aggregates.add_donation(record)
+            coords = self._coordinates(record)
+            if coords:
+                self._donation_index.insert(record['id'], *coords)
+            self._touch()
+        return record['id']
+
+    def _expiry_timestamp(self, record):
+        hours = parse_expiry_hours(record)
+        if hours is None:
+            return None
+        try:
+            created = datetime.fromisoformat(record['created_at']).timestamp()
+        except (TypeError, ValueError):
+            created = self._clock()
+        return created + hours * 3600
+
+    def remove_donation(self, donation_id):
+        """Remove a donation from the open pool and return it (or None)"""
+        with self._lock:
+            record = self._donations.pop(donation_id, None)
+            if record is not None:
+                self._expires_at.pop(donation_id, None)
+                self._donation_index.remove(donation_id)
+                self._aggregates.remove_donation(record)
+                self._touch()
+            return record
+
+    def add_ngo_request(self, ngo_request):
+        """Register an open NGO request and return its id"""
+        record = dict(ngo_request)
+        record.setdefault('id', uuid.uuid4().hex)
+        record.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        with self._lock:
+            self.remove_ngo_request(record['id'])
+            self._ngo_requests[record['id']] = record
+            self._aggregates.add_ngo_request(record)
+            coords = self._coordinates(record)
+            if coords:
+                self._ngo_index.insert(record['id'], *coords)
+            self._touch()
+        return record['id']
+
+    def remove_ngo_request(self, ngo_id):
+        """Remove an NGO request from the open pool and return it (or None)"""
+        with self._lock:
+            record = self._ngo_requests.pop(ngo_id, None)
+            if record is not None:
+                self._ngo_index.remove(ngo_id)
+                self._aggregates.remove_ngo_request(record)
+                self._touch()
+            return record
+
+    @staticmethod
+    def _ngo_capacity(ngo):
+        """Donations an NGO request can still take ("capacity", default 1)"""
+        try:
+            return max(1, int(ngo.get('capacity') or 1))
+        except (TypeError, ValueError):
+            return 1
+
+    def consume_ngo_request(self, ngo_id):
+        """
+        Use up one donation of an NGO request's capacity
+
+        The request leaves the open pool when nothing is left; returns the
+        remaining capacity (None for an unknown request).
+        """
+        with self._lock:
+            ngo = self._ngo_requests.get(ngo_id)
+            if ngo is None:
+                return None
+            remaining = self._ngo_capacity(ngo) - 1
+            if remaining <= 0:
+                self.remove_ngo_request(ngo_id)
+                return 0
+            ngo['capacity'] = remaining
+            self._touch()
+            return remaining
+
+    def _is_live(self, expires_at, donation_id):
+        return self._expires_at.get(donation_id) == expires_at
+
+    def expire(self, now=None):
+        """
+        Drop donations whose expiry time has passed and return how many
+
+        Only looks at the top of the expiry heap, so each call costs
+        O(log n) per expired (or stale) entry; called before every read.
+        """
+        now = self._clock() if now is None else now
+        expired = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, donation_id = heapq.heappop(heap)
+                if self._is_live(expires_at, donation_id):
+                    self.remove_donation(donation_id)
+                    expired += 1
+                    if self._expired_ids is not None:
+                        self._expired_ids.append(donation_id)
+            if len(heap) > 64 and len(heap) > 2 * len(self._expires_at):
+                # Mostly stale entries left behind by matches: rebuild once
+                self._expiry_heap = [(ts, donation_id) for donation_id, ts in self._expires_at.items()]
+                heapq.heapify(self._expiry_heap)
+            self.expired_count += expired
+        return expired
+
+    def drain_expired(self):
+        """Ids of donations expired since the last call and not added again (needs ``track_expired``)"""
+        with self._lock:
+            if not self._expired_ids:
+                return []
+            expired, self._expired_ids = self._expired_ids, []
+            return [donation_id for donation_id in expired if donation_id not in self._donations]
+
+    def urgent_donations(self, limit=10):
+        """Open donations with an expiry time, soonest first"""
+        with self._lock:
+            self.expire()
+            heap = self._expiry_heap
+            popped = []
+            results = []
+            while heap and len(results) < limit:
+                entry = heapq.heappop(heap)
+                if self._is_live(*entry):
+                    popped.append(entry)
+                    results.append(dict(self._donations[entry[1]]))
+            for entry in popped:
+                heapq.heappush(heap, entry)
+            return results
+
+    def match_most_urgent(self, max_distance_km=None, scan_limit=20):
+        """
+        Match the most urgent donation that has a compatible NGO nearby
+
+        Looks at up to ``scan_limit`` donations in expiry order; returns the
+        match, or None if none of them can be placed.
+        """
+        with self._lock:
+            for donation in self.urgent_donations(scan_limit):
+                match = self.match_donation(donation['id'], max_distance_km=max_distance_km)
+                if match is not None:
+                    return match
+            return None
+
+    def assignment_inputs(self):
+        """
+        Open donations and NGO requests with coordinates, for the assignment solver
+
+        Returns ``(donations, ngos)`` taken in one pass under the lock:
+        ``(id, lat, lng, foodType, hours_left)`` and
+        ``(id, lat, lng, foodNeeded, capacity)`` tuples, where ``capacity``
+        is how many donations the NGO can take (default 1).
+        """
+        with self._lock:
+            self.expire()
+            now = self._clock()
+            donations = []
+            for donation_id, donation in self._donations.items():
+                coords = self._coordinates(donation)
+                if coords is None:
+                    continue
+                expires_at = self._expires_at.get(donation_id)
+                hours_left = None if expires_at is None else (expires_at - now) / 3600
+                donations.append((donation_id, *coords, donation.get('foodType'), hours_left))
+
+            ngos = []
+            for ngo_id, ngo in self._ngo_requests.items():
+                coords = self._coordinates(ngo)
+                if coords is None:
+                    continue
+                ngos.append((ngo_id, *coords, ngo.get('foodNeeded'), self._ngo_capacity(ngo)))
+            return donations, ngos
+
+    def get_donation(self, donation_id):
+        with self._lock:
+            self.expire()
+            record = self._donations.get(donation_id)
+            return dict(record) if record else None
+
+    def get_ngo_request(self, ngo_id):
+        with self._lock:
+            record = self._ngo_requests.get(ngo_id)
+            return dict(record) if record else None
+
+    def nearest_ngos(self, donation_id=None, lat=None, lng=None, food_type=None,
+                     limit=5, max_distance_km=None):
+        """
+        Find the nearest NGO requests that can use a donation
+
+        Either pass the id of an open donation or explicit ``lat``/``lng`` (and
+        optionally ``food_type``). Returns NGO records with ``distance_km``.
+        """
+        with self._lock:
+            self.expire()
+            if donation_id is not None:
+                donation = self._donations.get(donation_id)
+                if donation is None:
+                    raise KeyError(f"Unknown donation: {donation_id}")
+                coords = self._coordinates(donation)
+                if coords is None:
+                    return []
+                lat, lng = coords
+                food_type = donation.get('foodType')
+
+            ngo_requests = self._ngo_requests
+            predicate = None
+            if food_type:
+                def predicate(ngo_id):
+                    return is_compatible(food_type, ngo_requests[ngo_id].get('foodNeeded'))
+
+            hits = self._ngo_index.nearest(lat, lng, limit=limit,
+                                           max_distance_km=max_distance_km,
+                                           predicate=predicate)
+            results = []
+            for distance, ngo_id in hits:
+                ngo = dict(ngo_requests[ngo_id])
+                ngo['distance_km'] = round(distance, 3)
+                results.append(ngo)
+            return results
+
+    def match_donation(self, donation_id, ngo_id=None, max_distance_km=None, ngo=None, consume_ngo=False):
+        """
+        Pair a donation with an NGO request and record it in recent matches
+
+        Without ``ngo_id`` the nearest compatible NGO is chosen; an explicit
+        ``ngo_id`` must be compatible too (food type and ``max_distance_km``)
+        or ValueError is raised. ``ngo`` is the NGO request record when
+        another engine holds it (a different city shard, see sharding.py).
+        The donation leaves the open pool; with ``consume_ngo`` the match
+        also uses up one of the NGO request's capacity (see
+        ``consume_ngo_request``). Returns the match, or None if nothing fits.
+        """
+        with self._lock:
+            self.expire()
+            donation = self._donations.get(donation_id)
+            if donation is None:
+                raise KeyError(f"Unknown or expired donation: {donation_id}")
+
+            distance_km = None
+            if ngo_id is None:
+                candidates = self.nearest_ngos(donation_id, limit=1,
+                                               max_distance_km=max_distance_km)
+                if not candidates:
+                    return None
+                ngo_id = candidates[0]['id']
+                distance_km = candidates[0]['distance_km']
+
+            if ngo is None:
+                ngo = self._ngo_requests.get(ngo_id)
+            if ngo is None:
+                raise KeyError(f"Unknown NGO request: {ngo_id}")
+            if distance_km is None:
+                if not is_compatible(donation.get('foodType'), ngo.get('foodNeeded')):
+                    raise ValueError(f"NGO request {ngo_id} does not need {donation.get('foodType') or 'this food'}")
+                donation_coords = self._coordinates(donation)
+                ngo_coords = self._coordinates(ngo)
+                if donation_coords and ngo_coords:
+                    distance_km = round(haversine_km(*donation_coords, *ngo_coords), 3)
+                if max_distance_km is not None and distance_km is not None and distance_km > max_distance_km:
+                    raise ValueError(f"NGO request {ngo_id} is {distance_km} km away "
+                                     f"(more than max_distance_km {max_distance_km})")
+
+            match = {
+                "id": uuid.uuid4().hex,
+                "donation_id": donation_id,
+                "ngo_id": ngo_id,
+                "donor": donation.get('donor') or donation.get('userId') or 'Anonymous donor',
+                "ngo": ngo.get('ngoName') or 'Unknown NGO',
+                "food": donation.get('foodType') or 'unknown',
+                "quantity": str(donation.get('quantity') or 'unknown'),
+                "status": "Matched",
+                "distance_km": distance_km,
+                "matched_at": datetime.now(timezone.utc).isoformat()
+            }
+            if consume_ngo:
+                match["consumes_ngo"] = True
+            self.remove_donation(donation_id)
+            if consume_ngo and ngo_id in self._ngo_requests:
+                self.consume_ngo_request(ngo_id)
+            self._record_match(match)
+            return dict(match)
+
+    def restore_match(self, match, consume_ngo=True):
+        """
+        Re-apply a previously made match, e.g. when replaying the ingest log
+
+        Matches that used up NGO capacity use it up again unless
+        ``consume_ngo`` is false (the NGO requests were restored as they
+        were afterwards, e.g. from a snapshot).
+        """
+        with self._lock:
+            self.remove_donation(match['donation_id'])
+            if consume_ngo and match.get('consumes_ngo'):
+                self.consume_ngo_request(match['ngo_id'])
+            self._record_match(dict(match))
+
+    def _record_match(self, match):
+        self._match_seq += 1
+        self._recent_matches.appendleft((self._match_seq, match))
+        self._touch()
+
+    def update_match_status(self, match_id, status, updated_at=None):
+        """
+        Move a recent match to another delivery status (one of MATCH_STATUSES)
+
+        Only matches still in the recent window can be updated; raises
+        KeyError for others and ValueError for an unknown status.
+        """
+        if status not in MATCH_STATUSES:
+            raise ValueError(f"Unknown status: {status} (expected one of {', '.join(MATCH_STATUSES)})")
+        with self._lock:
+            match = next((match for _, match in self._recent_matches if match['id'] == match_id), None)
+            if match is None:
+                raise KeyError(f"Unknown match: {match_id}")
+            match['status'] = status
+            match['status_updated_at'] = updated_at or datetime.now(timezone.utc).isoformat()
+            self._status_seq += 1
+            self._status_changes.append((self._status_seq, {
+                "id": match_id, "status": status, "updated_at": match['status_updated_at']
+            }))
+            self._touch()
+            return dict(match)
+
+    def status_changes_since(self, seq):
+        """Status updates after sequence number ``seq``, oldest first, and the latest sequence number"""
+        with self._lock:
+            return ([dict(change) for change_seq, change in self._status_changes if change_seq > seq],
+                    self._status_seq)
+
+    def _cursor(self, seq):
+        return f"{self.instance_id}.{seq}"
+
+    def match_cursor(self):
+        """Cursor pointing just past the most recent match"""
+        with self._lock:
+            return self._cursor(self._match_seq)
+
+    def matches_since(self, cursor, limit=None):
+        """
+        Recent matches made after ``cursor``
+
+        Returns ``(matches, next_cursor, has_more, reset)``: the ``limit``
+        oldest matches after the cursor, listed newest first, and the cursor
+        to send next. ``reset`` is set when the cursor comes from another
+        engine instance (e.g. before a restart) or matches after it have
+        already left the recent window; the matches then start from the
+        oldest one still kept. Raises ValueError for a malformed cursor.
+        """
+        instance, _, seq = str(cursor).rpartition('.')
+        if not instance or not seq.isdigit():
+            raise ValueError(f"Invalid cursor: {cursor}")
+        seq = int(seq)
+        with self._lock:
+            reset = instance != self.instance_id or seq > self._match_seq
+            if reset:
+                seq = 0
+            elif self._recent_matches and self._recent_matches[-1][0] > seq + 1:
+                reset = True
+            newer = [(match_seq, match) for match_seq, match in self._recent_matches if match_seq > seq]
+            has_more = limit is not None and len(newer) > limit
+            if has_more:
+                newer = newer[-limit:]
+            if newer:
+                next_seq = newer[0][0]
+            else:
+                next_seq = self._match_seq if reset else seq
+            return [dict(match) for _, match in newer], self._cursor(next_seq), has_more, reset
+
+    def snapshot(self):
+        """
+        Return ``(version, payload)`` for ``/match``
+
+        The payload is built from the running aggregates at most once per
+        version and shared between callers, so treat it as read-only.
+        """
+        with self._lock:
+            self.expire()
+            if self._snapshot is None:
+                payload = self._aggregates.as_dict()
+                payload.update({
+                    "recent_matches": [dict(match) for _, match in self._recent_matches],
+                    "match_cursor": self._cursor(self._match_seq),
+                    "open_donations": len(self._donations),
+                    "expired_donations": self.expired_count,
+                    "open_ngo_requests": len(self._ngo_requests),
+                    "status": "success",
+                    "last_updated": self._last_updated.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                    "version": self.version
+                })
+                self._snapshot = (self.version, payload)
+            return self._snapshot
+
+    def summary(self):
+        """Build the ``/match`` payload from the live state"""
+        return self.snapshot()[1]
+
+    def export_state(self):
+        """
+        Open records and recent matches (oldest first) for a snapshot file
+
+        Loading them back through ``add_ngo_request``, ``add_donation`` and
+        ``restore_match`` rebuilds the indexes and aggregates.
+        """
+        with self._lock:
+            self.expire()
+            return {
+                "donations": [dict(record) for record in self._donations.values()],
+                "ngo_requests": [dict(record) for record in self._ngo_requests.values()],
+                "recent_matches": [dict(match) for _, match in reversed(self._recent_matches)]
+            }
@@ -0,0 +1,221 @@
+"""
+Prometheus metrics for the XYLMCSCICS Food Donation Platform
+
+Counters and histograms are sharded per thread: each thread updates its own
+preallocated slots without taking a lock, and ``/metrics`` sums the shards
+when scraped; a thread's shard is folded into a shared one when the thread
+exits, so thread-per-request servers don't accumulate shards. Values that already live elsewhere (cache statistics, open
+donations) are read through collector callbacks at scrape time instead of
+being counted twice.
+"""
+
+import bisect
+import threading
+import weakref
+
+# Request and upstream latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _ThreadToken:
+    """Kept in a thread's locals; collected when the thread exits"""
+
+
+class Registry:
+    """Metric definitions, per-thread shards and scrape-time collectors"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        # Totals of threads that have exited
+        self._retired = {}
+        self._shards = [self._retired]
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            self._local.token = _ThreadToken()
+            weakref.finalize(self._local.token, self._retire, shard)
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            for index, candidate in enumerate(self._shards):
+                if candidate is shard:
+                    del self._shards[index]
+                    break
+            for metric, slots in shard.items():
+                retired = self._retired.setdefault(metric, {})
+                for key, slot in slots.items():
+                    total = retired.get(key)
+                    if total is None:
+                        retired[key] = list(slot)
+                    else:
+                        for i, value in enumerate(slot):
+                            total[i] += value
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self, name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self, name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Register ``fn() -> [(name, type, documentation, [(labels_dict, value), ...]), ...]``
+
+        Called on every scrape; returns ``fn`` so it can be used as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def _merged(self, metric):
+        merged = {}
+        # Held throughout so a shard being retired is counted exactly once
+        with self._shards_lock:
+            for shard in self._shards:
+                for key, slot in list(shard.get(metric, {}).items()):
+                    total = merged.get(key)
+                    if total is None:
+                        merged[key] = list(slot)
+                    else:
+                        for i, value in enumerate(slot):
+                            total[i] += value
+        return merged
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(self._merged(metric)))
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels, amount=1):
+        slots = self._registry._shard().get(self)
+        if slots is None:
+            slots = self._registry._shard()[self] = {}
+        slot = slots.get(labels)
+        if slot is None:
+            slots[labels] = [amount]
+        else:
+            slot[0] += amount
+
+    def value(self, *labels):
+        slot = self._registry._merged(self).get(labels)
+        return slot[0] if slot else 0
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labels, (value,) in sorted(merged.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets
+
+    Each thread keeps one preallocated ``[bucket counts..., sum, count]``
+    list per label set, so an observation is a bisect and three increments.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        slots = self._registry._shard().get(self)
+        if slots is None:
+            slots = self._registry._shard()[self] = {}
+        slot = slots.get(labels)
+        if slot is None:
+            slot = slots[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        slot[bisect.bisect_left(self.buckets, value)] += 1
+        slot[-2] += value
+        slot[-1] += 1
+
+    def count(self, *labels):
+        slot = self._registry._merged(self).get(labels)
+        return slot[-1] if slot else 0
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, slot in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), slot):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(slot[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {slot[-1]}')
+        return lines
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'xylm_http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'xylm_http_request_duration_seconds', 'HTTP request latency by route and method', ('route', 'method'))
+UPSTREAM_SECONDS = registry.histogram(
+    'xylm_upstream_request_duration_seconds',
+    'Upstream call latency (openai, google_distance_matrix) by outcome', ('upstream', 'outcome'))
+CHAT_EXTRACTIONS = registry.counter(
+    'xylm_chat_extractions_total',
+    'Chat extractions by path (rules, cache, llm) and status (success, partial_success)', ('path', 'status'))
@@ -0,0 +1,124 @@
+"""
+Opt-in per-request profiling for the XYLMCSCICS Food Donation Platform
+
+A request is profiled when it carries the admin ``X-Profile`` header or is
+picked by the configured sample rate. Two modes are available:
+
+- ``sample``: a background thread samples the request thread's stack every
+  few milliseconds and writes folded stacks (``frame;frame;frame count``),
+  the input format of flamegraph.pl, speedscope and inferno.
+- ``cprofile``: deterministic cProfile stats written as a ``.prof`` file
+  (snakeviz, flameprof, ``python -m pstats``).
+
+Only one request is profiled at a time so a high sample rate can't pile up
+overhead; when profiling is off the per-request cost is a config check.
+"""
+
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+_SLUG_RE = re.compile(r'[^A-Za-z0-9]+')
+
+# One profile at a time (cProfile can't nest and samplers add up)
+_active = threading.Lock()
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval=0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        """Samples in folded-stack format, one ``stack count`` line each"""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+class RequestProfile:
+    """A profile in progress for one request"""
+
+    def __init__(self, mode, label, directory, interval=0.002):
+        self.mode = mode
+        self.label = label
+        self.directory = directory
+        self.interval = interval
+        self.path = None
+        self._profiler = None
+        self._sampler = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self.interval).start()
+        return self
+
+    def stop(self):
+        """Stop profiling, write the output file and return its path"""
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+            if self._sampler is not None:
+                self._sampler.stop()
+
+            os.makedirs(self.directory, exist_ok=True)
+            slug = _SLUG_RE.sub('-', self.label).strip('-') or 'root'
+            name = f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{uuid.uuid4().hex[:8]}"
+            if self._profiler is not None:
+                self.path = os.path.join(self.directory, name + '.prof')
+                self._profiler.dump_stats(self.path)
+            else:
+                self.path = os.path.join(self.directory, name + '.folded')
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.write(self._sampler.folded())
+            return self.path
+        finally:
+            _active.release()
+
+
+def start_profile(mode, label, directory, interval=0.002):
+    """Begin profiling the current request, or return None if one is already running"""
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        return RequestProfile(mode, label, directory, interval).start()
+    except Exception:
+        _active.release()
+        raise
@@ -0,0 +1,91 @@
+"""
+Response encoding for the XYLMCSCICS Food Donation Platform
+
+A Flask JSON provider that serializes with ``orjson`` when it is installed,
+and gzip/brotli compression negotiated from ``Accept-Encoding`` for large
+responses. Both packages are pinned in requirements.txt; an environment
+without them still works: without ``orjson`` the stdlib encoder is used,
+without ``brotli`` only gzip is offered.
+"""
+
+import gzip
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({'application/json', 'text/plain', 'text/html', 'text/csv'})
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    ``DefaultJSONProvider`` with orjson doing the encoding
+
+    Output matches the default provider's (sorted keys, dates through
+    ``default``); pretty-printing and anything orjson rejects (e.g.
+    integers beyond 64 bits) go through the stdlib encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def dumps(obj):
+    """Compact JSON text for ``obj`` outside a Flask app context (orjson when installed)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(',', ':'), default=str)
+
+
+def available_encodings():
+    """Supported content codings, most preferred first"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """
+    Best supported coding for a werkzeug ``Accept`` (``request.accept_encodings``)
+
+    Highest quality wins, brotli on ties; returns None when the client
+    accepts neither.
+    """
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=5):
+    """Compress ``data`` (bytes) with ``br`` or ``gzip``"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
@@ -0,0 +1,93 @@
+"""
+Multi-stop pickup planning for the XYLMCSCICS Food Donation Platform
+
+Orders a van run (NGO depot -> donor pickups -> back to the depot) from one
+travel-time matrix, using nearest insertion to build a tour and 2-opt to
+improve it. Pickups may carry a deadline (when the food expires); arriving
+late is penalized heavily, so on-time orders win whenever one exists.
+"""
+
+# Seconds of travel one second of lateness is worth when comparing tours
+LATENESS_PENALTY = 100.0
+
+
+def evaluate_route(order, durations, deadlines, service_seconds=0, return_to_depot=True):
+    """
+    Score a stop order
+
+    ``order`` lists pickup nodes (1..n, node 0 is the depot), ``durations``
+    is the (n+1) x (n+1) travel time matrix in seconds and ``deadlines``
+    holds each node's latest arrival in seconds from departure (or None).
+    Returns ``(cost, arrivals, lateness)`` where cost is travel plus service
+    time plus the lateness penalty.
+    """
+    elapsed = 0.0
+    lateness = 0.0
+    arrivals = []
+    previous = 0
+    for node in order:
+        elapsed += durations[previous][node]
+        arrivals.append(elapsed)
+        deadline = deadlines[node]
+        if deadline is not None and elapsed > deadline:
+            lateness += elapsed - deadline
+        elapsed += service_seconds
+        previous = node
+    if return_to_depot and order:
+        elapsed += durations[previous][0]
+    return elapsed + LATENESS_PENALTY * lateness, arrivals, lateness
+
+
+def nearest_insertion(durations, deadlines, service_seconds=0, return_to_depot=True):
+    """
+    Build a tour by repeatedly inserting the unvisited stop nearest the tour
+
+    Each stop goes in the position that raises the route cost the least.
+    """
+    remaining = set(range(1, len(durations)))
+    order = []
+    # Distance from every unvisited stop to its closest stop already on the tour
+    closest = {node: min(durations[0][node], durations[node][0]) for node in remaining}
+    while remaining:
+        node = min(remaining, key=lambda n: (closest[n], n))
+        remaining.discard(node)
+        best = None
+        for position in range(len(order) + 1):
+            candidate = order[:position] + [node] + order[position:]
+            cost = evaluate_route(candidate, durations, deadlines, service_seconds, return_to_depot)[0]
+            if best is None or cost < best[0]:
+                best = (cost, candidate)
+        order = best[1]
+        for other in remaining:
+            closest[other] = min(closest[other], durations[node][other], durations[other][node])
+    return order
+
+
+def two_opt(order, durations, deadlines, service_seconds=0, return_to_depot=True, max_passes=20):
+    """Reverse segments of the tour while that lowers its cost"""
+    best_cost = evaluate_route(order, durations, deadlines, service_seconds, return_to_depot)[0]
+    for _ in range(max_passes):
+        improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = evaluate_route(candidate, durations, deadlines, service_seconds, return_to_depot)[0]
+                if cost < best_cost - 1e-9:
+                    order, best_cost = candidate, cost
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def plan_stops(durations, deadlines, service_seconds=0, return_to_depot=True):
+    """
+    Order the pickups of one run
+
+    Returns ``(order, arrivals, lateness)`` with ``order`` listing pickup
+    nodes (1..n) and ``arrivals`` the matching arrival times in seconds.
+    """
+    order = nearest_insertion(durations, deadlines, service_seconds, return_to_depot)
+    order = two_opt(order, durations, deadlines, service_seconds, return_to_depot)
+    _, arrivals, lateness = evaluate_route(order, durations, deadlines, service_seconds, return_to_depot)
+    return order, arrivals, lateness
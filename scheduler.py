@@ -0,0 +1,238 @@
+"""
+Urgency-aware scheduler for OpenAI calls
+
+Calls wait in one priority queue ordered by how soon the food in the
+message expires, and a dispatcher thread releases them only while both
+token buckets (requests per minute and tokens per minute) have room, so a
+burst on ``/chat`` is smoothed out to the account's quotas instead of
+hitting upstream rate limits all at once. The queue is bounded: when it is
+full (or a call waits too long) callers get ``SchedulerBusy`` with a
+Retry-After hint straight away. A message more urgent than the least urgent
+waiter takes its place.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from extraction import SYSTEM_PROMPT, extract_with_rules
+from matching import parse_expiry_hours
+
+# Priority for messages without a usable expiry hint (hours until expiry)
+DEFAULT_URGENCY_HOURS = 24.0
+
+# Rough size of one token in characters for budget estimates
+CHARS_PER_TOKEN = 4
+
+
+class SchedulerBusy(Exception):
+    """The queue is full or the call waited too long; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def message_urgency(user_message):
+    """Hours until the food in ``user_message`` expires (DEFAULT_URGENCY_HOURS when unknown)"""
+    fields, _ = extract_with_rules(user_message)
+    hours = parse_expiry_hours({"expiry": fields["expiry"]})
+    return DEFAULT_URGENCY_HOURS if hours is None else hours
+
+
+def estimate_tokens(user_message, max_tokens=150):
+    """Prompt plus completion tokens a /chat extraction will use, roughly"""
+    return (len(SYSTEM_PROMPT) + len(user_message)) // CHARS_PER_TOKEN + max_tokens
+
+
+class TokenBucket:
+    """Refills ``rate_per_minute`` units per minute, holding at most ``capacity``"""
+
+    def __init__(self, rate_per_minute, capacity, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self._clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` units are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= amount
+
+
+class _Waiter:
+    __slots__ = ('priority', 'tokens', 'granted', 'rejected', 'cancelled', 'event', 'future', 'loop')
+
+    def __init__(self, priority, tokens):
+        self.priority = priority
+        self.tokens = tokens
+        self.granted = False
+        self.rejected = None
+        self.cancelled = False
+        self.event = None
+        self.future = None
+        self.loop = None
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        elif self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """
+    Priority queue plus RPM/TPM token buckets in front of a rate-limited API
+
+    ``call(fn, priority, tokens)`` runs ``fn()`` once the call is at the head
+    of the queue (lowest ``priority`` first, e.g. hours until expiry) and
+    both buckets have room; ``acall`` is the asyncio equivalent. Bucket
+    capacity is ``burst_seconds`` worth of each quota.
+    """
+
+    def __init__(self, requests_per_minute=3500, tokens_per_minute=90000, max_queue=200,
+                 max_wait=30.0, burst_seconds=10.0, clock=time.monotonic):
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.requests = TokenBucket(requests_per_minute,
+                                    max(1.0, requests_per_minute / 60.0 * burst_seconds), clock)
+        self.tokens = TokenBucket(tokens_per_minute,
+                                  max(1.0, tokens_per_minute / 60.0 * burst_seconds), clock)
+        self._heap = []
+        self._queued = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._dispatcher = None
+        self.dispatched = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._run, name='llm-scheduler', daemon=True)
+            self._dispatcher.start()
+
+    def retry_after(self):
+        """Seconds until the current queue has likely drained, for Retry-After"""
+        return max(1, math.ceil(self._queued / self.requests.rate)) if self.requests.rate else 60
+
+    def _enqueue(self, waiter):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                # Full: an urgent call displaces the least urgent one waiting
+                live = [entry for entry in self._heap if not entry[2].cancelled]
+                worst = max(live, key=lambda entry: entry[:2], default=None)
+                if worst is None or worst[0] <= waiter.priority:
+                    self.rejected += 1
+                    raise SchedulerBusy("Too many OpenAI requests queued", self.retry_after())
+                worst[2].cancelled = True
+                worst[2].rejected = "Displaced by a more urgent request"
+                self._queued -= 1
+                self.rejected += 1
+                worst[2].wake()
+            heapq.heappush(self._heap, (waiter.priority, next(self._seq), waiter))
+            self._queued += 1
+            self._ensure_dispatcher()
+            self._changed.notify()
+
+    def _abandon(self, waiter):
+        """Drop a waiter that gave up; returns False if it was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            if not waiter.cancelled:
+                waiter.cancelled = True
+                self._queued -= 1
+                self.timed_out += 1
+            return True
+
+    def _run(self):
+        with self._lock:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._changed.wait()
+                    continue
+                waiter = self._heap[0][2]
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(waiter.tokens))
+                if wait > 0:
+                    self._changed.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._queued -= 1
+                self.requests.consume(1)
+                self.tokens.consume(waiter.tokens)
+                waiter.granted = True
+                self.dispatched += 1
+                waiter.wake()
+
+    def _check(self, waiter):
+        if waiter.rejected:
+            raise SchedulerBusy(waiter.rejected, self.retry_after())
+
+    def acquire(self, priority, tokens):
+        """Block until this call may go upstream"""
+        waiter = _Waiter(priority, tokens)
+        waiter.event = threading.Event()
+        self._enqueue(waiter)
+        if not waiter.event.wait(self.max_wait) and self._abandon(waiter):
+            raise SchedulerBusy("Timed out waiting for OpenAI capacity", self.retry_after())
+        self._check(waiter)
+
+    async def acquire_async(self, priority, tokens):
+        """asyncio ``acquire``: waits without holding a thread"""
+        waiter = _Waiter(priority, tokens)
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                raise SchedulerBusy("Timed out waiting for OpenAI capacity", self.retry_after())
+        self._check(waiter)
+
+    def call(self, fn, priority, tokens):
+        """Run ``fn()`` when the scheduler lets it through"""
+        self.acquire(priority, tokens)
+        return fn()
+
+    async def acall(self, fn, priority, tokens):
+        """Await ``fn()`` when the scheduler lets it through"""
+        await self.acquire_async(priority, tokens)
+        return await fn()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "dispatched": self.dispatched,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "request_tokens": round(self.requests.tokens, 2),
+                "token_budget": round(self.tokens.tokens, 1)
+            }
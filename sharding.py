@@ -0,0 +1,494 @@
+"""
+City-sharded matching for the XYLMCSCICS Food Donation Platform
+
+Donations and NGO requests are partitioned by location label (the keys of
+``donations_by_location``) across worker processes, each running its own
+``MatchingEngine`` with its own spatial and expiry indexes. Calls for one
+city go to that city's shard over a pipe, so matching in different cities
+runs on different cores instead of sharing one interpreter's GIL, and
+``/match`` merges the shards' aggregates.
+
+A donation is matched within its own city first; only when that city has
+no compatible NGO are the other shards searched. Donors and NGOs active in
+more than one city are counted once per city in the merged totals.
+
+The shard processes are started by the first call, so a server that
+imports the app in one process and forks the one that serves requests
+(``gunicorn --preload``) starts them in the serving process.
+"""
+
+import multiprocessing
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from matching import MATCH_STATUSES, MatchingEngine, normalize_label
+
+# Joins the per-shard parts of a merged /match cursor
+CURSOR_SEPARATOR = '~'
+
+
+def _context():
+    # fork: spawn would re-import the server module (app.py) in every shard
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+def serve_shard(conn, cell_size_deg, max_recent_matches, inherited=()):
+    """Shard process: run ``MatchingEngine`` calls received on ``conn`` until it closes"""
+    for other in inherited:
+        # Pipes to earlier shards copied in by fork; closing them lets those
+        # shards see EOF when the API process goes away
+        other.close()
+    engine = MatchingEngine(cell_size_deg=cell_size_deg, max_recent_matches=max_recent_matches,
+                            track_expired=True)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        method, args, kwargs = request
+        try:
+            result = (True, getattr(engine, method)(*args, **kwargs))
+        except Exception as e:
+            result = (False, e)
+        # Expired donations ride along so the API process can forget their owners
+        conn.send(result + (engine.version, engine.drain_expired()))
+
+
+def merge_snapshots(payloads, max_recent_matches):
+    """One /match payload from the shards' payloads (version is filled in by the caller)"""
+    def total(key):
+        return sum(payload[key] for payload in payloads)
+
+    def combine(key):
+        combined = {}
+        for payload in payloads:
+            for label, quantity in payload[key].items():
+                combined[label] = round(combined.get(label, 0) + quantity, 2)
+        return combined
+
+    matches = sorted((match for payload in payloads for match in payload["recent_matches"]),
+                     key=lambda match: match["matched_at"], reverse=True)
+    return {
+        "total_donors": total("total_donors"),
+        "total_ngos": total("total_ngos"),
+        "total_food_quantity": round(total("total_food_quantity"), 2),
+        "food_units": "kg",
+        "donations_by_food_type": combine("donations_by_food_type"),
+        "donations_by_location": combine("donations_by_location"),
+        "recent_matches": matches[:max_recent_matches],
+        "match_cursor": CURSOR_SEPARATOR.join(payload["match_cursor"] for payload in payloads),
+        "open_donations": total("open_donations"),
+        "expired_donations": total("expired_donations"),
+        "open_ngo_requests": total("open_ngo_requests"),
+        "status": "success",
+        "last_updated": max(payload["last_updated"] for payload in payloads)
+    }
+
+
+class _Shard:
+    def __init__(self, index, context, cell_size_deg, max_recent_matches, inherited):
+        self.index = index
+        self.lock = threading.Lock()
+        self.version = 0
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=serve_shard, name=f'match-shard-{index}', daemon=True,
+                                       args=(child, cell_size_deg, max_recent_matches, inherited))
+        self.process.start()
+        child.close()
+
+    def reply(self):
+        """``(ok, result, expired donation ids)`` for the last request"""
+        ok, result, self.version, expired = self.conn.recv()
+        return ok, result, expired
+
+
+class ShardedMatchingEngine:
+    """
+    ``MatchingEngine`` interface over ``shards`` worker processes
+
+    Records are routed by ``normalize_label(location)``; the API process
+    only keeps which shard owns each open record and recent match. Calls
+    to one shard are serialized, calls to different shards run in
+    parallel, and reads that need every shard are sent to all of them
+    before any reply is awaited. The processes start with the first call
+    and belong to the process that made it.
+    """
+
+    def __init__(self, shards=2, cell_size_deg=0.05, max_recent_matches=50):
+        self.shards = shards
+        self.cell_size_deg = cell_size_deg
+        self.max_recent_matches = max_recent_matches
+        self._shards = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._donation_owner = {}
+        self._ngo_owner = {}
+        self._match_owner = OrderedDict()
+        self._status_changes = deque(maxlen=max_recent_matches)
+        self._status_seq = 0
+        self._listeners = []
+        self._snapshot = None
+        self.instance_id = uuid.uuid4().hex[:12]
+        self.version = 0
+
+    def __len__(self):
+        return self.shards
+
+    def _ensure_started(self):
+        """Start the shard processes on first use; they can't be used from another process"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid is None:
+                context = _context()
+                for index in range(self.shards):
+                    inherited = [shard.conn for shard in self._shards]
+                    self._shards.append(_Shard(index, context, self.cell_size_deg, self.max_recent_matches,
+                                               inherited))
+                self._pid = os.getpid()
+            elif self._pid != os.getpid():
+                raise RuntimeError("Match shards belong to the process that started them; "
+                                   "use MATCH_SHARDS=1 with forking multi-worker servers")
+
+    def _changed(self):
+        with self._lock:
+            version = sum(shard.version for shard in self._shards)
+            if version == self.version:
+                return
+            self.version = version
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(version)
+
+    def _forget_expired(self, shard, expired):
+        if not expired:
+            return
+        with self._lock:
+            for donation_id in expired:
+                if self._donation_owner.get(donation_id) is shard:
+                    del self._donation_owner[donation_id]
+
+    def _call(self, shard, method, *args, **kwargs):
+        self._ensure_started()
+        with shard.lock:
+            shard.conn.send((method, args, kwargs))
+            ok, result, expired = shard.reply()
+            self._forget_expired(shard, expired)
+        self._changed()
+        if not ok:
+            raise result
+        return result
+
+    def _scatter(self, calls):
+        """Run one ``(method, args, kwargs)`` per shard in parallel; results in shard order"""
+        self._ensure_started()
+        for shard in self._shards:
+            shard.lock.acquire()
+        try:
+            for shard, call in zip(self._shards, calls):
+                shard.conn.send(call)
+            replies = [shard.reply() for shard in self._shards]
+            for shard, (_, _, expired) in zip(self._shards, replies):
+                self._forget_expired(shard, expired)
+        finally:
+            for shard in self._shards:
+                shard.lock.release()
+        self._changed()
+        for ok, result, _ in replies:
+            if not ok:
+                raise result
+        return [result for _, result, _ in replies]
+
+    def _call_all(self, method, *args, **kwargs):
+        return self._scatter([(method, args, kwargs)] * self.shards)
+
+    def shard_for(self, location):
+        """Shard that owns records filed under ``location``"""
+        self._ensure_started()
+        key = normalize_label(location).encode('utf-8')
+        return self._shards[zlib.crc32(key) % self.shards]
+
+    def add_listener(self, fn):
+        """Call ``fn(version)`` after every change (see ``MatchingEngine.add_listener``)"""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def current_version(self):
+        """Version after every shard has expired anything that is due"""
+        self._call_all('current_version')
+        return self.version
+
+    def _add(self, owners, method, record):
+        record = dict(record)
+        record.setdefault('id', uuid.uuid4().hex)
+        shard = self.shard_for(record.get('location'))
+        with self._lock:
+            previous = owners.get(record['id'])
+            owners[record['id']] = shard
+        if previous is not None and previous is not shard:
+            self._call(previous, method.replace('add_', 'remove_'), record['id'])
+        return self._call(shard, method, record)
+
+    def _remove(self, owners, method, record_id):
+        with self._lock:
+            shard = owners.pop(record_id, None)
+        return None if shard is None else self._call(shard, method, record_id)
+
+    def add_donation(self, donation):
+        """Register an open donation with its city's shard and return its id"""
+        return self._add(self._donation_owner, 'add_donation', donation)
+
+    def remove_donation(self, donation_id):
+        return self._remove(self._donation_owner, 'remove_donation', donation_id)
+
+    def add_ngo_request(self, ngo_request):
+        """Register an open NGO request with its city's shard and return its id"""
+        return self._add(self._ngo_owner, 'add_ngo_request', ngo_request)
+
+    def remove_ngo_request(self, ngo_id):
+        return self._remove(self._ngo_owner, 'remove_ngo_request', ngo_id)
+
+    def _get(self, owners, method, record_id):
+        shard = owners.get(record_id)
+        record = None if shard is None else self._call(shard, method, record_id)
+        if record is None and shard is not None:
+            with self._lock:
+                # Matched or expired inside the shard
+                if owners.get(record_id) is shard:
+                    del owners[record_id]
+        return record
+
+    def get_donation(self, donation_id):
+        return self._get(self._donation_owner, 'get_donation', donation_id)
+
+    def get_ngo_request(self, ngo_id):
+        return self._get(self._ngo_owner, 'get_ngo_request', ngo_id)
+
+    def urgent_donations(self, limit=10):
+        """Open donations with an expiry time across all shards, soonest first"""
+        donations = [donation for shard_donations in self._call_all('urgent_donations', limit)
+                     for donation in shard_donations]
+        return sorted(donations, key=lambda donation: donation['expires_at'])[:limit]
+
+    def match_most_urgent(self, max_distance_km=None, scan_limit=20):
+        """Match the most urgent donation (in any city) that has a compatible NGO"""
+        for donation in self.urgent_donations(scan_limit):
+            try:
+                match = self.match_donation(donation['id'], max_distance_km=max_distance_km)
+            except KeyError:
+                continue
+            if match is not None:
+                return match
+        return None
+
+    def assignment_inputs(self):
+        """``(donations, ngos)`` for the assignment solver, gathered from every shard"""
+        donations, ngos = [], []
+        for shard_donations, shard_ngos in self._call_all('assignment_inputs'):
+            donations.extend(shard_donations)
+            ngos.extend(shard_ngos)
+        return donations, ngos
+
+    def nearest_ngos(self, donation_id=None, lat=None, lng=None, food_type=None,
+                     limit=5, max_distance_km=None):
+        """Nearest compatible NGO requests in any city (see ``MatchingEngine.nearest_ngos``)"""
+        if donation_id is not None:
+            donation = self.get_donation(donation_id)
+            if donation is None:
+                raise KeyError(f"Unknown donation: {donation_id}")
+            coords = MatchingEngine._coordinates(donation)
+            if coords is None:
+                return []
+            lat, lng = coords
+            food_type = donation.get('foodType')
+        ngos = [ngo for shard_ngos in self._call_all('nearest_ngos', lat=lat, lng=lng, food_type=food_type,
+                                                      limit=limit, max_distance_km=max_distance_km)
+                for ngo in shard_ngos]
+        return sorted(ngos, key=lambda ngo: ngo['distance_km'])[:limit]
+
+    def match_donation(self, donation_id, ngo_id=None, max_distance_km=None, consume_ngo=False):
+        """
+        Pair a donation with an NGO request (see ``MatchingEngine.match_donation``)
+
+        Runs on the donation's shard. An ``ngo_id`` from another city is
+        fetched from its shard and passed along; without one, other cities are searched only if the
+        donation's own city has no compatible NGO.
+        """
+        shard = self._donation_owner.get(donation_id)
+        if shard is None:
+            raise KeyError(f"Unknown or expired donation: {donation_id}")
+        ngo = None
+        if ngo_id is not None:
+            ngo_shard = self._ngo_owner.get(ngo_id)
+            if ngo_shard is None:
+                raise KeyError(f"Unknown NGO request: {ngo_id}")
+            if ngo_shard is not shard:
+                ngo = self._call(ngo_shard, 'get_ngo_request', ngo_id)
+                if ngo is None:
+                    raise KeyError(f"Unknown NGO request: {ngo_id}")
+
+        match = self._call(shard, 'match_donation', donation_id, ngo_id=ngo_id,
+                           max_distance_km=max_distance_km, ngo=ngo)
+        if match is None and ngo_id is None and self.shards > 1:
+            candidates = self.nearest_ngos(donation_id, limit=1, max_distance_km=max_distance_km)
+            if candidates:
+                ngo = candidates[0]
+                ngo_shard = self._ngo_owner.get(ngo['id'])
+                match = self._call(shard, 'match_donation', donation_id, ngo_id=ngo['id'],
+                                   ngo=None if ngo_shard is shard else ngo)
+        if match is not None:
+            with self._lock:
+                self._donation_owner.pop(donation_id, None)
+            self._remember_match(match['id'], shard)
+            if consume_ngo:
+                # Through the NGO's shard, wherever it is, so its routing entry goes too once full
+                match["consumes_ngo"] = True
+                self.consume_ngo_request(match['ngo_id'])
+        return match
+
+    def consume_ngo_request(self, ngo_id):
+        """Use up one donation of an NGO request's capacity (see ``MatchingEngine.consume_ngo_request``)"""
+        shard = self._ngo_owner.get(ngo_id)
+        if shard is None:
+            return None
+        remaining = self._call(shard, 'consume_ngo_request', ngo_id)
+        if remaining == 0:
+            with self._lock:
+                if self._ngo_owner.get(ngo_id) is shard:
+                    del self._ngo_owner[ngo_id]
+        return remaining
+
+    def restore_match(self, match, consume_ngo=True):
+        """Re-apply a match on the shard that held its donation, e.g. when replaying the ingest log"""
+        self._ensure_started()
+        with self._lock:
+            shard = self._donation_owner.pop(match['donation_id'], None) or self._shards[0]
+        self._call(shard, 'restore_match', match, consume_ngo=False)
+        self._remember_match(match['id'], shard)
+        if consume_ngo and match.get('consumes_ngo'):
+            self.consume_ngo_request(match['ngo_id'])
+
+    def _remember_match(self, match_id, shard):
+        with self._lock:
+            self._match_owner[match_id] = shard
+            while len(self._match_owner) > self.max_recent_matches * self.shards:
+                self._match_owner.popitem(last=False)
+
+    def update_match_status(self, match_id, status, updated_at=None):
+        """Move a recent match to another delivery status (see ``MatchingEngine.update_match_status``)"""
+        if status not in MATCH_STATUSES:
+            raise ValueError(f"Unknown status: {status} (expected one of {', '.join(MATCH_STATUSES)})")
+        shard = self._match_owner.get(match_id)
+        if shard is None:
+            raise KeyError(f"Unknown match: {match_id}")
+        match = self._call(shard, 'update_match_status', match_id, status,
+                           updated_at or datetime.now(timezone.utc).isoformat())
+        with self._lock:
+            self._status_seq += 1
+            self._status_changes.append((self._status_seq, {
+                "id": match_id, "status": status, "updated_at": match['status_updated_at']
+            }))
+        return match
+
+    def status_changes_since(self, seq):
+        """Status updates after sequence number ``seq``, oldest first, and the latest sequence number"""
+        with self._lock:
+            return ([dict(change) for change_seq, change in self._status_changes if change_seq > seq],
+                    self._status_seq)
+
+    def match_cursor(self):
+        """Cursor pointing just past the most recent match on every shard"""
+        return CURSOR_SEPARATOR.join(self._call_all('match_cursor'))
+
+    def matches_since(self, cursor, limit=None):
+        """
+        Recent matches made after ``cursor`` on any shard (see ``MatchingEngine.matches_since``)
+
+        The cursor holds one position per shard and ``limit`` is split
+        between the shards. A cursor from a different number of shards, or
+        one that any shard has to reset, restarts every shard from its
+        oldest kept match.
+        """
+        parts = str(cursor).split(CURSOR_SEPARATOR)
+        for part in parts:
+            instance, _, seq = part.rpartition('.')
+            if not instance or not seq.isdigit():
+                raise ValueError(f"Invalid cursor: {cursor}")
+        if len(parts) != self.shards:
+            parts = ['reset.0'] * self.shards
+        per_shard = None if limit is None else max(1, -(-limit // self.shards))
+
+        replies = self._scatter([('matches_since', (part, per_shard), {}) for part in parts])
+        reset = any(reply[3] for reply in replies)
+        if reset and not all(reply[3] for reply in replies):
+            replies = self._call_all('matches_since', 'reset.0', per_shard)
+        matches = sorted((match for reply in replies for match in reply[0]),
+                         key=lambda match: match['matched_at'], reverse=True)
+        next_cursor = CURSOR_SEPARATOR.join(reply[1] for reply in replies)
+        return matches, next_cursor, any(reply[2] for reply in replies), reset
+
+    def snapshot(self):
+        """
+        Return ``(version, payload)`` for ``/match``, merged from every shard
+
+        Shards are only asked for their payloads when one of their versions
+        moved; the merged payload is shared between callers (read-only).
+        """
+        versions = tuple(self._call_all('current_version'))
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == versions:
+                return self._snapshot[1]
+        snapshots = self._call_all('snapshot')
+        versions = tuple(version for version, _ in snapshots)
+        payload = merge_snapshots([payload for _, payload in snapshots], self.max_recent_matches)
+        payload["version"] = sum(versions)
+        result = (payload["version"], payload)
+        with self._lock:
+            if self._snapshot is None or sum(self._snapshot[0]) <= payload["version"]:
+                self._snapshot = (versions, result)
+        return result
+
+    def summary(self):
+        """Build the ``/match`` payload from the live state"""
+        return self.snapshot()[1]
+
+    def export_state(self):
+        """Open records and recent matches from every shard (see ``MatchingEngine.export_state``)"""
+        state = {"donations": [], "ngo_requests": [], "recent_matches": []}
+        for shard_state in self._call_all('export_state'):
+            for key, records in shard_state.items():
+                state[key].extend(records)
+        state["recent_matches"].sort(key=lambda match: match["matched_at"])
+        return state
+
+    def shard_stats(self):
+        """Shard processes and their engine versions, for /health"""
+        return [{
+            "shard": shard.index,
+            "pid": shard.process.pid,
+            "alive": shard.process.is_alive(),
+            "version": shard.version
+        } for shard in self._shards]
+
+    def close(self):
+        """Stop the shard processes (only their owner can)"""
+        if self._pid != os.getpid():
+            return
+        for shard in self._shards:
+            with shard.lock:
+                try:
+                    shard.conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                shard.conn.close()
+        for shard in self._shards:
+            shard.process.join(timeout=5)
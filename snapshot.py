@@ -0,0 +1,276 @@
+"""
+Snapshot files for warm restarts of the XYLMCSCICS Food Donation Platform
+
+A snapshot captures the matching engine's open records and recent matches,
+the in-memory chat and distance caches, the columnar history store and the
+ingest log position they correspond to. On startup the file is memory-mapped:
+history columns are used straight from the mapping (no parsing or copying),
+the rest is loaded from a JSON header, and only the ingest log written after
+the snapshot is replayed.
+
+File layout (little-endian)::
+
+    b"XYLMSNAP" | format version (uint32) | header length (uint32) | header JSON
+    | column data, each column starting on a 64-byte boundary
+
+Files with another format version are ignored (the log is replayed in full).
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from response_encoding import dumps
+
+MAGIC = b'XYLMSNAP'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sII')
+
+
+class StateGate:
+    """
+    Many concurrent state changes, or one snapshot capture
+
+    Handlers that append to the ingest log and apply the change hold the
+    gate shared; a capture holds it exclusively, so the state it copies and
+    the log position it records always agree. Waiting captures go first.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._active = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._changed:
+            while self._exclusive:
+                self._changed.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._active -= 1
+                if not self._active:
+                    self._changed.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._changed:
+            while self._exclusive:
+                self._changed.wait()
+            self._exclusive = True
+            while self._active:
+                self._changed.wait()
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._exclusive = False
+                self._changed.notify_all()
+
+
+def _padding(position):
+    return -position % ALIGNMENT
+
+
+def write_snapshot(path, header, arrays):
+    """
+    Atomically write ``header`` (JSON-serializable) and named 1-D arrays to ``path``
+
+    The file is written next to ``path``, fsync'd and renamed over it, so
+    readers (and processes still mapping the old file) never see a partial one.
+    """
+    header = dict(header, arrays={})
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "length": int(len(array)), "offset": offset}
+        offset += array.nbytes + _padding(array.nbytes)
+    header_bytes = dumps(header).encode('utf-8')
+    data_start = _PREFIX.size + len(header_bytes)
+    data_start += _padding(data_start)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_start - _PREFIX.size - len(header_bytes)))
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.write(b'\0' * _padding(array.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return data_start + offset
+
+
+def read_snapshot(path):
+    """
+    ``(header, arrays)`` from a snapshot file, or None if it is missing or unusable
+
+    The arrays are read-only views of a memory mapping of the file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # ValueError: empty file
+        return None
+    try:
+        magic, version, header_length = _PREFIX.unpack_from(mapped, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            print(f"Ignoring snapshot {path}: unsupported format")
+            return None
+        header = json.loads(mapped[_PREFIX.size:_PREFIX.size + header_length])
+        data_start = _PREFIX.size + header_length
+        data_start += _padding(data_start)
+        arrays = {}
+        for name, spec in header.pop("arrays").items():
+            dtype = np.dtype(spec["dtype"])
+            arrays[name] = np.frombuffer(mapped, dtype=dtype, count=spec["length"],
+                                         offset=data_start + spec["offset"])
+        return header, arrays
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring snapshot {path}: {e}")
+        return None
+
+
+def capture(gate, engine, ingest_log=None, history_store=None, caches=None):
+    """
+    Header and arrays for ``write_snapshot``, taken while ``gate`` is held exclusively
+
+    ``caches`` maps names to ``LRUCache`` objects.
+    """
+    with gate.exclusive():
+        seq, offset = ingest_log.checkpoint() if ingest_log is not None else (0, 0)
+        header = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "ingest_seq": seq,
+            "ingest_offset": offset,
+            "engine": engine.export_state(),
+            "caches": {name: cache.entries() for name, cache in (caches or {}).items()}
+        }
+        arrays = {}
+        if history_store is not None:
+            header["history"], arrays = history_store.export_columns()
+    return header, arrays
+
+
+def save(path, gate, engine, ingest_log=None, history_store=None, caches=None):
+    """Capture the state and write it to ``path``; returns a summary for /health"""
+    started = time.perf_counter()
+    header, arrays = capture(gate, engine, ingest_log, history_store, caches)
+    size = write_snapshot(path, header, arrays)
+    return {
+        "path": path,
+        "created_at": header["created_at"],
+        "ingest_seq": header["ingest_seq"],
+        "bytes": size,
+        "seconds": round(time.perf_counter() - started, 4)
+    }
+
+
+def restore(path, engine, history_store=None, caches=None):
+    """
+    Load a snapshot into empty components
+
+    Returns ``{"ingest_seq", "ingest_offset", "created_at", ...}`` for
+    replaying the log tail, or None when there is no usable snapshot.
+    """
+    loaded = read_snapshot(path)
+    if loaded is None:
+        return None
+    header, arrays = loaded
+    state = header["engine"]
+    for record in state["ngo_requests"]:
+        engine.add_ngo_request(record)
+    for record in state["donations"]:
+        engine.add_donation(record)
+    for match in state["recent_matches"]:
+        # The NGO requests above already have the capacity these matches used
+        engine.restore_match(match, consume_ngo=False)
+    for name, cache in (caches or {}).items():
+        cache.load(header["caches"].get(name, []))
+    if history_store is not None and "history" in header:
+        history_store.load_columns(header["history"], arrays)
+    return {
+        "path": path,
+        "created_at": header["created_at"],
+        "ingest_seq": header["ingest_seq"],
+        "ingest_offset": header["ingest_offset"],
+        "open_donations": len(state["donations"]),
+        "history_records": len(arrays.get("kind", ()))
+    }
+
+
+class Snapshotter:
+    """Calls ``save_fn()`` every ``interval`` seconds if ``position()`` moved since the last save"""
+
+    def __init__(self, interval, save_fn, position):
+        self.interval = interval
+        self._save = save_fn
+        self._position = position
+        self._saved_position = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.last = None
+        self.failures = 0
+
+    def start(self):
+        # Per process: a thread started before a fork does not exist in the child
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='snapshotter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.save_if_changed()
+
+    def save_if_changed(self):
+        """
+        Save unless nothing changed since the last snapshot; returns its summary or None
+
+        Only the process that started the snapshotter (the one serving
+        requests) saves: a preloading server's master still holds the state
+        it had before forking and must not overwrite the workers' snapshot.
+        """
+        if self._pid != os.getpid():
+            return None
+        with self._lock:
+            position = self._position()
+            if position == self._saved_position:
+                return None
+            try:
+                self.last = self._save()
+                self._saved_position = position
+            except Exception as e:
+                self.failures += 1
+                print(f"Snapshot failed: {e}")
+                return None
+            return self.last
+
+
+def process_age():
+    """Seconds since this process started, or None where /proc is not available"""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return round(max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK')), 3)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script for create_app, lazy imports and fork-safe caches
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+from cache import SQLiteCache
+
+
+def test_create_app_applies_config():
+    from app import create_app
+    production = create_app('production')
+    development = create_app('development')
+    testing = create_app('testing')
+
+    assert production.debug is False and production.config['DEBUG'] is False
+    assert development.config['DEBUG'] is True
+    assert testing.config['TESTING'] is True
+    assert create_app('unknown').config['DEBUG'] is True
+    assert production.test_client().get('/health').status_code == 200
+    assert production.url_map.bind('localhost').match('/match', method='POST')[0] == 'api.create_match'
+
+
+def test_import_does_not_load_openai(tmp_path):
+    """Importing the app (as a preloading server does) leaves the OpenAI SDK unimported"""
+    env = dict(os.environ, INGEST_LOG_PATH=str(tmp_path / 'log.jsonl'),
+               DISTANCE_CACHE_PATH=str(tmp_path / 'cache.sqlite3'))
+    code = "import sys, wsgi; print(wsgi.application.debug, 'openai' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    assert output.strip().splitlines()[-1] == "False False"
+
+
+def _use_cache_in_child(cache, queue):
+    cache.set('child', {"pid": os.getpid()})
+    queue.put(cache.get('child')[0]["pid"] == os.getpid())
+
+
+def test_sqlite_cache_reopens_after_fork(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('parent', 1)
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    child = context.Process(target=_use_cache_in_child, args=(cache, queue))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0 and queue.get(timeout=5) is True
+    assert cache.get('parent')[0] == 1
+    assert cache.get('child') is not None
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for the ASGI serving mode (asgi.py)
+"""
+
+import asyncio
+import gzip
+import json
+import time
+from types import SimpleNamespace
+
+import openai
+
+import asgi
+from scheduler import LLMScheduler
+
+
+async def call(method, path, payload=None, query=b'', headers=(), raw=False):
+    """Send one request through the ASGI app and return (status, headers, json or raw body)"""
+    body = json.dumps(payload).encode() if payload is not None else b''
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query,
+        'headers': [(b'content-type', b'application/json'), *headers],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 1234), 'scheme': 'http'
+    }
+    await asgi.application(scope, receive, send)
+    headers = dict(sent[0]['headers'])
+    return sent[0]['status'], headers, sent[1]['body'] if raw else json.loads(sent[1]['body'])
+
+
+def test_flask_routes_are_bridged():
+    """Routes without an async handler are served by the Flask app"""
+    status, headers, data = asyncio.run(call('GET', '/health'))
+    assert status == 200
+    assert data["status"] == "healthy"
+
+    status, _, data = asyncio.run(call('GET', '/route'))
+    assert data["endpoint"] == "/route"
+
+
+def test_route_matches_flask_shape(monkeypatch):
+    """Async /route returns the same payload as the Flask handler"""
+    monkeypatch.delenv('GOOGLE_MAPS_API_KEY', raising=False)
+    payload = {"donor_lat": 28.6139, "donor_lng": 77.2090, "ngo_lat": 28.7041, "ngo_lng": 77.1025}
+
+    status, headers, data = asyncio.run(call('POST', '/route', payload))
+    expected = asgi.flask_app.test_client().post('/route', json=payload).get_json()
+
+    assert status == 200
+    assert data == expected
+    assert headers[b'access-control-allow-origin']
+
+    status, _, data = asyncio.run(call('POST', '/route', {"donor_lat": 100, "donor_lng": 1, "ngo_lat": 1, "ngo_lng": 1}))
+    assert status == 400
+
+
+def test_native_routes_echo_allowed_origins(monkeypatch):
+    """A list in CORS_ORIGINS allows only its origins, one per response"""
+    monkeypatch.setattr(asgi.Config, 'CORS_ORIGINS', 'https://a.example, https://b.example')
+    payload = {"donor_lat": 28.6139, "donor_lng": 77.2090, "ngo_lat": 28.7041, "ngo_lng": 77.1025}
+
+    _, headers, _ = asyncio.run(call('POST', '/route', payload, headers=[(b'origin', b'https://b.example')]))
+    assert headers[b'access-control-allow-origin'] == b'https://b.example'
+    assert headers[b'vary'] == b'Origin'
+    _, headers, _ = asyncio.run(call('POST', '/route', payload, headers=[(b'origin', b'https://evil.example')]))
+    assert b'access-control-allow-origin' not in headers
+
+
+def test_native_routes_are_compressed_and_profiled(monkeypatch, tmp_path):
+    """Native responses get Flask's compression, and profiled requests go through Flask's hooks"""
+    monkeypatch.delenv('GOOGLE_MAPS_API_KEY', raising=False)
+    monkeypatch.setattr(asgi.Config, 'COMPRESSION_ENABLED', True)
+    monkeypatch.setattr(asgi.Config, 'COMPRESSION_MIN_BYTES', 1)
+    payload = {"donor_lat": 28.6139, "donor_lng": 77.2090, "ngo_lat": 28.7041, "ngo_lng": 77.1025}
+
+    status, headers, body = asyncio.run(call('POST', '/route', payload, raw=True,
+                                             headers=[(b'accept-encoding', b'gzip')]))
+    assert status == 200 and headers[b'content-encoding'] == b'gzip'
+    assert int(headers[b'content-length']) == len(body)
+    assert json.loads(gzip.decompress(body))["status"] == "success"
+    _, headers, _ = asyncio.run(call('POST', '/route', payload))
+    assert b'content-encoding' not in headers
+
+    monkeypatch.setattr(asgi.Config, 'PROFILE_ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(asgi.Config, 'PROFILE_SAMPLE_RATE', 0)
+    monkeypatch.setattr(asgi.Config, 'PROFILE_DIR', str(tmp_path))
+    _, headers, data = asyncio.run(call('POST', '/route', payload, headers=[(b'x-profile', b'secret')]))
+    assert data["status"] == "success"
+    assert (tmp_path / headers[b'x-profile-file'].decode()).exists()
+    _, headers, _ = asyncio.run(call('POST', '/route', payload, headers=[(b'x-profile', b'wrong')]))
+    assert b'x-profile-file' not in headers
+
+
+def test_lifespan_claims_state(monkeypatch):
+    """Startup claims the ingest log and snapshots once, and fails if another process holds them"""
+    claims = []
+    monkeypatch.setattr(asgi, 'setup_upstreams', lambda: None)
+
+    async def run(messages):
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        await asgi.application({'type': 'lifespan'}, receive, send)
+        return sent
+
+    monkeypatch.setattr(asgi.api, 'claim_state', lambda: claims.append(1))
+    sent = asyncio.run(run([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete'] and claims == [1]
+
+    def busy():
+        raise RuntimeError("Ingest log is in use by process 1")
+
+    monkeypatch.setattr(asgi.api, 'claim_state', busy)
+    assert asyncio.run(run([{'type': 'lifespan.startup'}])) == ['lifespan.startup.failed']
+
+
+def test_chat_requests_overlap_on_one_loop(monkeypatch):
+    """Hundreds of model calls are awaited concurrently without threads"""
+    async def acreate(**kwargs):
+        await asyncio.sleep(0.1)
+        message = kwargs["messages"][-1]["content"]
+        content = json.dumps({"food": message, "quantity": "unknown", "expiry": "unknown", "location": "unknown"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(openai.ChatCompletion, 'acreate', acreate)
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    # Budgets high enough that the scheduler admits the whole burst at once
+    monkeypatch.setattr(asgi.api, 'llm_scheduler', LLMScheduler(requests_per_minute=1e6, tokens_per_minute=1e9))
+    asgi.api.chat_cache.clear()
+
+    async def burst():
+        return await asyncio.gather(*[call('POST', '/chat', {"message": f"item number x{i}"}) for i in range(200)])
+
+    start = time.perf_counter()
+    results = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+
+    assert all(status == 200 for status, _, _ in results)
+    assert results[42][2]["food"] == "item number x42"
+    assert results[42][2]["extraction_path"] == "llm"
+    assert elapsed < 2
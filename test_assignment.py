@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for the donor-to-NGO assignment solver
+"""
+
+import itertools
+import random
+import time
+
+from assignment import auction_assignment, nearest_candidates, plan_assignment
+from matching import MatchingEngine, haversine_km
+
+
+def brute_force(candidates, capacities):
+    donors = list(candidates)
+    best = 0.0
+    for choice in itertools.product(*[[None] + list(candidates[d]) for d in donors]):
+        used = {}
+        total = 0.0
+        for edge in choice:
+            if edge is not None:
+                used[edge[0]] = used.get(edge[0], 0) + 1
+                total += edge[1]
+        if all(count <= capacities.get(ngo, 1) for ngo, count in used.items()):
+            best = max(best, total)
+    return best
+
+
+def test_auction_matches_brute_force():
+    """Auction totals agree with exhaustive search on small instances, both bidding directions"""
+    rng = random.Random(5)
+    for trial in range(60):
+        ngos = [f"n{j}" for j in range(rng.randint(1, 4))]
+        capacities = {ngo: rng.randint(1, 2) for ngo in ngos}
+        candidates = {f"d{i}": [(ngo, round(rng.uniform(-5, 20), 2))
+                                for ngo in rng.sample(ngos, rng.randint(1, len(ngos)))]
+                      for i in range(rng.randint(1, 6))}
+
+        assigned = auction_assignment(candidates, capacities, epsilon=0.001)
+        benefit = {(d, ngo): b for d, edges in candidates.items() for ngo, b in edges}
+        total = sum(benefit[d, ngo] for d, ngo in assigned.items())
+        assert all(benefit[d, ngo] > 0 for d, ngo in assigned.items())
+        for ngo in ngos:
+            assert list(assigned.values()).count(ngo) <= capacities[ngo]
+        assert abs(total - brute_force(candidates, capacities)) < 0.05, trial
+
+
+def test_assignment_beats_greedy_for_competing_donors():
+    """Donors competing for the same nearest NGO are spread to cut total travel"""
+    engine = MatchingEngine()
+    engine.add_ngo_request({"id": "central", "ngoName": "Central", "foodNeeded": "any",
+                            "location": "Delhi", "lat": 28.60, "lng": 77.20})
+    engine.add_ngo_request({"id": "east", "ngoName": "East", "foodNeeded": "any",
+                            "location": "Delhi", "lat": 28.60, "lng": 77.30})
+    # Both are nearest to Central; "a" is only a little further from East, "b" is much further
+    engine.add_donation({"id": "a", "foodType": "Rice", "quantity": "5kg", "location": "Delhi",
+                         "lat": 28.60, "lng": 77.24})
+    engine.add_donation({"id": "b", "foodType": "Milk", "quantity": "5kg", "location": "Delhi",
+                         "lat": 28.60, "lng": 77.15})
+    engine.add_ngo_request({"id": "far", "ngoName": "Far", "foodNeeded": "Rice",
+                            "location": "Agra", "lat": 27.17, "lng": 78.00})
+
+    plan, considered = plan_assignment(engine, k=2)
+    assert considered == 2
+    assert {entry["donation_id"]: entry["ngo_id"] for entry in plan} == {"a": "east", "b": "central"}
+
+
+def test_nearest_candidates_respect_compatibility():
+    """Pruned candidates are the k nearest compatible NGOs"""
+    rng = random.Random(2)
+    ngos = [(f"n{j}", 28.4 + rng.random() * 0.5, 76.9 + rng.random() * 0.6,
+             rng.choice(["Rice", "Bread", "any"]), 1) for j in range(200)]
+    donations = [(f"d{i}", 28.4 + rng.random() * 0.5, 76.9 + rng.random() * 0.6,
+                  rng.choice(["Rice", "Bread", "Milk"]), None) for i in range(50)]
+
+    for donation, hits in zip(donations, nearest_candidates(donations, ngos, k=3)):
+        ok = [(haversine_km(donation[1], donation[2], n[1], n[2]), j) for j, n in enumerate(ngos)
+              if n[3] == "any" or n[3] == donation[3]]
+        assert [j for j, _ in hits] == [j for _, j in sorted(ok)[:3]]
+
+
+def test_assignment_scales():
+    """10k donations x 1k NGOs are assigned within a few seconds"""
+    rng = random.Random(3)
+    engine = MatchingEngine()
+    foods = ["Rice", "Bread", "Milk", "Dal", "Rotis"]
+    for j in range(1000):
+        engine.add_ngo_request({"id": f"n{j}", "ngoName": f"NGO {j}", "foodNeeded": rng.choice(foods + ["any"]),
+                                "location": "Delhi", "capacity": rng.randint(1, 8),
+                                "lat": 28.4 + rng.random() * 0.5, "lng": 76.9 + rng.random() * 0.6})
+    for i in range(10000):
+        engine.add_donation({"id": f"d{i}", "foodType": rng.choice(foods), "quantity": "1",
+                             "location": "Delhi", "expiryTime": rng.randint(1, 48),
+                             "lat": 28.4 + rng.random() * 0.5, "lng": 76.9 + rng.random() * 0.6})
+
+    start = time.perf_counter()
+    plan, considered = plan_assignment(engine, k=5)
+    elapsed = time.perf_counter() - start
+    print(f"Assigned {len(plan)} of {considered} donations in {elapsed:.2f}s")
+    assert considered == 10000
+    assert elapsed < 10
+
+
+def test_assign_endpoint_commits_matches():
+    """POST /match/assign with commit records the planned matches"""
+    import app as app_module
+    client = app_module.app.test_client()
+    ngo = client.post('/ngo-requests', json={"ngoName": "Assign NGO", "foodNeeded": "Khichdi",
+                                             "location": "Jaipur", "lat": 26.91, "lng": 75.78,
+                                             "capacity": 2}).get_json()["id"]
+    ids = client.post('/donations', json=[
+        {"foodType": "Khichdi", "quantity": "4kg", "location": "Jaipur", "lat": 26.92, "lng": 75.79},
+        {"foodType": "Khichdi", "quantity": "2kg", "location": "Jaipur", "lat": 26.90, "lng": 75.80,
+         "expiryTime": 2}
+    ]).get_json()["ids"]
+
+    data = client.post('/match/assign', json={"commit": True}).get_json()
+    assert data["status"] == "success"
+    committed = {match["donation_id"]: match["ngo_id"] for match in data["matches"]}
+    assert committed == {ids[0]: ngo, ids[1]: ngo}
+    assert all(match["consumes_ngo"] for match in data["matches"])
+    assert app_module.matching_engine.get_ngo_request(ngo) is None
+
+    # The filled NGO gets nothing more
+    later = client.post('/donations', json={"foodType": "Khichdi", "quantity": "1kg", "location": "Jaipur",
+                                            "lat": 26.91, "lng": 75.79}).get_json()["id"]
+    data = client.post('/match/assign', json={"commit": True}).get_json()
+    assert later not in {match["donation_id"] for match in data["matches"]}
+
+    assert client.post('/match/assign', json={"k": 0}).status_code == 400
+    assert client.post('/match/assign', json={"max_distance_km": "far"}).status_code == 400
+    assert client.post('/match/assign', json={"max_distance_km": -1}).status_code == 400
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test script for the benchmark suite and its fake upstreams
+"""
+
+import openai
+
+import maps_client
+from benchmark import compare, percentile, run_benchmark
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+
+def test_run_benchmark_against_fake_upstreams():
+    """A short run drives every scenario through the stand-ins and restores the app's upstreams"""
+    api_base, matrix_url = openai.api_base, maps_client.DISTANCE_MATRIX_URL
+    report = run_benchmark(concurrency=2, operations=10, latency_ms=1, jitter_ms=0)
+
+    assert set(report["scenarios"]) == {"chat", "route", "match"}
+    for result in report["scenarios"].values():
+        assert result["operations"] == 10
+        assert result["errors"] == 0
+        assert result["throughput_rps"] > 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+    assert report["scenarios"]["chat"]["upstream_calls"]["openai"] > 0
+    assert report["scenarios"]["route"]["upstream_calls"]["distance_matrix"] > 0
+    assert "POST /route (pickups)" in report["scenarios"]["route"]["endpoints"]
+    assert report["scenarios"]["match"]["endpoints"]["POST /match"]["requests"] == 10
+    assert (openai.api_base, maps_client.DISTANCE_MATRIX_URL) == (api_base, matrix_url)
+
+
+def test_compare_flags_regressions():
+    def report(p95, rps, error_rate=0.0):
+        return {"scenarios": {"route": {"latency_ms": {"p95": p95, "p99": p95}, "throughput_rps": rps,
+                                        "error_rate": error_rate}}}
+
+    baseline = report(100, 50)
+    assert compare(report(110, 48), baseline, tolerance=0.2) == []
+    regressions = compare(report(150, 30, error_rate=0.05), baseline, tolerance=0.2)
+    assert len(regressions) == 4
+    assert regressions[0].startswith("route: p95")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory and SQLite cache tiers
+"""
+
+import time
+
+import maps_client
+from cache import DistanceCache, LRUCache
+from maps_client import get_distance_matrix
+
+
+def test_lru_eviction_and_ttl():
+    """Least recently used entries are evicted and expired entries miss"""
+    cache = LRUCache(max_entries=2, ttl_seconds=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats.evictions == 1
+
+    cache.set('short', 'x', ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get('short') is None
+    assert cache.stats.expirations == 1
+
+
+def test_distance_cache_survives_restart(tmp_path):
+    """Entries written to SQLite are served by a fresh cache instance"""
+    path = str(tmp_path / 'distances.sqlite3')
+    element = {"distance": "5.2 km", "duration": "15 mins"}
+
+    first = DistanceCache(precision=4, path=path)
+    first.set((28.61391, 77.20902), (28.7041, 77.1025), element)
+
+    second = DistanceCache(precision=4, path=path)
+    # Coordinates within the rounding precision share a key
+    assert second.get((28.613912, 77.209018), (28.70411, 77.10249)) == element
+    stats = second.stats()
+    assert stats["memory"]["misses"] == 1 and stats["disk"]["hits"] == 1
+    assert second.get((28.61391, 77.20902), (28.7041, 77.1025)) == element
+    assert second.stats()["memory"]["hits"] == 1
+
+
+def test_matrix_only_fetches_uncached_pairs(monkeypatch, tmp_path):
+    """Cached pairs are not sent upstream again"""
+    calls = []
+
+    def fetch(origins, destinations, api_key):
+        calls.append((list(origins), list(destinations)))
+        return [[{"distance": "1 km", "duration": "2 mins"} for _ in destinations] for _ in origins]
+
+    monkeypatch.setattr(maps_client, 'fetch_matrix_block', fetch)
+    cache = DistanceCache(path=str(tmp_path / 'd.sqlite3'))
+
+    get_distance_matrix([(1, 1)], [(2, 2)], api_key='test', cache=cache)
+    matrix, requests_made = get_distance_matrix([(1, 1), (3, 3)], [(2, 2)], api_key='test', cache=cache)
+
+    assert requests_made == 1
+    assert calls[-1] == ([(3, 3)], [(2, 2)])
+    assert matrix[0][0]["distance"] == "1 km"
+
+    matrix, requests_made = get_distance_matrix([(1, 1), (3, 3)], [(2, 2)], api_key='test', cache=cache)
+    assert requests_made == 0
+
+    disabled = DistanceCache(enabled=False)
+    get_distance_matrix([(1, 1)], [(2, 2)], api_key='test', cache=disabled)
+    assert len(calls) == 3
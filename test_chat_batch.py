@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the /chat/batch endpoint
+"""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+
+def test_batch_preserves_order_and_statuses(monkeypatch):
+    """Results come back in input order with per-item status"""
+    import app as app_module
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def create(**kwargs):
+        message = kwargs["messages"][-1]["content"]
+        with lock:
+            in_flight.append(message)
+            peak.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(message)
+        if "garbled" in message:
+            content = "sorry, no JSON here"
+        else:
+            content = json.dumps({"food": message.split()[-1], "quantity": "unknown",
+                                  "expiry": "unknown", "location": "unknown"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(openai.ChatCompletion, 'create', create)
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    app_module.chat_cache.clear()
+    client = app_module.app.test_client()
+
+    messages = [f"please collect item{i}" for i in range(16)]
+    messages[3] = "garbled message"
+    messages[5] = "I have 20 rotis in Delhi expiring in 4 hours"
+    messages[7] = ""
+
+    start = time.perf_counter()
+    response = client.post('/chat/batch', json={"messages": messages})
+    elapsed = time.perf_counter() - start
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert [result["index"] for result in data["results"]] == list(range(16))
+    assert data["results"][0]["food"] == "item0"
+    assert data["results"][15]["food"] == "item15"
+    assert data["results"][3]["status"] == "partial_success"
+    assert data["results"][5]["extraction_path"] == "rules"
+    assert data["results"][7]["status"] == "error"
+    assert data["status"] == "partial_success"
+    assert max(peak) <= app_module.Config.CHAT_BATCH_CONCURRENCY
+    # 14 model calls at 50 ms each, run concurrently
+    assert elapsed < 14 * 0.05
+
+
+def test_batch_validation():
+    """Bad payloads are rejected up front"""
+    import app as app_module
+    client = app_module.app.test_client()
+    assert client.post('/chat/batch', json={"messages": []}).status_code == 400
+    assert client.post('/chat/batch', json={"message": "hi"}).status_code == 400
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for the /chat extraction cache and single-flight deduplication
+"""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+from cache import SingleFlight
+from extraction import normalize_message
+
+
+def fake_completion(content, calls, delay=0):
+    """Stand-in for openai.ChatCompletion.create returning ``content``"""
+    def create(**kwargs):
+        calls.append(kwargs["messages"][-1]["content"])
+        time.sleep(delay)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    return create
+
+
+def test_normalize_message():
+    """Whitespace, case, punctuation and number formatting are folded"""
+    base = normalize_message("I have 20 rotis in Delhi expiring in 4 hours")
+    assert normalize_message("  i HAVE 20.0 rotis in delhi,  expiring in 04 hours!! ") == base
+    assert normalize_message("1,000 packets") == normalize_message("1000 packets")
+    assert normalize_message("2.5 kg rice") != normalize_message("25 kg rice")
+    assert normalize_message("I have 1.05 kg rice") != normalize_message("I have 1.5 kg rice")
+    assert normalize_message("I have 1.05 kg rice") == "i have 1.05 kg rice"
+
+
+def test_single_flight_collapses_concurrent_calls():
+    """Concurrent callers for one key share a single execution"""
+    flight = SingleFlight()
+    runs = []
+    gate = threading.Event()
+
+    def slow():
+        runs.append(1)
+        gate.wait(1)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert runs == [1]
+    assert results == ["result"] * 8
+    assert flight.shared == 7
+
+
+def test_chat_endpoint_serves_repeats_from_cache(monkeypatch):
+    """A repeated message with different formatting skips the OpenAI call"""
+    import app as app_module
+    calls = []
+    content = json.dumps({"food": "rotis", "quantity": "20", "expiry": "4 hours", "location": "Delhi"})
+    monkeypatch.setattr(openai.ChatCompletion, 'create', fake_completion(content, calls))
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    monkeypatch.setattr(app_module.Config, 'CHAT_RULES_ENABLED', False)
+    app_module.chat_cache.clear()
+    client = app_module.app.test_client()
+
+    first = client.post('/chat', json={"message": "I have 20 rotis in Delhi expiring in 4 hours"})
+    second = client.post('/chat', json={"message": "i have 20 Rotis in delhi expiring in 4 hours."})
+
+    assert first.get_json()["food"] == "rotis"
+    assert second.get_json()["original_message"] == "i have 20 Rotis in delhi expiring in 4 hours."
+    assert second.get_json()["extraction_path"] == "cache"
+    assert len(calls) == 1
+
+
+def test_partial_success_is_not_cached(monkeypatch):
+    """Unparseable model output falls back and is retried next time"""
+    import app as app_module
+    calls = []
+    monkeypatch.setattr(openai.ChatCompletion, 'create', fake_completion("not json", calls))
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    monkeypatch.setattr(app_module.Config, 'CHAT_RULES_ENABLED', False)
+    app_module.chat_cache.clear()
+    client = app_module.app.test_client()
+
+    for _ in range(2):
+        data = client.post('/chat', json={"message": "some rice somewhere"}).get_json()
+        assert data["status"] == "partial_success"
+    assert len(calls) == 2
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script for the local rule-based /chat extractor
+"""
+
+import json
+from types import SimpleNamespace
+
+import openai
+
+from extraction import extract_with_rules
+from gazetteer import Gazetteer
+
+EXAMPLES = [
+    ("I have 20 rotis in Delhi expiring in 4 hours",
+     {"food": "rotis", "quantity": "20", "expiry": "4 hours", "location": "Delhi"}),
+    ("5kg rice available at Mumbai, expires in 2 hrs",
+     {"food": "rice", "quantity": "5 kg", "expiry": "2 hours", "location": "Mumbai"}),
+    ("Donating 10 packets of veg biryani from Bangalore, good for 6 hours",
+     {"food": "veg biryani", "quantity": "10 packets", "expiry": "6 hours", "location": "Bangalore"}),
+    ("50 plates of dal chawal near Connaught Place expiring tonight",
+     {"food": "dal chawal", "quantity": "50 plates", "expiry": "tonight", "location": "Connaught Place"}),
+    ("Have 2.5 kg paneer at Andheri West Mumbai expires in 30 mins",
+     {"food": "paneer", "quantity": "2.5 kg", "expiry": "30 minutes", "location": "Andheri West Mumbai"}),
+]
+
+
+def test_common_shapes_are_extracted_confidently():
+    """The usual message shapes are parsed fully with high confidence"""
+    for message, expected in EXAMPLES:
+        fields, confidence = extract_with_rules(message)
+        assert fields == expected, message
+        assert confidence == 1.0
+
+
+def test_ambiguous_messages_have_low_confidence():
+    """Incomplete or ambiguous messages are left for the LLM"""
+    _, confidence = extract_with_rules("hello can someone help")
+    assert confidence == 0
+
+    fields, confidence = extract_with_rules("We have some leftover bread in Kolkata")
+    assert fields["food"] == "bread" and fields["location"] == "Kolkata"
+    assert confidence < 0.75
+
+    # Head counts are not foods
+    fields, confidence = extract_with_rules("Leftover biryani for 50 people in Pune, expires tonight")
+    assert fields == {"food": "biryani", "quantity": "50 people", "expiry": "tonight", "location": "Pune"}
+    fields, confidence = extract_with_rules("20 people need food in Delhi")
+    assert fields["food"] == "unknown" and fields["quantity"] == "20 people"
+    assert confidence < 0.75
+
+    # Not a known food word
+    fields, confidence = extract_with_rules("I have 30 widgets in Delhi expiring in 4 hours")
+    assert fields["food"] == "widgets" and confidence < 0.75
+
+    # Two quantities: only one is explained by the patterns
+    _, confidence = extract_with_rules("I have 20 rotis and 5 kg dal in Delhi expiring in 4 hours")
+    assert confidence < 0.75
+
+
+def test_time_phrases_and_negations():
+    """Time phrases are not places, unknown places and negated messages go to the LLM"""
+    gazetteer = Gazetteer()
+    gazetteer.add("Delhi", 28.61, 77.21)
+
+    fields, _ = extract_with_rules("20 rotis in the morning in Delhi expiring in 4 hours", gazetteer)
+    assert fields["location"] == "Delhi"
+    fields, _ = extract_with_rules("5 kg rice at night in Delhi, expires in 2 hrs")
+    assert fields["location"] == "Delhi"
+
+    fields, confidence = extract_with_rules("20 rotis in Narnia expiring in 4 hours", gazetteer)
+    assert fields["location"] == "Narnia" and confidence < 0.75
+    assert extract_with_rules("20 rotis in Narnia expiring in 4 hours")[1] == 1.0
+    assert gazetteer.unresolved() == ([], 0)
+
+    for message in ("I do not have any rice", "I don't have 5kg rice in Delhi expiring in 4 hours"):
+        assert extract_with_rules(message, gazetteer)[1] == 0
+
+
+def test_chat_endpoint_reports_path(monkeypatch):
+    """Confident messages skip OpenAI; others go to the model"""
+    import app as app_module
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        content = json.dumps({"food": "bread", "quantity": "unknown", "expiry": "unknown", "location": "Kolkata"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(openai.ChatCompletion, 'create', create)
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    app_module.chat_cache.clear()
+    client = app_module.app.test_client()
+
+    data = client.post('/chat', json={"message": "I have 20 rotis in Delhi expiring in 4 hours"}).get_json()
+    assert data["extraction_path"] == "rules" and data["food"] == "rotis"
+    assert calls == []
+
+    data = client.post('/chat', json={"message": "We have some leftover bread in Kolkata"}).get_json()
+    assert data["extraction_path"] == "llm"
+    assert len(calls) == 1
+
+    stats = client.get('/chat/stats').get_json()
+    assert stats["extraction_paths"]["rules"] >= 1 and stats["extraction_paths"]["llm"] >= 1
+
+
+def test_rules_work_without_openai_key(monkeypatch):
+    """The fast path answers even when OpenAI is not configured"""
+    import app as app_module
+    monkeypatch.setattr(openai, 'api_key', None)
+    client = app_module.app.test_client()
+
+    response = client.post('/chat', json={"message": "5kg rice available at Mumbai, expires in 2 hrs"})
+    assert response.status_code == 200
+    response = client.post('/chat', json={"message": "hello can someone help"})
+    assert response.status_code == 500
+
+
+if __name__ == "__main__":
+    for message, _ in EXAMPLES:
+        print(message, "->", extract_with_rules(message))
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for the columnar history store (columnar.py) and /history
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from columnar import ColumnarStore, epoch_seconds
+from matching import normalize_label, parse_quantity
+
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Chennai"]
+FOODS = ["Rice", "Bread", "Vegetables", "Cooked Meals"]
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def donations(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "foodType": rng.choice(FOODS),
+        "quantity": f"{rng.randint(1, 40)}kg",
+        "expiryTime": rng.choice([4, 12, 24]),
+        "location": rng.choice(CITIES).lower(),
+        "userId": f"user{rng.randint(1, 50)}",
+        "timestamp": (START + timedelta(minutes=index)).isoformat(),
+        "lat": 12 + rng.random() * 16,
+        "lng": 72 + rng.random() * 8,
+    } for index in range(count)]
+
+
+def test_dictionary_encoding_and_growth():
+    """Repeated strings share one code; columns grow past the initial capacity"""
+    store = ColumnarStore(capacity=8)
+    records = donations(1000)
+    assert store.extend('donation', records) == 0
+    store.append('ngo_request', {"ngoName": "Hope Foundation", "foodNeeded": "Rice, Bread",
+                                 "location": "Delhi", "lat": 28.61, "lng": 77.2})
+    assert len(store) == 1001
+
+    stats = store.memory_stats()
+    assert stats["distinct"]["location"] == len(CITIES)
+    assert stats["distinct"]["user"] <= 51
+    assert stats["bytes_per_record"] < 40
+    assert stats["column_bytes"] == 1001 * stats["bytes_per_record"]
+
+    newest = store.records(limit=2)
+    assert newest[0]["kind"] == 'ngo_request' and newest[0]["user"] == "Hope Foundation"
+    assert newest[1]["food"] == normalize_label(records[-1]["foodType"])
+    assert newest[1]["expires_at"] is not None
+
+
+def test_aggregates_match_per_record_loop():
+    """Column-wise group totals equal a plain Python aggregation"""
+    store = ColumnarStore()
+    records = donations(5000)
+    store.extend('donation', records)
+
+    expected = {}
+    for record in records:
+        if normalize_label(record["foodType"]) != "Rice":
+            continue
+        entry = expected.setdefault(normalize_label(record["location"]), [0, 0.0])
+        entry[0] += 1
+        entry[1] += parse_quantity(record["quantity"])
+
+    groups = store.aggregate('location', store.mask(kind='donation', food='rice'))
+    assert {label: (group["count"], group["quantity_kg"]) for label, group in groups.items()} == {
+        label: (count, round(quantity, 2)) for label, (count, quantity) in expected.items()
+    }
+    assert store.totals(store.mask(location='Atlantis')) == {"count": 0, "quantity_kg": 0.0}
+
+
+def test_filters():
+    """Compatibility, time windows, expiry and radius filters"""
+    store = ColumnarStore()
+    records = donations(2000)
+    store.extend('donation', records)
+
+    compatible = store.mask(compatible_with="Cooked meals")
+    assert compatible.sum() == sum(record["foodType"] == "Cooked Meals" for record in records)
+
+    since = START + timedelta(minutes=100)
+    window = store.mask(since=since.isoformat(), until=(since + timedelta(minutes=50)).isoformat())
+    assert window.sum() == 50
+
+    cutoff = epoch_seconds(START) + 5 * 3600
+    soon = store.mask(expires_before=cutoff)
+    assert soon.sum() == sum(epoch_seconds(record["timestamp"]) + record["expiryTime"] * 3600 < cutoff
+                             for record in records)
+
+    near = store.mask(near=(20.0, 76.0), radius_km=200)
+    assert 0 < near.sum() < len(records)
+    assert all(abs(row["lat"] - 20.0) < 2 for row in store.records(near, limit=50))
+
+    with pytest.raises(ValueError):
+        store.mask(since="not a date")
+    with pytest.raises(ValueError):
+        store.aggregate('colour')
+
+
+def test_history_endpoint():
+    """/history reflects ingested records and validates its parameters"""
+    import app as app_module
+    client = app_module.app.test_client()
+    client.post('/donations', json={"records": [
+        {"foodType": "Mangoes", "quantity": "12kg", "location": "Nagpur", "userId": "farm1"},
+        {"foodType": "Mangoes", "quantity": "8kg", "location": "Nagpur", "userId": "farm2"},
+    ]})
+
+    data = client.get('/history?kind=donation&food=Mangoes&group_by=user&limit=5').get_json()
+    assert data["status"] == "success"
+    assert data["total"] == {"count": 2, "quantity_kg": 20.0}
+    assert data["groups"] == {"farm1": {"count": 1, "quantity_kg": 12.0},
+                              "farm2": {"count": 1, "quantity_kg": 8.0}}
+    assert len(data["records"]) == 2
+
+    assert client.get('/history?group_by=colour').status_code == 400
+    assert client.get('/history?lat=20').status_code == 400
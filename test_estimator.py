@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline distance/ETA estimator
+"""
+
+import numpy as np
+
+from estimator import DistanceEstimator, format_distance, format_duration, haversine_matrix
+from matching import haversine_km
+
+
+def test_haversine_matrix_matches_scalar():
+    """Vectorized distances agree with the scalar haversine"""
+    origins = [(28.6139, 77.2090), (19.0760, 72.8777)]
+    destinations = [(12.9716, 77.5946), (28.7041, 77.1025), (13.0827, 80.2707)]
+    matrix = haversine_matrix(origins, destinations)
+    assert matrix.shape == (2, 3)
+    for i, o in enumerate(origins):
+        for j, d in enumerate(destinations):
+            assert abs(matrix[i, j] - haversine_km(*o, *d)) < 1e-6
+
+
+def test_estimates_and_formatting():
+    """Road factor and speed model produce Distance Matrix style text"""
+    estimator = DistanceEstimator(road_factor=1.5, speed_kmh=30, overhead_minutes=0)
+    km, minutes = estimator.estimate_matrix([(0, 0)], [(0, 0.1)])
+    assert np.isclose(km[0, 0], haversine_km(0, 0, 0, 0.1) * 1.5)
+    assert np.isclose(minutes[0, 0], km[0, 0] / 30 * 60)
+
+    element = estimator.element_matrix([(0, 0)], [(0, 0.1)])[0][0]
+    assert element["estimated"] is True
+    assert element["distance"] == "16.7 km"
+
+    assert format_distance(0.85) == "850 m"
+    assert format_duration(1) == "1 min"
+    assert format_duration(15.4) == "15 mins"
+    assert format_duration(65) == "1 hour 5 mins"
+    assert format_duration(120) == "2 hours"
+
+
+def test_top_candidates():
+    """The cheapest candidates come back in ETA order"""
+    estimator = DistanceEstimator()
+    destinations = [(0, 0.5), (0, 0.1), (0, 0.3), (0, 0.2)]
+    assert estimator.top_candidates((0, 0), destinations, 2) == [1, 3]
+    assert estimator.top_candidates((0, 0), destinations, 10) == [1, 3, 2, 0]
+
+
+def test_route_falls_back_to_estimate(monkeypatch):
+    """/route reports an estimated distance when Maps is unavailable"""
+    import app as app_module
+    monkeypatch.delenv('GOOGLE_MAPS_API_KEY', raising=False)
+    client = app_module.app.test_client()
+
+    response = client.post('/route', json={
+        "donor_lat": 28.6139, "donor_lng": 77.2090, "ngo_lat": 28.7041, "ngo_lng": 77.1025
+    })
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data["distance_source"] == "estimate"
+    assert data["distance"].endswith("km")
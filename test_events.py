@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Test script for the /match/stream server-sent events (events.py)
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+import asgi
+from events import Broadcaster, MatchStream, counter_changes
+from matching import MatchingEngine
+from snapshot import StateGate
+
+
+def parse_frame(frame):
+    """{"id", "event", "data"} for one SSE frame"""
+    fields = dict(line.split(': ', 1) for line in frame.decode().strip().split('\n'))
+    fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+def populated_engine():
+    engine = MatchingEngine()
+    engine.add_ngo_request({"ngoName": "Rice Bank", "foodNeeded": "Rice",
+                            "location": "Delhi", "lat": 28.70, "lng": 77.10})
+    donation = engine.add_donation({"foodType": "Rice", "quantity": "50 kg", "location": "Delhi",
+                                    "donor": "Restaurant ABC", "lat": 28.61, "lng": 77.20})
+    return engine, donation
+
+
+def test_counter_changes_only_lists_what_moved():
+    """Scalars that changed, changed breakdown keys, 0 for removed keys"""
+    previous = {"total_donors": 2, "total_ngos": 1, "donations_by_location": {"Delhi": 5.0, "Pune": 3.0},
+                "recent_matches": [], "version": 1}
+    current = {"total_donors": 3, "total_ngos": 1, "donations_by_location": {"Delhi": 8.0},
+               "recent_matches": [{"id": "x"}], "version": 2}
+    assert counter_changes(previous, current) == {
+        "total_donors": 3, "donations_by_location": {"Delhi": 8.0, "Pune": 0}
+    }
+
+
+def test_broadcaster_replays_missed_events():
+    """Last-Event-ID resumes from history; unknown or expired ids need a snapshot"""
+    broadcaster = Broadcaster('abc', history=2)
+    first = broadcaster.publish('delta', '{"n":1}')
+    assert parse_frame(first) == {"id": "abc.1", "event": "delta", "data": {"n": 1}}
+    broadcaster.publish('delta', '{"n":2}')
+    broadcaster.publish('delta', '{"n":3}')
+
+    frames, last_id = broadcaster.frames_after('abc.1')
+    assert [parse_frame(frame)['data']['n'] for frame in frames] == [2, 3]
+    assert last_id == 'abc.3'
+    assert broadcaster.frames_after('abc.3') == ([], 'abc.3')
+    assert broadcaster.frames_after('abc.0')[0] is None
+    assert broadcaster.frames_after('other.2')[0] is None
+
+
+def test_engine_status_updates():
+    """Status changes are validated and logged for the stream"""
+    engine, donation = populated_engine()
+    match = engine.match_donation(donation)
+
+    with pytest.raises(ValueError):
+        engine.update_match_status(match['id'], 'Lost')
+    with pytest.raises(KeyError):
+        engine.update_match_status('missing', 'Delivered')
+
+    updated = engine.update_match_status(match['id'], 'In Transit')
+    assert updated['status'] == 'In Transit'
+    changes, seq = engine.status_changes_since(0)
+    assert seq == 1 and changes[0]['id'] == match['id'] and changes[0]['status'] == 'In Transit'
+    assert engine.snapshot()[1]['recent_matches'][0]['status'] == 'In Transit'
+    assert engine.status_changes_since(seq) == ([], 1)
+
+
+def test_delta_contains_matches_status_and_counters():
+    """One delta per burst with new matches, status changes and changed counters"""
+    engine, donation = populated_engine()
+    stream = MatchStream(engine, coalesce_seconds=60)
+    stream.start()
+
+    match = engine.match_donation(donation)
+    engine.update_match_status(match['id'], 'Delivered')
+    delta = parse_frame(stream.publish_delta())
+
+    assert delta['event'] == 'delta'
+    data = delta['data']
+    assert [m['id'] for m in data['matches']] == [match['id']]
+    assert data['status_changes'][0]['status'] == 'Delivered'
+    assert data['counters']['total_food_quantity'] == 0
+    assert data['counters']['donations_by_location'] == {"Delhi": 0}
+    assert 'total_ngos' not in data['counters']
+
+    assert stream.publish_delta() is None
+
+
+def test_snapshot_matches_its_event_id():
+    """A snapshot holds exactly the events up to its id; later changes arrive as the next delta"""
+    engine, donation = populated_engine()
+    gate = StateGate()
+    stream = MatchStream(engine, coalesce_seconds=60, gate=gate)
+    stream.start()
+    before, before_id = stream.snapshot_frame()
+
+    match = engine.match_donation(donation)
+    frame, event_id = stream.snapshot_frame()
+    assert (frame, event_id) == (before, before_id)
+    assert parse_frame(frame)['data']['recent_matches'] == []
+
+    delta = parse_frame(stream.publish_delta())
+    assert delta['id'] != before_id and [m['id'] for m in delta['data']['matches']] == [match['id']]
+    frame, event_id = stream.snapshot_frame()
+    assert event_id == delta['id']
+    assert [m['id'] for m in parse_frame(frame)['data']['recent_matches']] == [match['id']]
+
+    # A delta is not read while a handler is half-way through a change
+    published = []
+    with gate.shared():
+        worker = threading.Thread(target=lambda: published.append(stream.publish_delta()))
+        worker.start()
+        engine.update_match_status(match['id'], 'Delivered')
+        worker.join(0.2)
+        assert worker.is_alive()
+    worker.join()
+    assert parse_frame(published[0])['data']['status_changes'][0]['status'] == 'Delivered'
+
+
+def test_flask_stream_sends_snapshot_then_deltas():
+    """GET /match/stream opens with a snapshot and follows with deltas"""
+    import app as app_module
+    client = app_module.app.test_client()
+    donation = client.post('/donations', json={"foodType": "Rice", "quantity": "4kg",
+                                                "location": "Jaipur", "lat": 26.91, "lng": 75.78}).get_json()
+
+    response = client.get('/match/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    frames = iter(response.response)
+    assert next(frames).startswith(b'retry:')
+    snapshot = parse_frame(next(frames))
+    assert snapshot['event'] == 'snapshot' and snapshot['data']['status'] == 'success'
+
+    client.post('/ngo-requests', json={"ngoName": "Jaipur Kitchen", "foodNeeded": "Rice",
+                                       "location": "Jaipur", "lat": 26.92, "lng": 75.79})
+    match = client.post('/match', json={"donation_id": donation['id']}).get_json()['match']
+    status = client.post(f"/match/{match['id']}/status", json={"status": "In Transit"})
+    assert status.status_code == 200 and status.get_json()['match']['status'] == 'In Transit'
+
+    seen_match, seen_status = False, False
+    while not (seen_match and seen_status):
+        frame = next(frames)
+        if frame.startswith(b':'):
+            continue
+        data = parse_frame(frame)['data']
+        seen_match = seen_match or match['id'] in [m['id'] for m in data['matches']]
+        seen_status = seen_status or any(c['id'] == match['id'] for c in data['status_changes'])
+    response.close()
+
+
+def test_match_status_endpoint_validation():
+    """Unknown statuses are a 400, unknown matches a 404"""
+    import app as app_module
+    client = app_module.app.test_client()
+    assert client.post('/match/nope/status', json={}).status_code == 400
+    assert client.post('/match/nope/status', json={"status": "Lost"}).status_code == 400
+    assert client.post('/match/nope/status', json={"status": "Delivered"}).status_code == 404
+
+
+def test_asgi_stream_shares_one_frame_across_many_subscribers(monkeypatch):
+    """Thousands of idle ASGI subscribers all receive the same encoded delta"""
+    engine, donation = populated_engine()
+    stream = MatchStream(engine, coalesce_seconds=0.01, heartbeat_seconds=60)
+    monkeypatch.setattr(asgi.api, 'match_stream', stream)
+    subscribers = 2000
+
+    async def scenario():
+        disconnect = asyncio.Event()
+        received = [[] for _ in range(subscribers)]
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        def sender(frames):
+            async def send(message):
+                if message['type'] == 'http.response.body':
+                    frames.append(message['body'])
+            return send
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/match/stream', 'query_string': b'', 'headers': []}
+        tasks = [asyncio.ensure_future(asgi.application(scope, receive, sender(frames))) for frames in received]
+        while not all(len(frames) >= 2 for frames in received):
+            await asyncio.sleep(0.01)
+        assert stream.broadcaster.subscribers == subscribers
+
+        engine.match_donation(donation)
+        for _ in range(500):
+            if all(len(frames) >= 3 for frames in received):
+                break
+            await asyncio.sleep(0.01)
+        deltas = [frames[2] for frames in received]
+        assert all(frame is deltas[0] for frame in deltas)
+        assert parse_frame(deltas[0])['event'] == 'delta'
+
+        disconnect.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), 10)
+
+    asyncio.run(scenario())
+    assert stream.broadcaster.subscribers == 0
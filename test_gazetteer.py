@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline gazetteer that geocodes /chat locations
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import openai
+
+from config import Config
+from gazetteer import Gazetteer, PrefixTrie, normalize_place
+
+
+def test_prefix_trie():
+    """Exact lookups and prefix completion"""
+    trie = PrefixTrie()
+    for key in ["delhi", "dehradun", "dwarka"]:
+        trie.insert(key, key.upper())
+    assert trie.get("delhi") == "DELHI"
+    assert trie.get("del") is None
+    assert sorted(key for key, _ in trie.complete("de")) == ["dehradun", "delhi"]
+    assert trie.complete("x") == []
+    assert len(trie) == 3
+
+
+def test_resolve_variants():
+    """Aliases, localities, prefixes and typos resolve to the right place"""
+    gazetteer = Gazetteer(Config.GAZETTEER_PATH)
+    assert normalize_place("  New-Delhi, India ") == "new delhi"
+
+    assert gazetteer.resolve("Delhi")["match"] == "exact"
+    assert gazetteer.resolve("Bombay")["name"] == "Mumbai"
+    assert gazetteer.resolve("Lajpat Nagar, New Delhi")["name"] == "Lajpat Nagar"
+    assert gazetteer.resolve("T. Nagar")["name"] == "T Nagar"
+
+    prefix = gazetteer.resolve("Hydera")
+    assert (prefix["name"], prefix["match"]) == ("Hyderabad", "prefix")
+
+    fuzzy = gazetteer.resolve("Luckhnow")
+    assert (fuzzy["name"], fuzzy["match"]) == ("Lucknow", "fuzzy")
+
+    assert gazetteer.resolve("unknown") is None
+    assert gazetteer.resolve("Atlantis") is None
+    assert gazetteer.resolve("atlantis") is None
+    names, distinct = gazetteer.unresolved()
+    assert names == [("atlantis", 2)] and distinct == 1
+
+
+def test_resolve_is_fast_when_warm():
+    """Repeated lookups are served from the memo in microseconds"""
+    gazetteer = Gazetteer(Config.GAZETTEER_PATH)
+    gazetteer.resolve("Koramangala, Bangalore")
+    start = time.perf_counter()
+    for _ in range(10000):
+        gazetteer.resolve("Koramangala, Bangalore")
+    per_call_us = (time.perf_counter() - start) / 10000 * 1e6
+    print(f"Warm gazetteer lookup: {per_call_us:.1f} us")
+    assert per_call_us < 50
+
+
+def test_chat_results_get_coordinates(monkeypatch):
+    """/chat adds coordinates for locations the gazetteer knows"""
+    import app as app_module
+    client = app_module.app.test_client()
+    # Places the gazetteer doesn't know are left to the model
+    content = json.dumps({"food": "rice", "quantity": "5 kg", "expiry": "3 hours", "location": "Zzyzx"})
+    monkeypatch.setattr(openai.ChatCompletion, 'create', lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))]))
+    monkeypatch.setattr(openai, 'api_key', 'test')
+
+    data = client.post('/chat', json={"message": "I have 20 rotis in Delhi expiring in 4 hours"}).get_json()
+    assert data["coordinates"]["name"] == "Delhi"
+    assert data["coordinates"]["lat"] == 28.6139
+
+    data = client.post('/chat', json={"message": "I have 5 kg rice in Zzyzx expiring in 3 hours"}).get_json()
+    assert data["extraction_path"] == "llm"
+    assert data["location"] == "Zzyzx" and data["coordinates"] is None
+    report = client.get('/geocode/unresolved').get_json()
+    assert {"location": "zzyzx", "count": 1} in report["unresolved"]
+
+    assert client.get('/geocode?q=Gurgaon').get_json()["place"]["name"] == "Gurugram"
+    assert client.get('/geocode?q=Zzyzx').status_code == 404
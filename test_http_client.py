@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled Maps HTTP client and its circuit breaker
+"""
+
+import time
+
+import requests
+
+import maps_client
+from http_client import CircuitBreaker, CircuitOpenError, HTTPClient, UpstreamError
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self._body = body if body is not None else {"status": "OK"}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    """Replays a scripted list of responses/exceptions and records timeouts"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(timeout)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_client(script, **kwargs):
+    kwargs.setdefault('backoff_base', 0)
+    kwargs.setdefault('backoff_max', 0)
+    return HTTPClient('test', session=FakeSession(script), **kwargs)
+
+
+def test_retries_then_succeeds_with_deadlines():
+    """Transient failures are retried and every call carries a timeout"""
+    client = make_client([requests.ConnectionError(), FakeResponse(503), FakeResponse(200, {"ok": 1})],
+                         connect_timeout=1, read_timeout=2, max_retries=2)
+    assert client.get_json('http://maps') == {"ok": 1}
+    assert client.session.calls == [(1, 2)] * 3
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retries_are_bounded():
+    """After max_retries the call fails with UpstreamError"""
+    client = make_client([requests.Timeout()] * 5, max_retries=1)
+    try:
+        client.get_json('http://maps')
+        assert False, "expected UpstreamError"
+    except UpstreamError:
+        pass
+    assert len(client.session.calls) == 2
+
+
+def test_breaker_opens_and_fails_fast():
+    """An open breaker rejects calls without touching the network"""
+    client = make_client([requests.ConnectionError()] * 2 + [FakeResponse(200, {"ok": 1})],
+                         max_retries=0, failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        try:
+            client.get_json('http://maps')
+        except UpstreamError:
+            pass
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    try:
+        client.get_json('http://maps')
+        assert False, "expected CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert len(client.session.calls) == 2
+
+    time.sleep(0.06)
+    # Half-open trial succeeds and closes the circuit
+    assert client.get_json('http://maps') == {"ok": 1}
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_gives_unknown_distances(monkeypatch):
+    """get_distance_matrix degrades to Unknown instead of waiting on Maps"""
+    client = make_client([], failure_threshold=1)
+    client.breaker.record_failure()
+    monkeypatch.setattr(maps_client, 'http_client', client)
+
+    matrix, requests_made = maps_client.get_distance_matrix([(1, 1)], [(2, 2), (3, 3)], api_key='test')
+
+    assert matrix[0][1]["distance"] == "Unknown"
+    assert client.session.calls == []
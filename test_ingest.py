@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test script for bulk ingestion and the append-only ingest log
+"""
+
+import multiprocessing
+import threading
+import time
+
+from ingest import IngestLog
+from matching import MatchingEngine
+
+
+def test_log_batches_and_replays(tmp_path):
+    """Concurrent appends share fsync'd batches and replay in sequence order"""
+    path = str(tmp_path / 'ingest.jsonl')
+    log = IngestLog(path, batch_size=1000, flush_interval=0.02)
+
+    def submit(worker):
+        for i in range(50):
+            log.append([{"type": "donation", "record": {"id": f"{worker}-{i}"}}])
+
+    threads = [threading.Thread(target=submit, args=(w,)) for w in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.append([{"type": "donation", "record": {"id": f"bulk-{i}"}} for i in range(500)])
+
+    stats = log.stats()
+    assert stats["flushed_seq"] == 900 and stats["buffered"] == 0
+    assert stats["batches"] < 900
+    log.close()
+
+    events = list(log.replay())
+    assert [event["seq"] for event in events] == list(range(1, 901))
+    assert [event["seq"] for event in log.replay(after_seq=895)] == [896, 897, 898, 899, 900]
+
+    # A torn final line is skipped and sequence numbers carry on after reopening
+    with open(path, 'ab') as f:
+        f.write(b'{"seq": 901, "type": "dona')
+    reopened = IngestLog(path)
+    assert reopened.append([{"type": "ngo_request", "record": {"id": "n"}}]) == 901
+    reopened.close()
+
+
+def test_bulk_endpoint_validates_and_logs(monkeypatch, tmp_path):
+    """Bulk uploads accept valid records, report rejected ones and land in the log"""
+    import app as app_module
+    log = IngestLog(str(tmp_path / 'ingest.jsonl'))
+    monkeypatch.setattr(app_module, 'ingest_log', log)
+    client = app_module.app.test_client()
+
+    response = client.post('/donations', json={"records": [
+        {"foodType": "Rice", "quantity": "5kg", "expiryTime": 24, "location": "Delhi",
+         "lat": 28.61, "lng": 77.2},
+        {"foodType": "", "quantity": "2kg", "location": "Delhi"},
+        {"foodType": "Bread", "quantity": "10 loaves", "expiryTime": 9000, "location": "Pune"},
+        {"foodType": "Dal", "quantity": "3kg", "location": "Mumbai", "lat": 95, "lng": 72.8}
+    ]})
+    body = response.get_json()
+    assert response.status_code == 201
+    assert body["status"] == "partial_success" and body["accepted"] == 1
+    assert [entry["index"] for entry in body["rejected"]] == [1, 2, 3]
+    assert body["rejected"][1]["errors"] == ["Expiry time must be between 1 and 8760 hours"]
+
+    single = client.post('/ngo-requests', json={"ngoName": "Hope", "foodNeeded": "Rice",
+                                                 "location": "Delhi", "lat": 28.6, "lng": 77.2})
+    assert single.status_code == 201 and single.get_json()["status"] == "success"
+
+    bad = client.post('/ngo-requests', json={"ngoName": "Hope", "location": "Delhi"})
+    assert bad.status_code == 400 and "foodNeeded is required" in bad.get_json()["error"]
+
+    match = client.post('/match', json={"donation_id": body["ids"][0]})
+    assert match.status_code == 200
+    log.close()
+
+    # A fresh engine rebuilt from the log ends up in the same state
+    engine = MatchingEngine()
+    for event in log.replay():
+        if event["type"] == "donation":
+            engine.add_donation(event["record"])
+        elif event["type"] == "ngo_request":
+            engine.add_ngo_request(event["record"])
+        else:
+            engine.restore_match(event["match"])
+    assert [event["type"] for event in log.replay()] == ["donation", "ngo_request", "match"]
+    assert engine.get_donation(body["ids"][0]) is None
+    assert engine.summary()["recent_matches"][0]["ngo"] == "Hope"
+
+
+
+def test_forked_writers(tmp_path):
+    """A forked process continues the log's sequence; a second live writer is refused"""
+    context = multiprocessing.get_context('fork')
+    log = IngestLog(str(tmp_path / 'ingest.jsonl'))
+    release = context.Event()
+
+    def append(count, results, hold=False):
+        try:
+            results.put(log.append([{"type": "donation", "record": {"id": str(i)}} for i in range(count)]))
+        except RuntimeError as e:
+            results.put(str(e))
+        if hold:
+            release.wait(10)
+        log.close()
+
+    results = context.Queue()
+    first = context.Process(target=append, args=(2, results))
+    first.start()
+    first.join()
+    holder = context.Process(target=append, args=(1, results, True))
+    holder.start()
+    assert results.get(timeout=10) == 2
+    assert results.get(timeout=10) == 3
+
+    blocked = context.Process(target=append, args=(1, results))
+    blocked.start()
+    blocked.join()
+    assert "in use by process" in results.get(timeout=10)
+    release.set()
+    holder.join()
+    assert [event["seq"] for event in log.replay()] == [1, 2, 3]
+
+
+def test_slow_sync_is_applied_and_reported(monkeypatch, tmp_path):
+    """A sync timeout still applies the record, which is then written and replayed"""
+    import functools
+    import os
+    import app as app_module
+    log = IngestLog(str(tmp_path / 'ingest.jsonl'))
+    monkeypatch.setattr(app_module, 'ingest_log', log)
+    monkeypatch.setattr(log, 'append', functools.partial(log.append, timeout=0.1))
+    released = threading.Event()
+    fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: released.wait(5) and fsync(fd))
+
+    response = app_module.app.test_client().post('/donations', json={
+        "foodType": "Rice", "quantity": "5kg", "location": "Delhi", "lat": 28.61, "lng": 77.2})
+    body = response.get_json()
+    assert response.status_code == 201 and body["durable"] is False
+    assert app_module.matching_engine.get_donation(body["id"]) is not None
+
+    released.set()
+    log.close()
+    assert [event["record"]["id"] for event in log.replay()] == [body["id"]]
+
+
+def test_respawned_worker_catches_up(monkeypatch, tmp_path):
+    """A worker forked from the import-time state applies what an earlier worker logged"""
+    import os
+    import signal
+    import app as app_module
+    from columnar import ColumnarStore
+    context = multiprocessing.get_context('fork')
+    log = IngestLog(str(tmp_path / 'ingest.jsonl'))
+    log.catch_up = app_module.catch_up_state
+    monkeypatch.setattr(app_module, 'ingest_log', log)
+    monkeypatch.setattr(app_module, 'matching_engine', MatchingEngine())
+    monkeypatch.setattr(app_module, 'history_store', ColumnarStore())
+    monkeypatch.setattr(app_module, 'snapshotter', None)
+    monkeypatch.setattr(app_module, 'startup_stats', {"replayed_events": 0})
+    # One pipe per worker: killing a worker that holds a Queue's lock would block the next one
+    first_end, first_conn = context.Pipe()
+    second_end, second_conn = context.Pipe()
+
+    def first_worker():
+        response = app_module.app.test_client().post('/donations', json={
+            "foodType": "Rice", "quantity": "5kg", "location": "Delhi", "lat": 28.61, "lng": 77.2})
+        first_conn.send(response.get_json()["id"])
+        time.sleep(30)  # killed before it exits cleanly
+
+    def second_worker():
+        app_module.app.test_client().get('/health')
+        second_conn.send((app_module.matching_engine.summary()["open_donations"], len(app_module.history_store),
+                          app_module.startup_stats["caught_up_events"], log.next_seq))
+
+    worker = context.Process(target=first_worker)
+    worker.start()
+    assert first_end.poll(30)
+    donation_id = first_end.recv()
+    os.kill(worker.pid, signal.SIGKILL)
+    worker.join()
+
+    worker = context.Process(target=second_worker)
+    worker.start()
+    assert second_end.poll(30)
+    assert second_end.recv() == (1, 1, 1, 2)
+    worker.join()
+    assert [event["record"]["id"] for event in log.replay()] == [donation_id]
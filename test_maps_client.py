@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the batched Distance Matrix client and /route/batch
+"""
+
+import maps_client
+from http_client import CircuitOpenError
+from maps_client import get_distance_matrix, plan_matrix_requests
+
+
+def fake_block(calls):
+    """Stand-in for one Distance Matrix request that records its shape"""
+    def fetch(origins, destinations, api_key):
+        calls.append((len(origins), len(destinations)))
+        return [[{"distance": f"{o[0]}->{d[0]}", "duration": "1 min"} for d in destinations]
+                for o in origins]
+    return fetch
+
+
+def test_plan_covers_matrix_within_limits():
+    """Blocks respect the API limits and cover every pair exactly once"""
+    for n, m in [(1, 1), (10, 10), (30, 30), (3, 80), (100, 2), (37, 41)]:
+        blocks = plan_matrix_requests(n, m)
+        seen = set()
+        for rows, cols in blocks:
+            assert len(rows) <= maps_client.MAX_ORIGINS_PER_REQUEST
+            assert len(cols) <= maps_client.MAX_DESTINATIONS_PER_REQUEST
+            assert len(rows) * len(cols) <= maps_client.MAX_ELEMENTS_PER_REQUEST
+            for i in rows:
+                for j in cols:
+                    assert (i, j) not in seen
+                    seen.add((i, j))
+        assert len(seen) == n * m
+    assert len(plan_matrix_requests(10, 10)) == 1
+    assert len(plan_matrix_requests(20, 20)) == 4
+    assert plan_matrix_requests(0, 5) == []
+
+
+def test_matrix_is_reassembled_in_order(monkeypatch):
+    """Results from split requests land in the right cells"""
+    calls = []
+    monkeypatch.setattr(maps_client, 'fetch_matrix_block', fake_block(calls))
+    origins = [(i, 0) for i in range(12)]
+    destinations = [(100 + j, 0) for j in range(15)]
+
+    matrix, requests_made = get_distance_matrix(origins, destinations, api_key='test')
+
+    assert requests_made == len(calls) == 2
+    assert matrix[11][14]["distance"] == "11->114"
+    assert matrix[0][0]["distance"] == "0->100"
+
+
+def test_open_circuit_is_not_counted_as_a_request(monkeypatch):
+    """Blocks skipped by an open circuit breaker don't count as upstream requests"""
+    calls = []
+    fetch = fake_block(calls)
+
+    def fetch_until_open(origins, destinations, api_key):
+        if calls:
+            raise CircuitOpenError("maps upstream is failing")
+        return fetch(origins, destinations, api_key)
+
+    monkeypatch.setattr(maps_client, 'fetch_matrix_block', fetch_until_open)
+    origins = [(i, 0) for i in range(30)]
+    destinations = [(100 + j, 0) for j in range(30)]
+
+    matrix, requests_made = get_distance_matrix(origins, destinations, api_key='test')
+    assert requests_made == len(calls) == 1
+    assert matrix[29][29] == {"distance": "Unknown", "duration": "Unknown"}
+
+
+def test_matrix_without_api_key(monkeypatch):
+    """No API key means Unknown everywhere and no upstream calls"""
+    monkeypatch.delenv('GOOGLE_MAPS_API_KEY', raising=False)
+    matrix, requests_made = get_distance_matrix([(1, 2)], [(3, 4), (5, 6)])
+    assert requests_made == 0
+    assert matrix[0][1] == {"distance": "Unknown", "duration": "Unknown"}
+
+
+def test_batch_route_endpoint(monkeypatch):
+    """POST /route/batch returns the full donors x NGOs matrix"""
+    import app as app_module
+    calls = []
+    monkeypatch.setattr(maps_client, 'fetch_matrix_block', fake_block(calls))
+    monkeypatch.setenv('GOOGLE_MAPS_API_KEY', 'test')
+    client = app_module.app.test_client()
+
+    response = client.post('/route/batch', json={
+        "donors": [{"lat": 28.61, "lng": 77.20}, {"lat": 28.70, "lng": 77.10}],
+        "ngos": [{"lat": 28.50, "lng": 77.30}, {"lat": 28.65, "lng": 77.25}, {"lat": 28.55, "lng": 77.00}],
+        "use_cache": False
+    })
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data["upstream_requests"] == 1
+    assert len(data["routes"]) == 2 and len(data["routes"][0]) == 3
+    assert data["routes"][1][2]["route_url"] == "https://www.google.com/maps/dir/28.7,77.1/28.55,77.0"
+
+    response = client.post('/route/batch', json={"donors": [{"lat": 100, "lng": 0}], "ngos": [{"lat": 1, "lng": 1}]})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    test_plan_covers_matrix_within_limits()
+    print("✅ Distance Matrix batching tests passed")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process matching engine behind /match
+"""
+
+import random
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from matching import (GridIndex, MatchingEngine, haversine_km, is_compatible, parse_expiry_hours,
+                      parse_quantity)
+
+
+def test_grid_index_matches_brute_force():
+    """Grid nearest-neighbour results agree with a full scan"""
+    rng = random.Random(7)
+    index = GridIndex(cell_size_deg=0.05)
+    points = {}
+    for i in range(2000):
+        lat = 28.4 + rng.random() * 0.5
+        lng = 76.9 + rng.random() * 0.6
+        points[i] = (lat, lng)
+        index.insert(i, lat, lng)
+
+    for _ in range(50):
+        lat = 28.4 + rng.random() * 0.5
+        lng = 76.9 + rng.random() * 0.6
+        expected = sorted((haversine_km(lat, lng, *p), i) for i, p in points.items())[:5]
+        got = index.nearest(lat, lng, limit=5)
+        assert [i for _, i in got] == [i for _, i in expected]
+
+
+def test_grid_index_remove_and_radius():
+    """Removed points disappear and max_distance_km is respected"""
+    index = GridIndex()
+    index.insert('a', 28.61, 77.20)
+    index.insert('b', 19.07, 72.87)
+    assert [i for _, i in index.nearest(28.6, 77.2, limit=2, max_distance_km=50)] == ['a']
+    index.remove('a')
+    assert index.nearest(28.6, 77.2, limit=2, max_distance_km=50) == []
+    assert [i for _, i in index.nearest(28.6, 77.2, limit=2)] == ['b']
+
+
+def test_food_compatibility():
+    """NGO "food needed" text is matched against the donated food type"""
+    assert is_compatible('Rice', 'Rice, Vegetables')
+    assert is_compatible('rotis', 'Roti and dal')
+    assert is_compatible('Milk', '')
+    assert not is_compatible('Milk', 'Rice, Vegetables')
+    assert parse_quantity('5kg') == 5.0
+    assert parse_quantity('about 2.5 kg') == 2.5
+    assert parse_quantity('some') == 0.0
+
+
+def test_engine_nearest_and_match():
+    """Nearest compatible NGO is chosen and the match shows up in the summary"""
+    engine = MatchingEngine()
+    near = engine.add_ngo_request({"ngoName": "Near Kitchen", "foodNeeded": "Bread",
+                                   "location": "Delhi", "lat": 28.62, "lng": 77.21})
+    engine.add_ngo_request({"ngoName": "Rice Bank", "foodNeeded": "Rice",
+                            "location": "Delhi", "lat": 28.70, "lng": 77.10})
+    donation = engine.add_donation({"foodType": "Rice", "quantity": "50 kg", "location": "delhi",
+                                    "donor": "Restaurant ABC", "lat": 28.61, "lng": 77.20})
+
+    ngos = engine.nearest_ngos(donation)
+    assert [ngo['ngoName'] for ngo in ngos] == ['Rice Bank']
+    assert near not in [ngo['id'] for ngo in ngos]
+
+    summary = engine.summary()
+    assert summary['total_donors'] == 1
+    assert summary['total_ngos'] == 2
+    assert summary['donations_by_location'] == {"Delhi": 50.0}
+
+    match = engine.match_donation(donation)
+    assert match['ngo'] == 'Rice Bank'
+    assert match['status'] == 'Matched'
+
+    summary = engine.summary()
+    assert summary['total_food_quantity'] == 0
+    assert summary['recent_matches'][0]['donor'] == 'Restaurant ABC'
+
+
+def test_aggregates_are_incremental():
+    """Running counters match a recount after adds and removes"""
+    engine = MatchingEngine()
+    ids = [engine.add_donation({"foodType": food, "quantity": f"{q} kg", "location": city, "donor": donor})
+           for food, q, city, donor in [("Rice", 10, "Delhi", "A"), ("rice", 5, "Mumbai", "B"),
+                                        ("Bread", 2.5, "Delhi", "A"), ("Milk", 1.1, "Chennai", "C")]]
+    engine.remove_donation(ids[1])
+    engine.remove_donation(ids[3])
+
+    summary = engine.summary()
+    assert summary["donations_by_food_type"] == {"Rice": 10.0, "Bread": 2.5}
+    assert summary["donations_by_location"] == {"Delhi": 12.5}
+    assert summary["total_donors"] == 1
+    assert summary["total_food_quantity"] == 12.5
+
+    version = engine.version
+    assert engine.summary() is summary
+    engine.add_ngo_request({"ngoName": "Hope", "foodNeeded": "any", "location": "Delhi"})
+    assert engine.version == version + 1
+    assert engine.summary()["total_ngos"] == 1
+
+
+def test_expiry_parsing():
+    """Expiry comes from the form's hours or the /chat free text"""
+    assert parse_expiry_hours({"expiryTime": 24}) == 24.0
+    assert parse_expiry_hours({"expiry": "4 hours"}) == 4.0
+    assert parse_expiry_hours({"expiry": "30 mins"}) == 0.5
+    assert parse_expiry_hours({"expiry": "2 days"}) == 48.0
+    assert parse_expiry_hours({"expiry": "tomorrow"}) == 36.0
+    assert parse_expiry_hours({"expiry": "unknown"}) is None
+
+
+def test_expired_donations_leave_live_state():
+    """Urgent donations come first and expired ones drop out of matching and aggregates"""
+    now = [1_700_000_000.0]
+    engine = MatchingEngine(clock=lambda: now[0])
+    created_at = datetime.fromtimestamp(now[0], timezone.utc).isoformat()
+    engine.add_ngo_request({"ngoName": "Hope", "foodNeeded": "any", "location": "Delhi",
+                            "lat": 28.6, "lng": 77.2})
+    slow = engine.add_donation({"foodType": "Rice", "quantity": "10kg", "location": "Delhi",
+                                "expiryTime": 48, "created_at": created_at, "lat": 28.61, "lng": 77.2})
+    fast = engine.add_donation({"foodType": "Rotis", "quantity": "2kg", "location": "Delhi",
+                                "expiry": "2 hours", "created_at": created_at, "lat": 28.62, "lng": 77.2})
+    engine.add_donation({"foodType": "Dal", "quantity": "3kg", "location": "Pune", "created_at": created_at})
+
+    assert [d["id"] for d in engine.urgent_donations()] == [fast, slow]
+    assert engine.summary()["total_food_quantity"] == 15
+
+    version = engine.current_version()
+    now[0] += 3 * 3600
+    assert engine.current_version() == version + 1
+    summary = engine.summary()
+    assert summary["total_food_quantity"] == 13
+    assert summary["expired_donations"] == 1
+    assert engine.get_donation(fast) is None
+    assert [d["id"] for d in engine.urgent_donations()] == [slow]
+
+    match = engine.match_most_urgent()
+    assert match["donation_id"] == slow
+    now[0] += 100 * 3600
+    assert engine.expire() == 0
+    assert engine.summary()["open_donations"] == 1
+
+
+def test_expiry_without_timestamps_follows_the_clock():
+    """Donations without a usable created_at expire relative to the engine's clock"""
+    now = [1_700_000_000.0]
+    engine = MatchingEngine(clock=lambda: now[0])
+    missing = engine.add_donation({"foodType": "Rice", "quantity": "1kg", "location": "Delhi", "expiryTime": 2})
+    invalid = engine.add_donation({"foodType": "Rice", "quantity": "1kg", "location": "Delhi", "expiryTime": 2,
+                                   "created_at": "yesterday"})
+    assert engine.get_donation(missing)["created_at"] == datetime.fromtimestamp(now[0], timezone.utc).isoformat()
+    now[0] += 3600
+    assert engine.expire() == 0
+    now[0] += 3601
+    assert engine.expire() == 2
+    assert engine.get_donation(missing) is None and engine.get_donation(invalid) is None
+
+
+def test_match_endpoint_etag():
+    """Unchanged polls get a 304; changes produce a new ETag"""
+    import app as app_module
+    client = app_module.app.test_client()
+
+    first = client.get('/match')
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.get_json()["status"] == "success"
+
+    again = client.get('/match', headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+
+    client.post('/donations', json={"foodType": "Rice", "quantity": "3kg", "location": "Pune"})
+    changed = client.get('/match', headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_engine_scales_to_many_donations():
+    """Nearest lookups stay fast with 100k open donations"""
+    rng = random.Random(1)
+    engine = MatchingEngine()
+    for i in range(1000):
+        engine.add_ngo_request({"id": f"ngo-{i}", "ngoName": f"NGO {i}", "foodNeeded": "any",
+                                "location": "Delhi", "lat": 28.4 + rng.random() * 0.5,
+                                "lng": 76.9 + rng.random() * 0.6})
+    for i in range(100000):
+        engine.add_donation({"id": f"d-{i}", "foodType": "Rice", "quantity": "1",
+                             "location": "Delhi", "lat": 28.4 + rng.random() * 0.5,
+                             "lng": 76.9 + rng.random() * 0.6})
+
+    start = time.perf_counter()
+    for i in range(1000):
+        engine.nearest_ngos(f"d-{i}", limit=3)
+    per_query_ms = (time.perf_counter() - start)
+    print(f"Nearest lookup: {per_query_ms:.3f} ms/query")
+    assert per_query_ms < 5
+
+
+if __name__ == "__main__":
+    test_grid_index_matches_brute_force()
+    test_grid_index_remove_and_radius()
+    test_food_compatibility()
+    test_engine_nearest_and_match()
+    test_engine_scales_to_many_donations()
+    print("✅ All matching tests passed")
+
+
+def test_match_endpoint_validates_max_distance():
+    """A non-numeric or non-positive max_distance_km is a 400, not a 500"""
+    import app as app_module
+    client = app_module.app.test_client()
+    donation = client.post('/donations', json={"foodType": "Rice", "quantity": "3kg", "location": "Pune"}).get_json()
+    for value in ("abc", -5, 0, True):
+        response = client.post('/match', json={"donation_id": donation["id"], "max_distance_km": value})
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "'max_distance_km' must be a positive number", "status": "error"}
+
+
+def test_capacity_and_explicit_ngo_checks():
+    """Consuming matches fill NGO requests; explicit NGOs must need the food and be in range"""
+    engine = MatchingEngine()
+    ngo = engine.add_ngo_request({"ngoName": "Hope", "foodNeeded": "Rice", "location": "Delhi",
+                                  "lat": 28.6, "lng": 77.2, "capacity": 2})
+    rice = [engine.add_donation({"foodType": "Rice", "quantity": "2kg", "location": "Delhi",
+                                 "lat": 28.61, "lng": 77.2}) for _ in range(3)]
+    bread = engine.add_donation({"foodType": "Bread", "quantity": "2kg", "location": "Delhi",
+                                 "lat": 28.61, "lng": 77.2})
+
+    with pytest.raises(ValueError):
+        engine.match_donation(bread, ngo_id=ngo)
+    with pytest.raises(ValueError):
+        engine.match_donation(rice[0], ngo_id=ngo, max_distance_km=0.1)
+
+    first = engine.match_donation(rice[0], ngo_id=ngo, consume_ngo=True)
+    assert engine.get_ngo_request(ngo)["capacity"] == 1
+    engine.match_donation(rice[1], ngo_id=ngo, consume_ngo=True)
+    assert engine.get_ngo_request(ngo) is None
+    assert engine.match_donation(rice[2]) is None
+
+    # Replaying the log uses the capacity up again
+    replayed = MatchingEngine()
+    replayed.add_ngo_request({"id": ngo, "ngoName": "Hope", "foodNeeded": "Rice", "location": "Delhi",
+                              "lat": 28.6, "lng": 77.2, "capacity": 2})
+    replayed.restore_match(first)
+    assert replayed.get_ngo_request(ngo)["capacity"] == 1
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics behind /metrics
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from metrics import Registry
+
+
+def test_per_thread_shards_sum_on_scrape():
+    """Counts from many threads add up and histograms render cumulatively"""
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+
+    def work():
+        for i in range(1000):
+            requests.inc('/chat')
+            latency.observe(0.05 if i % 2 else 0.5, '/chat')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert requests.value('/chat') == 8000
+    assert latency.count('/chat') == 8000
+    text = registry.render()
+    assert 'requests_total{route="/chat"} 8000' in text
+    assert 'latency_seconds_bucket{route="/chat",le="0.1"} 4000' in text
+    assert 'latency_seconds_bucket{route="/chat",le="1"} 8000' in text
+    assert 'latency_seconds_bucket{route="/chat",le="+Inf"} 8000' in text
+    assert 'latency_seconds_count{route="/chat"} 8000' in text
+
+
+def test_exited_threads_fold_their_shards():
+    """Short-lived threads don't leave a shard each behind"""
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+
+    def handle():
+        requests.inc('/match')
+        latency.observe(0.05, '/match')
+
+    for _ in range(2000):
+        thread = threading.Thread(target=handle)
+        thread.start()
+        thread.join()
+
+    assert len(registry._shards) <= 2
+    assert requests.value('/match') == 2000
+    assert latency.count('/match') == 2000
+
+
+def test_observation_is_cheap():
+    """Recording a histogram sample stays in the low microseconds"""
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', ('route', 'method'))
+    start = time.perf_counter()
+    for _ in range(100000):
+        latency.observe(0.02, '/route', 'POST')
+    per_call_us = (time.perf_counter() - start) / 100000 * 1e6
+    print(f"Histogram observe: {per_call_us:.2f} us")
+    assert per_call_us < 10
+
+
+def test_metrics_endpoint(monkeypatch):
+    """/metrics exposes request counts, upstream timings, fallbacks and cache ratios"""
+    import app as app_module
+    import extraction
+    import metrics
+
+    def fake_create(**kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="not json"))])
+
+    monkeypatch.setattr(app_module.Config, 'CHAT_RULES_ENABLED', False)
+    monkeypatch.setattr(app_module.openai, 'api_key', 'test-key')
+    monkeypatch.setattr(extraction.openai.ChatCompletion, 'create', fake_create)
+    client = app_module.app.test_client()
+
+    before = metrics.CHAT_EXTRACTIONS.value('llm', 'partial_success')
+    assert client.post('/chat', json={"message": "metrics probe message"}).status_code == 200
+    assert metrics.CHAT_EXTRACTIONS.value('llm', 'partial_success') == before + 1
+    client.get('/health')
+
+    response = client.get('/metrics')
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'xylm_http_requests_total{route="/chat",method="POST",status="200"}' in text
+    assert 'xylm_http_request_duration_seconds_bucket{route="/health",method="GET",le="+Inf"}' in text
+    assert 'xylm_upstream_request_duration_seconds_count{upstream="openai",outcome="ok"}' in text
+    assert 'xylm_chat_extractions_total{path="llm",status="partial_success"}' in text
+    assert 'xylm_cache_hit_ratio{cache="chat"}' in text
+    assert 'xylm_cache_hit_ratio{cache="distance_memory"}' in text
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for the opt-in request profiling hook
+"""
+
+import os
+import pstats
+import time
+
+from profiling import StackSampler, start_profile
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_captures_stacks():
+    """Folded stacks name the function that was running"""
+    import threading
+    sampler = StackSampler(threading.get_ident(), interval=0.001).start()
+    busy_wait(0.1)
+    sampler.stop()
+    folded = sampler.folded()
+    assert "test_profiling:busy_wait" in folded
+    stack, count = folded.splitlines()[0].rsplit(' ', 1)
+    assert int(count) > 0 and ';' in stack
+
+
+def test_only_one_profile_at_a_time(tmp_path):
+    """A second request is not profiled while one is in progress"""
+    first = start_profile('sample', 'GET /one', str(tmp_path))
+    assert first is not None
+    assert start_profile('sample', 'GET /two', str(tmp_path)) is None
+    first.stop()
+    second = start_profile('cprofile', 'GET /two', str(tmp_path))
+    assert second is not None
+    second.stop()
+    assert pstats.Stats(second.path).total_calls >= 0
+
+
+def test_admin_header_profiles_request(monkeypatch, tmp_path):
+    """Requests with the admin token get a profile file; others don't"""
+    import app as app_module
+    monkeypatch.setattr(app_module.Config, 'PROFILE_ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(app_module.Config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module.Config, 'PROFILE_MODE', 'cprofile')
+    client = app_module.app.test_client()
+
+    plain = client.get('/health')
+    wrong = client.get('/health', headers={"X-Profile": "guess"})
+    assert "X-Profile-File" not in plain.headers and "X-Profile-File" not in wrong.headers
+    assert os.listdir(tmp_path) == []
+
+    profiled = client.post('/route', json={"donor_lat": 28.61, "donor_lng": 77.2, "ngo_lat": 28.7,
+                                           "ngo_lng": 77.1, "use_cache": False},
+                           headers={"X-Profile": "secret"})
+    assert profiled.status_code == 200
+    name = profiled.headers["X-Profile-File"]
+    assert name.endswith('.prof') and 'POST-route' in name
+    stats = pstats.Stats(str(tmp_path / name))
+    assert any(func[2] == 'get_route' for func in stats.stats)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for fast JSON, response compression and /match cursor pagination
+"""
+
+import gzip
+import json
+from datetime import datetime, timezone
+
+from werkzeug.datastructures import Accept
+
+from matching import MatchingEngine
+from response_encoding import FastJSONProvider, choose_encoding, compress
+
+
+def test_fast_provider_matches_default_output():
+    """orjson output decodes to what the stdlib provider produces, dates included"""
+    import app as app_module
+    from flask.json.provider import DefaultJSONProvider
+    provider = FastJSONProvider(app_module.app)
+    payload = {"b": [1, 2.5, None], "a": {"nested": "café"},
+               "when": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}
+    encoded = provider.dumps(payload)
+    assert json.loads(encoded) == json.loads(DefaultJSONProvider(app_module.app).dumps(payload))
+    assert json.loads(encoded)["when"] == "Tue, 02 Jan 2024 03:04:05 GMT"
+    assert list(json.loads(encoded)) == ["a", "b", "when"]
+    assert provider.loads(encoded)["a"] == {"nested": "café"}
+    # Values orjson can't encode fall back to the stdlib encoder
+    assert json.loads(provider.dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+
+def test_fallbacks_without_optional_packages(monkeypatch):
+    """Without orjson and brotli the stdlib encoder and gzip are used"""
+    import app as app_module
+    import response_encoding
+    monkeypatch.setattr(response_encoding, 'orjson', None)
+    monkeypatch.setattr(response_encoding, 'brotli', None)
+    provider = FastJSONProvider(app_module.app)
+    assert json.loads(provider.dumps({"b": 1, "a": [2]})) == {"a": [2], "b": 1}
+    assert provider.loads('{"a": 1}') == {"a": 1}
+    assert json.loads(response_encoding.dumps({1: "x"})) == {"1": "x"}
+    assert response_encoding.available_encodings() == ('gzip',)
+    assert choose_encoding(Accept([('br', 1), ('gzip', 0.5)])) == 'gzip'
+
+
+def test_choose_encoding_honours_quality():
+    assert choose_encoding(Accept([('gzip', 1)])) == 'gzip'
+    assert choose_encoding(Accept([('gzip', 0)])) is None
+    assert choose_encoding(Accept([('identity', 1)])) is None
+    assert choose_encoding(Accept([('*', 1)])) in ('br', 'gzip')
+    assert gzip.decompress(compress(b'x' * 1000, 'gzip')) == b'x' * 1000
+
+
+def test_match_cursor_pages_new_matches():
+    engine = MatchingEngine(max_recent_matches=5)
+    for i in range(3):
+        engine.add_ngo_request({"id": f"n{i}", "ngoName": f"NGO {i}", "foodNeeded": "Rice", "lat": 28.6, "lng": 77.2})
+        engine.add_donation({"id": f"d{i}", "foodType": "Rice", "quantity": "5kg", "lat": 28.6, "lng": 77.2})
+    engine.match_donation("d0", ngo_id="n0")
+    cursor = engine.match_cursor()
+
+    assert engine.matches_since(cursor) == ([], cursor, False, False)
+    engine.match_donation("d1", ngo_id="n1")
+    engine.match_donation("d2", ngo_id="n2")
+
+    page, next_cursor, has_more, reset = engine.matches_since(cursor, limit=1)
+    assert [m["donation_id"] for m in page] == ["d1"] and has_more and not reset
+    page, next_cursor, has_more, reset = engine.matches_since(next_cursor, limit=1)
+    assert [m["donation_id"] for m in page] == ["d2"] and not has_more
+    assert next_cursor == engine.match_cursor()
+
+    # A cursor from another engine (e.g. before a restart) starts over
+    page, _, _, reset = engine.matches_since("0123456789ab.2")
+    assert reset and [m["donation_id"] for m in page] == ["d2", "d1", "d0"]
+
+
+def test_match_endpoint_compression_and_since(monkeypatch):
+    """/match is gzip-encoded once per version and ?since= returns only newer matches"""
+    import app as app_module
+    monkeypatch.setattr(app_module.Config, 'COMPRESSION_MIN_BYTES', 0)
+    client = app_module.app.test_client()
+
+    client.post('/ngo-requests', json={"ngoName": "Cursor NGO", "foodNeeded": "Bread", "location": "Delhi",
+                                        "lat": 28.6, "lng": 77.2})
+    snapshot = client.get('/match').get_json()
+    cursor = snapshot["match_cursor"]
+
+    response = client.get('/match', headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["ETag"].startswith('W/')
+    assert json.loads(gzip.decompress(response.data))["version"] == snapshot["version"]
+    assert client.get('/match', headers={"Accept-Encoding": "gzip",
+                                         "If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    donation = client.post('/donations', json={"foodType": "Bread", "quantity": "2kg", "location": "Delhi",
+                                               "lat": 28.6, "lng": 77.2}).get_json()
+    ngo_id = next(ngo["id"] for ngo in app_module.matching_engine.nearest_ngos(donation["id"], limit=10)
+                  if ngo["ngoName"] == "Cursor NGO")
+    client.post('/match', json={"donation_id": donation["id"], "ngo_id": ngo_id})
+
+    delta = client.get(f'/match?since={cursor}').get_json()
+    assert [m["donation_id"] for m in delta["recent_matches"]] == [donation["id"]]
+    assert delta["cursor_reset"] is False and delta["has_more"] is False
+    assert client.get(f'/match?since={delta["next_cursor"]}').get_json()["recent_matches"] == []
+    repeat = client.get(f'/match?since={cursor}')
+    assert client.get(f'/match?since={cursor}', headers={"If-None-Match": repeat.headers["ETag"]}).status_code == 304
+    assert client.get(f'/match?since={cursor}&limit=1',
+                      headers={"If-None-Match": repeat.headers["ETag"]}).status_code == 200
+    assert client.get('/match?since=garbage').status_code == 400
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for the multi-stop pickup planner behind POST /route
+"""
+
+import itertools
+import random
+
+from estimator import DistanceEstimator
+from route_planner import evaluate_route, plan_stops
+
+
+def random_instance(rng, stops):
+    points = [(28.4 + rng.random() * 0.4, 76.9 + rng.random() * 0.5) for _ in range(stops + 1)]
+    _, minutes = DistanceEstimator().estimate_matrix(points, points)
+    return (minutes * 60).tolist()
+
+
+def test_planner_close_to_optimal():
+    """Nearest insertion + 2-opt stays within a few percent of the best order"""
+    rng = random.Random(11)
+    ratios = []
+    for _ in range(20):
+        durations = random_instance(rng, 7)
+        deadlines = [None] * 8
+        order, _, _ = plan_stops(durations, deadlines)
+        cost = evaluate_route(order, durations, deadlines)[0]
+        best = min(evaluate_route(list(p), durations, deadlines)[0]
+                   for p in itertools.permutations(range(1, 8)))
+        assert cost >= best - 1e-6
+        ratios.append(cost / best)
+    assert sum(ratios) / len(ratios) < 1.03
+    assert max(ratios) < 1.15
+
+
+def test_planner_respects_deadlines():
+    """An expiring pickup is visited first even when that is a detour"""
+    # Depot 0; stop 1 is on the way to stop 2, stop 3 is the other way but expires soon
+    durations = [
+        [0, 600, 1200, 900],
+        [600, 0, 600, 1500],
+        [1200, 600, 0, 2100],
+        [900, 1500, 2100, 0],
+    ]
+    deadlines = [None, None, None, 1000]
+    order, arrivals, lateness = plan_stops(durations, deadlines, service_seconds=300)
+    assert order[0] == 3
+    assert lateness == 0
+    assert arrivals[0] == 900
+
+
+def test_multi_stop_route_uses_one_matrix(monkeypatch):
+    """POST /route with pickups orders stops from a single matrix call"""
+    import app as app_module
+    calls = []
+
+    def fake_matrix(origins, destinations, api_key=None, cache=None):
+        calls.append((len(origins), len(destinations)))
+        return [[{"distance": "Unknown", "duration": "Unknown"} for _ in destinations] for _ in origins], 0
+
+    monkeypatch.setattr(app_module, 'get_distance_matrix', fake_matrix)
+    client = app_module.app.test_client()
+    rng = random.Random(4)
+    pickups = [{"lat": 28.5 + rng.random() * 0.2, "lng": 77.0 + rng.random() * 0.3} for _ in range(12)]
+    pickups[5]["expiryTime"] = 1
+
+    response = client.post('/route', json={"depot": {"lat": 28.6, "lng": 77.2}, "pickups": pickups})
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert calls == [(13, 13)]
+    assert sorted(stop["pickup_index"] for stop in data["stops"]) == list(range(12))
+    assert len(data["route_url"].split("/dir/")[1].split("/")) == 14
+    assert data["route_url"].endswith("/28.6,77.2")
+    assert data["distance_source"] == "estimate"
+    assert data["stops"][0]["pickup_index"] == 5 and data["stops"][0]["on_time"]
+
+    bad = client.post('/route', json={"depot": {"lat": 28.6, "lng": 77.2}, "pickups": [{"lat": 28.6}]})
+    assert bad.status_code == 400
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the urgency-aware OpenAI scheduler
+"""
+
+import threading
+import time
+
+import pytest
+
+from scheduler import LLMScheduler, SchedulerBusy, TokenBucket, message_urgency
+
+
+def test_token_bucket_refills_at_rate():
+    now = [0.0]
+    bucket = TokenBucket(rate_per_minute=60, capacity=2, clock=lambda: now[0])
+    assert bucket.wait_time(2) == 0
+    bucket.consume(2)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    now[0] = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    now[0] = 10
+    assert bucket.tokens <= 2 and bucket.wait_time(2) == 0
+
+
+def test_message_urgency_reads_expiry_hints():
+    assert message_urgency("20 rotis in Delhi expiring in 30 mins") == pytest.approx(0.5)
+    assert message_urgency("biryani for 50 people, good till tomorrow") == 36
+    assert message_urgency("some food is available") == 24
+
+
+def test_most_urgent_calls_go_first():
+    """While the request budget is exhausted, waiters are released soonest-expiry first"""
+    scheduler = LLMScheduler(requests_per_minute=600, tokens_per_minute=1e9, burst_seconds=0.1)
+    scheduler.acquire(0, 1)  # uses the only request token
+    order = []
+    lock = threading.Lock()
+
+    def caller(hours):
+        scheduler.acquire(hours, 1)
+        with lock:
+            order.append(hours)
+
+    threads = [threading.Thread(target=caller, args=(hours,)) for hours in (24, 0.5, 12, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert order == [0.5, 4, 12, 24]
+    assert scheduler.stats()["dispatched"] == 5
+
+
+def test_full_queue_rejects_fast_and_urgent_calls_displace():
+    scheduler = LLMScheduler(requests_per_minute=1, tokens_per_minute=1e9, max_queue=2, max_wait=1,
+                             burst_seconds=1)
+    scheduler.acquire(0, 1)
+    outcomes = {}
+
+    def caller(hours):
+        try:
+            scheduler.acquire(hours, 1)
+            outcomes[hours] = "granted"
+        except SchedulerBusy as e:
+            outcomes[hours] = str(e)
+
+    waiting = [threading.Thread(target=caller, args=(hours,)) for hours in (10, 20)]
+    for thread in waiting:
+        thread.start()
+    while scheduler.stats()["queued"] < 2:
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    with pytest.raises(SchedulerBusy) as busy:
+        scheduler.acquire(30, 1)
+    assert time.perf_counter() - started < 0.1
+    assert busy.value.retry_after >= 1
+
+    urgent = threading.Thread(target=caller, args=(1,))
+    urgent.start()
+    for thread in waiting + [urgent]:
+        thread.join(5)
+    assert outcomes[20] == "Displaced by a more urgent request"
+    assert outcomes[10].startswith("Timed out") and outcomes[1].startswith("Timed out")
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_chat_returns_429_with_retry_after(monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module.Config, 'CHAT_RULES_ENABLED', False)
+    monkeypatch.setattr(app_module.openai, 'api_key', 'test')
+    monkeypatch.setattr(app_module, 'llm_scheduler', LLMScheduler(max_queue=0))
+    client = app_module.app.test_client()
+
+    response = client.post('/chat', json={"message": "scheduler probe: leftover khichdi"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["status"] == "error"
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Test script for the city-sharded matching engine (sharding.py)
+"""
+
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from events import MatchStream
+from matching import MatchingEngine
+from sharding import ShardedMatchingEngine
+
+CITIES = {
+    "Delhi": (28.61, 77.20),
+    "Mumbai": (19.07, 72.87),
+    "Bangalore": (12.97, 77.59),
+    "Chennai": (13.08, 80.27),
+}
+
+
+@pytest.fixture
+def engine():
+    sharded = ShardedMatchingEngine(shards=3)
+    try:
+        yield sharded
+    finally:
+        sharded.close()
+
+
+def load(engine):
+    """Two NGOs and two donations per city; returns the donation ids"""
+    donations = []
+    for city, (lat, lng) in CITIES.items():
+        engine.add_ngo_request({"ngoName": f"{city} Kitchen", "foodNeeded": "Rice",
+                                "location": city, "lat": lat + 0.01, "lng": lng})
+        engine.add_ngo_request({"ngoName": f"{city} Bakery", "foodNeeded": "Bread",
+                                "location": city, "lat": lat, "lng": lng + 0.01})
+        for food in ("Rice", "Bread"):
+            donations.append(engine.add_donation({"foodType": food, "quantity": "10 kg", "location": city,
+                                                  "donor": f"{city} {food} Donor", "lat": lat, "lng": lng,
+                                                  "expiryTime": 4}))
+    return donations
+
+
+def test_records_are_routed_by_city(engine):
+    """Every city lives on one shard and the cities spread over the shards"""
+    shards = {city: engine.shard_for(city).index for city in CITIES}
+    assert engine.shard_for("  delhi ").index == shards["Delhi"]
+    assert len(set(shards.values())) > 1
+
+
+def test_merged_snapshot_matches_single_engine(engine):
+    """/match aggregates merged from the shards equal one engine's"""
+    single = MatchingEngine()
+    load(engine)
+    load(single)
+
+    merged = engine.summary()
+    expected = single.summary()
+    for key in ("total_donors", "total_ngos", "total_food_quantity", "donations_by_food_type",
+                "donations_by_location", "open_donations", "open_ngo_requests"):
+        assert merged[key] == expected[key], key
+    assert merged["version"] == engine.current_version()
+    assert engine.snapshot() is engine.snapshot()
+
+
+def test_matching_stays_in_the_city(engine):
+    """Donations match their own city's nearest compatible NGO"""
+    for donation_id in load(engine):
+        donation = engine.get_donation(donation_id)
+        match = engine.match_donation(donation_id)
+        assert match["ngo"].startswith(donation["location"])
+        assert engine.get_donation(donation_id) is None
+    summary = engine.summary()
+    assert summary["open_donations"] == 0
+    assert len(summary["recent_matches"]) == 2 * len(CITIES)
+
+
+def test_cross_city_matching(engine):
+    """Explicit NGOs from another city work, and cities without a fit fall back to others"""
+    lat, lng = CITIES["Delhi"]
+    ngo = engine.add_ngo_request({"ngoName": "Noida Pantry", "foodNeeded": "Dal, Rice", "location": "Noida",
+                                  "lat": lat + 0.05, "lng": lng})
+    explicit = engine.add_donation({"foodType": "Rice", "quantity": "5 kg", "location": "Delhi",
+                                    "lat": lat, "lng": lng})
+    bread = engine.add_donation({"foodType": "Bread", "quantity": "5 kg", "location": "Delhi",
+                                 "lat": lat, "lng": lng})
+    with pytest.raises(ValueError):
+        engine.match_donation(bread, ngo_id=ngo)
+    match = engine.match_donation(explicit, ngo_id=ngo)
+    assert match["ngo"] == "Noida Pantry" and match["distance_km"] > 0
+
+    fallback = engine.add_donation({"foodType": "Dal", "quantity": "5 kg", "location": "Delhi",
+                                    "lat": lat, "lng": lng})
+    assert engine.match_donation(fallback)["ngo"] == "Noida Pantry"
+    with pytest.raises(KeyError):
+        engine.match_donation("missing")
+
+
+def test_cursor_and_status_updates(engine):
+    """Merged cursors page through new matches; status changes reach the right shard"""
+    donations = load(engine)
+    cursor = engine.match_cursor()
+    first = engine.match_donation(donations[0])
+    second = engine.match_donation(donations[-1])
+
+    matches, next_cursor, has_more, reset = engine.matches_since(cursor)
+    assert {m["id"] for m in matches} == {first["id"], second["id"]}
+    assert not has_more and not reset
+    assert engine.matches_since(next_cursor)[0] == []
+    assert engine.matches_since("other.0")[3] is True
+    with pytest.raises(ValueError):
+        engine.matches_since("garbage")
+
+    updated = engine.update_match_status(second["id"], "Delivered")
+    assert updated["status"] == "Delivered"
+    changes, seq = engine.status_changes_since(0)
+    assert seq == 1 and changes[0]["id"] == second["id"]
+    with pytest.raises(KeyError):
+        engine.update_match_status("missing", "Delivered")
+
+
+def test_urgent_matching_and_stream(engine):
+    """Most urgent donation across shards is matched and the stream sees the change"""
+    donations = load(engine)
+    lat, lng = CITIES["Mumbai"]
+    urgent = engine.add_donation({"foodType": "Rice", "quantity": "1 kg", "location": "Mumbai",
+                                  "lat": lat, "lng": lng, "expiryTime": 1})
+    assert engine.urgent_donations(1)[0]["id"] == urgent
+    assert len(engine.urgent_donations(100)) == len(donations) + 1
+
+    stream = MatchStream(engine, coalesce_seconds=60)
+    stream.start()
+    match = engine.match_most_urgent()
+    assert match["donation_id"] == urgent
+    delta = stream.publish_delta()
+    assert match["id"].encode() in delta
+
+
+def test_expired_donations_release_their_owners(engine):
+    """Donations that expire inside a shard are dropped from the routing table"""
+    def donation(city, created_at):
+        return {"foodType": "Rice", "quantity": "1 kg", "location": city, "expiryTime": 1,
+                "created_at": created_at.isoformat()}
+
+    now = datetime.now(timezone.utc)
+    already = [engine.add_donation(donation(city, now - timedelta(hours=2))) for city in CITIES]
+    soon = [engine.add_donation(donation(city, now - timedelta(seconds=3599.7))) for city in CITIES]
+    fresh = load(engine)
+    time.sleep(0.4)
+    engine.current_version()
+    assert not set(already + soon) & set(engine._donation_owner)
+    assert set(fresh) <= set(engine._donation_owner)
+    assert engine.summary()["expired_donations"] == len(soon)
+
+
+def use_in_child(engine, results):
+    try:
+        load(engine)
+        results.put((os.getpid(), [stats["alive"] for stats in engine.shard_stats()],
+                     engine.summary()["open_donations"]))
+    except RuntimeError as e:
+        results.put(str(e))
+    finally:
+        engine.close()
+
+
+def test_shards_start_in_the_serving_process():
+    """Shards start with the first call, so a process forked before that (gunicorn --preload) owns them"""
+    context = multiprocessing.get_context('fork')
+    engine = ShardedMatchingEngine(shards=2)
+    assert engine.shard_stats() == [] and len(engine) == 2
+
+    results = context.Queue()
+    child = context.Process(target=use_in_child, args=(engine, results))
+    child.start()
+    pid, alive, open_donations = results.get(timeout=30)
+    child.join()
+    assert pid == child.pid and alive == [True, True] and open_donations == 8
+    assert engine.shard_stats() == []
+
+    # Once started they belong to this process
+    try:
+        engine.summary()
+        child = context.Process(target=use_in_child, args=(engine, results))
+        child.start()
+        assert "MATCH_SHARDS=1" in results.get(timeout=30)
+        child.join()
+    finally:
+        engine.close()
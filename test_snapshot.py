@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test script for warm-restart snapshots (snapshot.py) and log-tail replay
+"""
+
+import numpy as np
+import pytest
+
+import snapshot
+from cache import LRUCache
+from columnar import ColumnarStore
+from ingest import IngestLog
+from matching import MatchingEngine
+from test_columnar import donations
+
+
+def build_state(tmp_path):
+    engine = MatchingEngine()
+    log = IngestLog(str(tmp_path / 'ingest.jsonl'))
+    history = ColumnarStore(capacity=16)
+    cache = LRUCache(ttl_seconds=3600)
+    engine.add_ngo_request({"ngoName": "Hope Foundation", "foodNeeded": "Rice", "location": "Delhi",
+                            "lat": 28.62, "lng": 77.2})
+    records = donations(40)
+    for record in records:
+        engine.add_donation(dict(record))
+    log.append([{"type": "donation", "record": record} for record in records])
+    history.extend('donation', records)
+    cache.set("hello", {"response": "Hi!"})
+    return engine, log, history, cache
+
+
+def test_write_and_read_round_trip(tmp_path):
+    """Arrays come back as aligned read-only views of the mapped file"""
+    path = str(tmp_path / 'state.snapshot')
+    arrays = {"a": np.arange(5, dtype=np.int32), "b": np.linspace(0, 1, 7, dtype=np.float32)}
+    size = snapshot.write_snapshot(path, {"note": "test"}, arrays)
+
+    header, loaded = snapshot.read_snapshot(path)
+    assert header == {"note": "test"}
+    assert size == (tmp_path / 'state.snapshot').stat().st_size
+    for name, array in arrays.items():
+        assert np.array_equal(loaded[name], array)
+        assert not loaded[name].flags.writeable
+        assert loaded[name].ctypes.data % snapshot.ALIGNMENT == 0
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_unusable_files_are_ignored(tmp_path):
+    """Missing, empty, truncated and other-version files read as no snapshot"""
+    path = tmp_path / 'state.snapshot'
+    assert snapshot.read_snapshot(str(path)) is None
+    path.write_bytes(b'')
+    assert snapshot.read_snapshot(str(path)) is None
+
+    snapshot.write_snapshot(str(path), {}, {"a": np.arange(100, dtype=np.int64)})
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    assert snapshot.read_snapshot(str(path)) is None
+    path.write_bytes(snapshot._PREFIX.pack(snapshot.MAGIC, snapshot.FORMAT_VERSION + 1, 0) + data[16:])
+    assert snapshot.read_snapshot(str(path)) is None
+
+
+def test_save_and_restore(tmp_path):
+    """Engine, history and caches come back; only later log events are replayed"""
+    path = str(tmp_path / 'state.snapshot')
+    engine, log, history, cache = build_state(tmp_path)
+    match = engine.match_donation(engine.urgent_donations(1)[0]["id"])
+    summary = snapshot.save(path, snapshot.StateGate(), engine, ingest_log=log,
+                            history_store=history, caches={"chat": cache})
+    assert summary["ingest_seq"] == 40
+    log.append([{"type": "donation", "record": {"id": "late"}}])
+    log.close()
+
+    restored_engine, restored_history, restored_cache = MatchingEngine(), ColumnarStore(), LRUCache()
+    info = snapshot.restore(path, restored_engine, history_store=restored_history,
+                            caches={"chat": restored_cache})
+    assert info["ingest_seq"] == 40 and info["history_records"] == 40
+    assert [event["record"]["id"] for event in log.replay(info["ingest_seq"], info["ingest_offset"])] == ["late"]
+
+    assert restored_engine.summary()["open_donations"] == engine.summary()["open_donations"]
+    assert restored_engine.summary()["recent_matches"][0]["id"] == match["id"]
+    assert restored_cache.get("hello") == {"response": "Hi!"}
+    assert restored_history.aggregate('location') == history.aggregate('location')
+
+    # Mapped columns are copied on the first append
+    restored_history.append('ngo_request', {"ngoName": "New Kitchen", "foodNeeded": "Bread", "location": "Pune"})
+    assert len(restored_history) == 41
+    assert restored_history.records(limit=1)[0]["location"] == "Pune"
+
+
+def test_checkpoint_offsets_and_tail_seq(tmp_path):
+    """Offsets skip the logged prefix, and are ignored if they no longer fit the file"""
+    path = str(tmp_path / 'ingest.jsonl')
+    log = IngestLog(path)
+    log.append([{"type": "donation", "record": {"id": str(i)}} for i in range(10)])
+    seq, offset = log.checkpoint()
+    assert seq == 10
+    log.append([{"type": "donation", "record": {"id": "after"}}])
+    log.close()
+
+    assert [event["seq"] for event in log.replay(seq, offset)] == [11]
+    assert [event["seq"] for event in log.replay(seq, offset - 3)] == [11]
+    assert IngestLog(path)._last_seq(tail_bytes=64) == 11
+
+
+def test_snapshotter_saves_only_changes():
+    """Nothing is written while the state position stays put"""
+    position = [0]
+    saved = []
+    snapshotter = snapshot.Snapshotter(60, lambda: saved.append(position[0]) or {"ok": True},
+                                       lambda: position[0])
+    assert snapshotter.save_if_changed() is None  # not started in this process
+    snapshotter.start()
+    assert snapshotter.save_if_changed() == {"ok": True}
+    assert snapshotter.save_if_changed() is None
+    position[0] += 1
+    snapshotter.save_if_changed()
+    assert saved == [0, 1]
+
+
+def test_health_reports_startup(tmp_path, monkeypatch):
+    """restore_state loads the snapshot, replays the tail and reports timings"""
+    import app as app_module
+    engine, log, history, cache = build_state(tmp_path)
+    path = str(tmp_path / 'state.snapshot')
+    snapshot.save(path, snapshot.StateGate(), engine, ingest_log=log, history_store=history)
+    log.append([{"type": "ngo_request", "record": {"id": "tail", "ngoName": "Tail Kitchen",
+                                                    "foodNeeded": "Dal", "location": "Delhi"}}])
+
+    monkeypatch.setattr(app_module.Config, 'SNAPSHOT_PATH', path)
+    monkeypatch.setattr(app_module.Config, 'SNAPSHOT_ENABLED', True)
+    monkeypatch.setattr(app_module, 'ingest_log', log)
+    monkeypatch.setattr(app_module, 'matching_engine', MatchingEngine())
+    monkeypatch.setattr(app_module, 'history_store', ColumnarStore())
+    monkeypatch.setattr(app_module, 'startup_stats', {})
+    stats = app_module.restore_state()
+    assert stats["snapshot"]["ingest_seq"] == 40
+    assert stats["replayed_events"] == 1
+    assert app_module.matching_engine.get_ngo_request("tail")["ngoName"] == "Tail Kitchen"
+    assert len(app_module.history_store) == 41
+
+    startup = app_module.app.test_client().get('/health').get_json()["startup"]
+    assert startup["replayed_events"] == 1 and startup["restore_seconds"] >= 0
+
+
+@pytest.mark.parametrize("count", [0, 40])
+def test_ingest_after_restart(tmp_path, monkeypatch, count):
+    """Records can be added after restoring a snapshot, including one with no history"""
+    import app as app_module
+    path = str(tmp_path / 'state.snapshot')
+    history = ColumnarStore()
+    history.extend('donation', donations(count))
+    snapshot.save(path, snapshot.StateGate(), MatchingEngine(), history_store=history)
+
+    monkeypatch.setattr(app_module.Config, 'SNAPSHOT_PATH', path)
+    monkeypatch.setattr(app_module.Config, 'SNAPSHOT_ENABLED', True)
+    monkeypatch.setattr(app_module, 'ingest_log', IngestLog(str(tmp_path / 'ingest.jsonl')))
+    monkeypatch.setattr(app_module, 'matching_engine', MatchingEngine())
+    monkeypatch.setattr(app_module, 'history_store', ColumnarStore())
+    monkeypatch.setattr(app_module, 'startup_stats', {})
+    app_module.restore_state()
+    assert len(app_module.history_store) == count
+
+    response = app_module.app.test_client().post('/donations', json={
+        "foodType": "Rice", "quantity": "5kg", "expiryTime": 4, "location": "Delhi", "userId": "user1"})
+    assert response.status_code == 201
+    assert len(app_module.history_store) == count + 1
+    assert app_module.history_store.records(limit=1)[0]["location"] == "Delhi"
@@ -0,0 +1,25 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn --preload --workers 1 --threads 16 --bind 0.0.0.0:5000 wsgi:application
+
+With ``--preload`` the master process imports the app once (Flask, NumPy,
+the gazetteer and the restored state) and the worker is forked with all of
+it already in memory, so starting or respawning it costs almost nothing.
+Uses ProductionConfig (no debug mode) unless FLASK_ENV says otherwise.
+
+Run one worker and use threads for concurrency: the matching state lives
+in the worker's memory, and the worker serving requests takes the ingest
+log's writer lock (see ingest.py) and writes the snapshots, so a second
+worker fails its requests rather than diverging.
+
+With MATCH_SHARDS above 1 the master doesn't load the matching state: the
+shard processes must belong to the worker, which starts them and restores
+the state on its first request.
+"""
+
+import os
+
+from app import create_app
+
+application = create_app(os.getenv('FLASK_ENV', 'production'))